@@ -1,8 +1,72 @@
 # __init__.py
 
+import importlib
+
 from .simulation_setup import SimulationSetup
 from .parameter_updates import ParameterUpdates
 from .file_system import FileSystem
 from .xml_handler import XmlBioFM
 from .lbm_utils import calculate_viscosity, check_grid_reynolds_number
-from .vtk_utils import merge_latest_fluid_vtk_files, merge_all_timesteps
\ No newline at end of file
+from .checkpoints import find_latest_checkpoint, prune_checkpoints
+from .job_array import JobArray, SlurmBackend, LocalBackend
+from .lifecycle import LifecycleManager, LifecyclePolicy
+from .tracing import span, enable_tracing, disable_tracing, collect_trace, summarize_trace
+from .resource_monitor import ResourceSampler
+
+# Submodules depending on numpy, pyvista, joblib or pandas are only imported
+# when one of their names is first used, so that scripts which only prepare
+# or launch simulations do not pay for importing them.
+_LAZY_IMPORTS = {
+    "merge_latest_fluid_vtk_files": "vtk_utils",
+    "merge_all_timesteps": "vtk_utils",
+    "local_vtk_region": "vtk_utils",
+    "ParticleRegion": "vtk_utils",
+    "read_vtk": "vtk_utils",
+    "reduce_fluid_timesteps": "vtk_utils",
+    "reduce_fluid_timestep": "vtk_utils",
+    "register_fluid_reduction": "vtk_utils",
+    "RunningStatistics": "vtk_utils",
+    "read_fluid_level": "vtk_utils",
+    "SharedGrid": "shared_fields",
+    "share_fluid_timestep": "shared_fields",
+    "map_fluid_timesteps": "shared_fields",
+    "read_particle_statistics": "particle_utils",
+    "taylor_deformation": "particle_utils",
+    "membrane_shape_analytics": "membrane_analytics",
+    "analyse_particle_trajectory": "membrane_analytics",
+    "load_particle_trajectory": "membrane_analytics",
+    "load_particle_triangles": "membrane_analytics",
+    "ConvergenceMonitor": "convergence_monitor",
+    "RelativeChangeCriterion": "convergence_monitor",
+    "find_simulations": "campaign",
+    "load_statistics_file": "campaign",
+    "load_particle_statistics": "campaign",
+    "memoize_run": "analysis_cache",
+    "AnalysisCache": "analysis_cache",
+    "write_fluid_previews": "previews",
+    "contact_sheet": "previews",
+    "compare_runs": "field_comparison",
+    "RunRegistry": "query",
+    "query_simulations": "query",
+    "PostProcessingPipeline": "pipeline",
+    "process_simulation": "pipeline",
+    "AdaptiveSweep": "adaptive_sampling",
+    "CampaignQueue": "campaign_queue",
+    "FakeLBCode": "fake_lbcode",
+    "install_fake_lbcode": "fake_lbcode",
+    "archive_simulation": "archive",
+    "SimulationArchive": "archive",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(f".{_LAZY_IMPORTS[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
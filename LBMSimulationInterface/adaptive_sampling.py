@@ -0,0 +1,406 @@
+# adaptive_sampling.py
+
+"""
+This module provides an adaptive parameter sweep. Instead of running every
+point of a dense Cartesian grid, the sweep starts from a coarse grid and then
+repeatedly runs the candidate points where the scalar response of the
+completed runs is least well resolved. The response is modelled by a
+Gaussian process surrogate (squared exponential kernel in the unit cube,
+length scale chosen by marginal likelihood); candidates are scored by the
+posterior standard deviation, weighted by the gradient of the posterior
+mean, so uncertain points where the response changes quickly are run
+first. Runs are submitted in batches sized to the available cores.
+"""
+
+import os
+import json
+import itertools as it
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from .parameter_updates import ParameterUpdates
+from .simulation_setup import SimulationSetup
+
+
+class GaussianProcess:
+    """
+    Gaussian process regression with a squared exponential kernel, for the
+    few tens to hundreds of runs of a sweep.
+    """
+
+    LENGTH_SCALES = (0.05, 0.1, 0.2, 0.3, 0.5, 1.0)
+
+    def __init__(self, noise: float = 1e-4):
+        """
+        Args:
+            noise (float): Noise variance relative to the variance of the
+                response, which also keeps the kernel matrix well conditioned.
+        """
+        self.noise = noise
+
+    @staticmethod
+    def kernel(a: np.ndarray, b: np.ndarray, length_scale: float) -> np.ndarray:
+        squared = np.sum((a[:, None, :] - b[None, :, :]) ** 2, axis=-1)
+        return np.exp(-0.5 * squared / length_scale**2)
+
+    def fit(self, points: np.ndarray, values: np.ndarray,
+            length_scale: Optional[float] = None) -> "GaussianProcess":
+        """
+        Condition on the responses at the given unit-cube points.
+
+        Args:
+            points (np.ndarray): (runs, dimensions) unit-cube points.
+            values (np.ndarray): Response of the runs.
+            length_scale (Optional[float]): Kernel length scale. Defaults to
+                the one of `LENGTH_SCALES` with the largest marginal likelihood.
+        """
+        self.points = points
+        self.mean = values.mean()
+        self.scale = values.std() or 1.0
+        y = (values - self.mean) / self.scale
+
+        best = None
+        for candidate in ([length_scale] if length_scale is not None else self.LENGTH_SCALES):
+            K = self.kernel(points, points, candidate) + self.noise * np.eye(len(points))
+            try:
+                L = np.linalg.cholesky(K)
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+            log_likelihood = -0.5 * y @ alpha - np.log(np.diag(L)).sum()
+            if best is None or log_likelihood > best[0]:
+                best = (log_likelihood, candidate, L, alpha)
+        if best is None:
+            raise np.linalg.LinAlgError("Kernel matrix is not positive definite")
+        _, self.length_scale, self.L, self.alpha = best
+        return self
+
+    def predict(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Posterior of the response at unit-cube points.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Mean, standard
+            deviation and (points, dimensions) gradient of the mean.
+        """
+        k = self.kernel(points, self.points, self.length_scale)
+        mean = k @ self.alpha
+        v = np.linalg.solve(self.L, k.T)
+        variance = np.clip(1.0 - np.sum(v**2, axis=0), 0.0, None)
+        # d/dx k(x, x_i) = k(x, x_i) (x_i - x) / l^2
+        differences = self.points[None, :, :] - points[:, None, :]
+        gradient = np.einsum('ij,ijd->id', k * self.alpha, differences) / self.length_scale**2
+        return self.mean + self.scale * mean, self.scale * np.sqrt(variance), self.scale * gradient
+
+
+def _maximin_subset(points: np.ndarray, size: int) -> np.ndarray:
+    """
+    Greedily pick `size` points that are as far apart as possible, starting
+    from the one closest to the centre.
+    """
+    if size >= len(points):
+        return points
+    chosen = [int(np.argmin(np.linalg.norm(points - 0.5, axis=1)))]
+    distances = np.linalg.norm(points - points[chosen[0]], axis=1)
+    while len(chosen) < size:
+        chosen.append(int(np.argmax(distances)))
+        distances = np.minimum(distances, np.linalg.norm(points - points[chosen[-1]], axis=1))
+    return points[chosen]
+
+
+class AdaptiveSweep:
+    """
+    Class to run an adaptive sweep over physical parameters.
+
+    **Usage:**
+
+    ```python
+    def final_deformation(simulation_directory):
+        statistics = read_particle_statistics(os.path.join(simulation_directory, 'Particles', 'Axes_0.dat'))
+        return taylor_deformation(statistics)[-1]
+
+    sweep = AdaptiveSweep(
+        template_path="kostas_rerun_all/template",
+        root_path="kostas_rerun_all/data",
+        build_parameter_updates=cross_slot_simulation,   # (Ca, Z0, X0) -> ParameterUpdates
+        parameter_space={"Ca": (0.001, 0.05), "Z0": (-0.49, 0.49), "X0": (0.0033, 0.15)},
+        reduction=final_deformation,
+        log_scale=["Ca"],
+        cores_per_run=8,
+    )
+    results = sweep.run(max_runs=30)
+    ```
+    """
+
+    def __init__(self,
+                 template_path: str,
+                 root_path: str,
+                 build_parameter_updates: Callable[..., ParameterUpdates],
+                 parameter_space: Dict[str, Tuple[float, float]],
+                 reduction: Callable[[str], float],
+                 log_scale: Sequence[str] = (),
+                 cores_per_run: int = 1,
+                 total_cores: Optional[int] = None,
+                 candidates_per_dimension: int = 9,
+                 logfile: str = "log.txt"):
+        """
+        Args:
+            template_path (str): Path to the template files.
+            root_path (str): Root path for simulations.
+            build_parameter_updates (Callable[..., ParameterUpdates]): Function
+                computing the parameter updates from the physical parameters,
+                called with the parameters as keyword arguments.
+            parameter_space (Dict[str, Tuple[float, float]]): Lower and upper
+                bound of every physical parameter.
+            reduction (Callable[[str], float]): Scalar response of a completed
+                simulation, computed from its directory.
+            log_scale (Sequence[str]): Parameters sampled uniformly in log space.
+            cores_per_run (int): Number of cores per simulation.
+            total_cores (Optional[int]): Cores shared by a batch of simulations.
+                Defaults to the number of CPUs of the machine.
+            candidates_per_dimension (int): Resolution of the grid of candidate
+                points. Use 2**k + 1 so the coarse initial grid is part of it.
+            logfile (str): Name of the log file in each simulation directory.
+        """
+        self.template_path = template_path
+        self.root_path = root_path
+        self.build_parameter_updates = build_parameter_updates
+        self.reduction = reduction
+        self.names = list(parameter_space)
+        self.bounds = np.array([parameter_space[n] for n in self.names], dtype=float)
+        self.log_scale = np.array([n in log_scale for n in self.names])
+        self.cores_per_run = cores_per_run
+        self.total_cores = total_cores or os.cpu_count()
+        self.candidates_per_dimension = candidates_per_dimension
+        self.logfile = logfile
+        self.results_file = os.path.join(root_path, "adaptive_sweep.json")
+        self.results = self._load_results()
+
+    @property
+    def batch_size(self) -> int:
+        return max(1, self.total_cores // self.cores_per_run)
+
+    def to_physical(self, unit_points: np.ndarray) -> np.ndarray:
+        """
+        Map points from the unit cube to physical parameter values.
+        """
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        physical = low + unit_points * (high - low)
+        log_low, log_high = np.log(low[self.log_scale]), np.log(high[self.log_scale])
+        physical[..., self.log_scale] = np.exp(log_low + unit_points[..., self.log_scale] * (log_high - log_low))
+        return physical
+
+    def to_unit(self, points: np.ndarray) -> np.ndarray:
+        """
+        Map physical parameter values to the unit cube.
+        """
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        linear = (points - low) / (high - low)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logarithmic = (np.log(points) - np.log(low)) / (np.log(high) - np.log(low))
+        return np.where(self.log_scale, logarithmic, linear)
+
+    def simulation_id(self, parameters: Dict[str, float]) -> str:
+        """
+        Name of the simulation directory for a set of physical parameters.
+        """
+        return '_'.join(f"{name}={value:.6g}" for name, value in parameters.items())
+
+    def initial_design(self, points_per_dimension: int = 3) -> np.ndarray:
+        """
+        Coarse Cartesian grid in the unit cube.
+        """
+        levels = np.linspace(0, 1, points_per_dimension)
+        return np.array(list(it.product(levels, repeat=len(self.names))))
+
+    def candidates(self) -> np.ndarray:
+        """
+        Dense Cartesian grid of candidate points in the unit cube.
+        """
+        return self.initial_design(self.candidates_per_dimension)
+
+    def scores(self, candidates: np.ndarray, sampled: np.ndarray,
+               values: np.ndarray, length_scale: Optional[float] = None) -> np.ndarray:
+        """
+        Score candidate points by how poorly the response is resolved there.
+
+        A Gaussian process is fitted to the completed runs. The score is its
+        posterior standard deviation (uncertainty), weighted by the norm of
+        the gradient of its mean (relative to the range of the response), so
+        uncertain points where the response changes quickly are refined first.
+
+        Args:
+            candidates (np.ndarray): (candidates, dimensions) unit-cube points.
+            sampled (np.ndarray): (runs, dimensions) unit-cube points of completed runs.
+            values (np.ndarray): Response of the completed runs.
+            length_scale (Optional[float]): Kernel length scale. Defaults to
+                the maximum likelihood estimate.
+
+        Returns:
+            np.ndarray: Score per candidate.
+        """
+        surrogate = GaussianProcess().fit(sampled, values, length_scale)
+        _, std, gradient = surrogate.predict(candidates)
+        scale = np.ptp(values) or 1.0
+        return std * (np.linalg.norm(gradient, axis=1) / scale + 1e-3)
+
+    def select_batch(self, sampled: np.ndarray, values: np.ndarray, batch_size: int,
+                     tolerance: float = 0.0) -> np.ndarray:
+        """
+        Greedily select the next batch of points to run.
+
+        After each selection, the selected point is treated as sampled, with
+        the response predicted by the surrogate, so one batch does not
+        cluster. The kernel length scale is fitted once per batch.
+
+        Args:
+            sampled (np.ndarray): Unit-cube points of completed runs.
+            values (np.ndarray): Response of the completed runs.
+            batch_size (int): Maximum number of points to select.
+            tolerance (float): Points scoring at or below this are not selected.
+
+        Returns:
+            np.ndarray: (selected, dimensions) unit-cube points.
+        """
+        candidates = self.candidates()
+        length_scale = GaussianProcess().fit(sampled, values).length_scale
+        selected = []
+        for _ in range(batch_size):
+            scores = self.scores(candidates, sampled, values, length_scale)
+            best = np.argmax(scores)
+            if scores[best] <= tolerance:
+                break
+            predicted, _, _ = GaussianProcess().fit(sampled, values, length_scale).predict(candidates[best:best + 1])
+            selected.append(candidates[best])
+            sampled = np.vstack([sampled, candidates[best]])
+            values = np.append(values, predicted)
+        return np.array(selected).reshape(-1, len(self.names))
+
+    def run_point(self, parameters: Dict[str, float]) -> Dict:
+        """
+        Prepare, run and reduce the simulation of a single point.
+
+        A simulation that already completed successfully according to the
+        lookup json of the root path is not run again.
+
+        Args:
+            parameters (Dict[str, float]): Physical parameters of the point.
+
+        Returns:
+            Dict: Simulation ID, parameters, exit code and response.
+        """
+        simulation_id = self.simulation_id(parameters)
+        parameter_updates = self.build_parameter_updates(**parameters)
+        parameter_updates.physical(**parameters)
+        simulation_directory = os.path.join(self.root_path, simulation_id)
+
+        if self._completed(simulation_id, parameter_updates):
+            exit_code = 0
+        else:
+            setup = SimulationSetup(
+                template_path=self.template_path,
+                root_path=self.root_path,
+                parameter_updates=parameter_updates,
+                simulation_id=simulation_id,
+                overwrite=True,
+            )
+            exit_code = setup.run_simulation(num_cores=self.cores_per_run, logfile=self.logfile)
+        value = self.reduction(simulation_directory) if exit_code == 0 else None
+        return {
+            "Simulation ID": simulation_id,
+            "Parameters": parameters,
+            "Exit code": exit_code,
+            "Value": None if value is None else float(value),
+        }
+
+    def run_batch(self, unit_points: np.ndarray) -> List[Dict]:
+        """
+        Run a batch of points concurrently and record the results.
+
+        Args:
+            unit_points (np.ndarray): (points, dimensions) unit-cube points.
+
+        Returns:
+            List[Dict]: Results of the batch.
+        """
+        done = {r["Simulation ID"] for r in self.results}
+        points = [dict(zip(self.names, map(float, p))) for p in self.to_physical(unit_points)]
+        points = [p for p in points if self.simulation_id(p) not in done]
+        with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+            batch = list(executor.map(self.run_point, points))
+        self.results.extend(batch)
+        self._save_results()
+        return batch
+
+    def run(self, max_runs: int = 50, initial_points_per_dimension: int = 3,
+            tolerance: float = 0.0) -> List[Dict]:
+        """
+        Run the adaptive sweep.
+
+        Results are stored in `adaptive_sweep.json` in the root path, so an
+        interrupted sweep continues where it stopped.
+
+        Args:
+            max_runs (int): Maximum total number of simulations, including
+                the initial design. If the initial grid has more points, a
+                space-filling subset of it is run.
+            initial_points_per_dimension (int): Resolution of the initial grid.
+            tolerance (float): Stop once no candidate scores above this.
+
+        Returns:
+            List[Dict]: Simulation ID, parameters, exit code and response of
+            every run.
+        """
+        initial = self.initial_design(initial_points_per_dimension)
+        done = {r["Simulation ID"] for r in self.results}
+        pending = np.array([
+            p for p, physical in zip(initial, self.to_physical(initial))
+            if self.simulation_id(dict(zip(self.names, map(float, physical)))) not in done
+        ]).reshape(-1, len(self.names))
+        initial = _maximin_subset(pending, max(max_runs - len(self.results), 0))
+        for start in range(0, len(initial), self.batch_size):
+            self.run_batch(initial[start:start + self.batch_size])
+
+        while len(self.results) < max_runs:
+            successful = [r for r in self.results if r["Value"] is not None]
+            if not successful:
+                break
+            sampled = self.to_unit(np.array([[r["Parameters"][n] for n in self.names] for r in self.results]))
+            values = np.array([r["Value"] if r["Value"] is not None else np.nan for r in self.results])
+            # Failed runs still count as sampled, with the response of the nearest successful run
+            valid = ~np.isnan(values)
+            for i in np.flatnonzero(~valid):
+                nearest = np.argmin(np.linalg.norm(sampled[valid] - sampled[i], axis=1))
+                values[i] = values[valid][nearest]
+
+            batch_size = min(self.batch_size, max_runs - len(self.results))
+            batch = self.select_batch(sampled, values, batch_size, tolerance)
+            if len(batch) == 0 or not self.run_batch(batch):
+                break
+        return self.results
+
+    def _completed(self, simulation_id: str, parameter_updates: ParameterUpdates) -> bool:
+        """
+        Check the lookup json for a successful run with the same ID and parameters.
+        """
+        lookup_file = os.path.join(self.root_path, "simulation_lookup.json")
+        if not os.path.exists(lookup_file):
+            return False
+        with open(lookup_file, 'r') as f:
+            entry = json.load(f).get(simulation_id)
+        return (
+            entry is not None
+            and entry["Exit code"] == 0
+            and entry["Parameters"] == parameter_updates.get_parameter_updates()
+        )
+
+    def _load_results(self) -> List[Dict]:
+        if not os.path.exists(self.results_file):
+            return []
+        with open(self.results_file, 'r') as f:
+            return json.load(f)
+
+    def _save_results(self) -> None:
+        os.makedirs(self.root_path, exist_ok=True)
+        with open(self.results_file, 'w') as f:
+            json.dump(self.results, f, indent=4)
@@ -0,0 +1,277 @@
+# analysis_cache.py
+
+"""
+This module provides an on-disk cache for per-simulation analysis results.
+Decorating an analysis function with `memoize_run` stores its result under
+a key made of
+
+- the fingerprint of the simulation's output files (paths, sizes and
+  modification times, plus a hash of the first and last block of the files
+  the function declares it reads),
+- a hash of the source code of the function and of any helper functions
+  declared as its `dependencies`, plus an optional explicit `version`, and
+- the remaining arguments,
+
+so results are reused until either the data or the analysis changes. Only
+the decorated function (and the declared dependencies) are hashed: a change
+to another helper it calls, or to a library, is not detected, so declare the
+helpers or bump `version` when they change. The cache lives in one directory
+shared by all scripts and notebooks, and the least recently used entries are
+deleted once it grows beyond its size limit.
+"""
+
+import os
+import glob
+import fnmatch
+import pickle
+import hashlib
+import inspect
+import functools
+from typing import Any, Callable, Iterable, Optional, Sequence, Tuple
+
+DEFAULT_CACHE_DIRECTORY = os.environ.get(
+    "LBMI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "LBMSimulationInterface", "analysis")
+)
+DEFAULT_MAX_BYTES = 2 * 1024**3
+# Derived files written next to the outputs, which should not change the fingerprint
+DEFAULT_EXCLUDE = ("*.npz", "*.pkl", "*.json", ".postprocessing/*", ".queue/*")
+# Bytes hashed at the start and at the end of every file
+SAMPLE_BYTES = 64 * 1024
+
+
+def _file_digest(path: str, size: int) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(SAMPLE_BYTES))
+        if size > 2 * SAMPLE_BYTES:
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(SAMPLE_BYTES))
+        elif size > SAMPLE_BYTES:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def run_fingerprint(simulation_directory: str,
+                    patterns: Optional[Sequence[str]] = None,
+                    exclude: Sequence[str] = DEFAULT_EXCLUDE) -> str:
+    """
+    Fingerprint of the output files of a simulation.
+
+    Files matching `patterns` are fingerprinted by their path, size,
+    modification time and a hash of their first and last 64 KiB. Without
+    patterns all files are fingerprinted by path, size and modification time
+    only, so a whole simulation directory is not read.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+        patterns (Optional[Sequence[str]]): Glob patterns, relative to the
+            directory, of the files the analysis reads, e.g.
+            ['Particles/Axes_0.dat']. Defaults to all files, without hashing
+            their contents.
+        exclude (Sequence[str]): Patterns of files to leave out, such as
+            caches and post-processing markers.
+
+    Returns:
+        str: Hex digest, which changes whenever one of the files is added,
+        removed, resized or touched, or (with patterns) rewritten.
+    """
+    hash_contents = patterns is not None
+    if patterns is None:
+        patterns = ["**/*"]
+    files = set()
+    for pattern in patterns:
+        files.update(glob.glob(os.path.join(simulation_directory, pattern), recursive=True))
+
+    digest = hashlib.blake2b(digest_size=20)
+    for path in sorted(files):
+        relative = os.path.relpath(path, simulation_directory)
+        if any(fnmatch.fnmatch(relative, e) or fnmatch.fnmatch(os.path.basename(relative), e) for e in exclude):
+            continue
+        try:
+            stat = os.stat(path)
+            if not os.path.isfile(path):
+                continue
+            digest.update(f"{relative}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+            if hash_contents:
+                digest.update(_file_digest(path, stat.st_size))
+        except FileNotFoundError:
+            continue
+    return digest.hexdigest()
+
+
+def function_version(function: Callable) -> str:
+    """
+    Hash of the source code of a function, or of its bytecode if the source
+    is not available.
+    """
+    try:
+        source = inspect.getsource(function).encode()
+    except (OSError, TypeError):
+        code = function.__code__
+        source = code.co_code + repr((code.co_consts, code.co_names)).encode()
+    return hashlib.blake2b(source, digest_size=16).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Class for a directory of pickled results with least-recently-used eviction.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory (str): Cache directory. Defaults to LBMI_CACHE_DIR or
+                `~/.cache/LBMSimulationInterface/analysis`.
+            max_bytes (int): Size limit of the cache.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look up a result.
+
+        Returns:
+            Tuple[bool, Any]: Whether the key was found, and the result.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+        # The modification time records the last use, for the eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return True, value
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store a result and evict the least recently used entries beyond the size limit.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Write under a temporary name, so concurrent readers never see a partial entry
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self.evict()
+
+    def entries(self) -> Iterable[Tuple[str, int, float]]:
+        """
+        (path, size, last use) of every entry.
+        """
+        for path in glob.glob(os.path.join(self.directory, "*.pkl")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used entries until the cache fits its size limit.
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        """
+        Delete all entries.
+        """
+        for path, _, _ in list(self.entries()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def memoize_run(patterns: Optional[Sequence[str]] = None,
+                cache: Optional[AnalysisCache] = None,
+                exclude: Sequence[str] = DEFAULT_EXCLUDE,
+                version: Optional[str] = None,
+                dependencies: Sequence[Callable] = ()) -> Callable[[Callable], Callable]:
+    """
+    Decorator caching a per-simulation analysis function on disk. The first
+    argument of the function must be the simulation directory; the other
+    arguments must be picklable.
+
+    **Usage:**
+
+    ```python
+    @memoize_run(patterns=["Particles/Axes_0.dat"], dependencies=[taylor_deformation])
+    def final_deformation(simulation_directory, column="a"):
+        statistics = read_particle_statistics(os.path.join(simulation_directory, "Particles", "Axes_0.dat"))
+        return taylor_deformation(statistics)[-1]
+
+    final_deformation("study/simulations/3")  # computed
+    final_deformation("study/simulations/3")  # read from the cache
+    final_deformation.uncached("study/simulations/3")  # always computed
+    ```
+
+    Args:
+        patterns (Optional[Sequence[str]]): Files of the simulation the
+            function reads, as glob patterns relative to its directory. Only
+            these make up the fingerprint, including a hash of their
+            contents. Defaults to the paths, sizes and modification times
+            of all files.
+        cache (Optional[AnalysisCache]): Cache to use. Defaults to the shared
+            cache in LBMI_CACHE_DIR, limited to 2 GiB.
+        exclude (Sequence[str]): Files left out of the fingerprint.
+        version (Optional[str]): Version of the analysis, folded into the
+            key. Bump it to invalidate results after changes the source
+            hashes cannot see, e.g. to a library.
+        dependencies (Sequence[Callable]): Helper functions the analysis
+            calls, whose source code is hashed into the key as well.
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        store = cache if cache is not None else AnalysisCache()
+        versions = [f"{function.__module__}.{function.__qualname__}:{function_version(function)}"]
+        versions += [f"{d.__module__}.{d.__qualname__}:{function_version(d)}" for d in dependencies]
+        if version is not None:
+            versions.append(f"version:{version}")
+        key_version = "\0".join(versions)
+
+        @functools.wraps(function)
+        def wrapper(simulation_directory: str, *args, **kwargs):
+            arguments = pickle.dumps((args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+            key = hashlib.blake2b(
+                b"\0".join([
+                    key_version.encode(),
+                    run_fingerprint(simulation_directory, patterns, exclude).encode(),
+                    arguments,
+                ]),
+                digest_size=20,
+            ).hexdigest()
+            found, value = store.get(key)
+            if found:
+                return value
+            value = function(simulation_directory, *args, **kwargs)
+            store.put(key, value)
+            return value
+
+        wrapper.uncached = function
+        wrapper.cache = store
+        return wrapper
+
+    return decorator
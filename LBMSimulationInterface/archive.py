@@ -0,0 +1,308 @@
+# archive.py
+
+"""
+This module packs a finished simulation directory into a single indexed
+archive file, so that a run occupies one inode instead of tens of thousands.
+
+Files are split into blocks which are compressed with zlib in a pool of
+threads (zlib releases the GIL, so this scales with the cores). The archive
+ends with a JSON index giving the offset of every block of every file, and
+the size and CRC-32 of every file, so a single file, e.g.
+`simulation_info.json` or one timestep, can be read without unpacking the
+rest, and the archive can be verified before the directory is removed.
+
+Layout: `MAGIC | blocks | index (JSON) | index offset (uint64) | MAGIC`
+"""
+
+import os
+import json
+import zlib
+import struct
+import shutil
+import fnmatch
+import argparse
+import tempfile
+import collections
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ARCHIVE_SUFFIX = ".lbma"
+MAGIC = b"LBMARCH1"
+FOOTER = struct.Struct("<Q8s")
+BLOCK_SIZE = 4 * 1024**2
+
+
+def _file_blocks(directory: str, names: List[str], block_size: int) -> Iterator[Tuple[str, bytes]]:
+    """
+    Read the files of a directory as a stream of (name, block) pairs.
+    """
+    for name in names:
+        with open(os.path.join(directory, name), 'rb') as f:
+            while True:
+                data = f.read(block_size)
+                if not data:
+                    break
+                yield name, data
+
+
+def archive_simulation(simulation_directory: str,
+                       archive_path: Optional[str] = None,
+                       num_threads: Optional[int] = None,
+                       level: int = 6,
+                       block_size: int = BLOCK_SIZE,
+                       remove: bool = False) -> str:
+    """
+    Pack a finished simulation directory into a single archive.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+        archive_path (Optional[str]): Path of the archive. Defaults to the
+            simulation directory with the suffix `.lbma`.
+        num_threads (Optional[int]): Number of compression threads. Defaults
+            to the number of CPUs of the machine.
+        level (int): zlib compression level.
+        block_size (int): Size of the independently compressed blocks.
+        remove (bool): Delete the simulation directory once the archive is
+            written and every file has been read back from it with the size
+            and checksum of the original.
+
+    Returns:
+        str: Path to the archive.
+    """
+    simulation_directory = os.path.abspath(simulation_directory)
+    archive_path = archive_path or simulation_directory.rstrip(os.sep) + ARCHIVE_SUFFIX
+    num_threads = num_threads or os.cpu_count()
+
+    # Refuse to pack a simulation that is registered but has not finished
+    root_path, simulation_id = os.path.split(simulation_directory)
+    lookup_file = os.path.join(root_path, "simulation_lookup.json")
+    if os.path.exists(lookup_file):
+        with open(lookup_file, 'r') as f:
+            entry = json.load(f).get(simulation_id)
+        if entry is not None and entry["Exit code"] is None:
+            raise ValueError(f"Simulation {simulation_id} has not finished.")
+
+    names = sorted(
+        os.path.relpath(os.path.join(root, f), simulation_directory)
+        for root, _, files in os.walk(simulation_directory) for f in files
+    )
+    files = {}
+    for name in names:
+        stat = os.stat(os.path.join(simulation_directory, name))
+        files[name] = {"size": stat.st_size, "mtime": stat.st_mtime, "mode": stat.st_mode & 0o777,
+                       "crc32": 0, "blocks": []}
+
+    temporary_path = archive_path + ".tmp"
+    with open(temporary_path, 'wb') as archive, ThreadPoolExecutor(max_workers=num_threads) as executor:
+        archive.write(MAGIC)
+
+        def write_block(name, future):
+            data = future.result()
+            files[name]["blocks"].append([archive.tell(), len(data)])
+            archive.write(data)
+
+        # Keep a bounded number of blocks in flight and write them in order
+        pending = collections.deque()
+        for name, data in _file_blocks(simulation_directory, names, block_size):
+            files[name]["crc32"] = zlib.crc32(data, files[name]["crc32"])
+            pending.append((name, executor.submit(zlib.compress, data, level)))
+            if len(pending) >= 2 * num_threads:
+                write_block(*pending.popleft())
+        while pending:
+            write_block(*pending.popleft())
+
+        index_offset = archive.tell()
+        archive.write(json.dumps({"version": 1, "files": files}).encode())
+        archive.write(FOOTER.pack(index_offset, MAGIC))
+    os.replace(temporary_path, archive_path)
+
+    if remove:
+        archive = SimulationArchive(archive_path)
+        damaged = sorted(set(names) - set(archive.names())) + archive.verify(num_threads)
+        for name in names:
+            if name in archive and archive.files[name]["size"] != os.path.getsize(os.path.join(simulation_directory, name)):
+                damaged.append(name)
+        if damaged:
+            raise RuntimeError(
+                f"Archive {archive_path} does not match {simulation_directory} "
+                f"({', '.join(damaged[:5])}{', ...' if len(damaged) > 5 else ''}), not removing it."
+            )
+        shutil.rmtree(simulation_directory)
+    return archive_path
+
+
+class SimulationArchive:
+    """
+    Class to read files from a simulation archive without unpacking it.
+
+    **Usage:**
+
+    ```python
+    archive = SimulationArchive("study1/simulations/3.lbma")
+    info = json.loads(archive.read("simulation_info.json"))
+    archive.extract("VTKFluid/Fluid_t1000.vtr", "/tmp/sim3")
+    ```
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Path to the archive.
+        """
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a simulation archive.")
+            f.seek(-FOOTER.size, os.SEEK_END)
+            index_offset, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is truncated.")
+            f.seek(index_offset)
+            index = f.read(os.path.getsize(self.path) - FOOTER.size - index_offset)
+        self.files: Dict[str, Dict] = json.loads(index)["files"]
+
+    def names(self) -> List[str]:
+        """
+        Paths, relative to the simulation directory, of the archived files.
+        """
+        return list(self.files)
+
+    def glob(self, pattern: str) -> List[str]:
+        """
+        Archived paths matching a glob pattern, e.g. 'VTKFluid/Fluid_p*_t1000.vtk'.
+        """
+        return [name for name in self.files if fnmatch.fnmatch(name, pattern)]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.files
+
+    def read(self, name: str) -> bytes:
+        """
+        Read and decompress a single archived file.
+
+        Args:
+            name (str): Path of the file relative to the simulation directory.
+
+        Returns:
+            bytes: Content of the file.
+        """
+        if name not in self.files:
+            raise FileNotFoundError(f"{name} is not in {self.path}.")
+        with open(self.path, 'rb') as f:
+            chunks = []
+            for offset, length in self.files[name]["blocks"]:
+                f.seek(offset)
+                chunks.append(zlib.decompress(f.read(length)))
+        return b''.join(chunks)
+
+    def verify(self, num_threads: Optional[int] = None) -> List[str]:
+        """
+        Read back every archived file and check its size and checksum
+        against the index.
+
+        Args:
+            num_threads (Optional[int]): Number of decompression threads.
+
+        Returns:
+            List[str]: Files which cannot be read or do not match the index.
+        """
+        def damaged(name):
+            entry = self.files[name]
+            try:
+                data = self.read(name)
+            except (zlib.error, OSError):
+                return True
+            return len(data) != entry["size"] or zlib.crc32(data) != entry["crc32"]
+
+        with ThreadPoolExecutor(max_workers=num_threads or os.cpu_count()) as executor:
+            return [name for name, bad in zip(self.names(), executor.map(damaged, self.names())) if bad]
+
+    def extract(self, name: str, destination_directory: str) -> str:
+        """
+        Extract a single file, keeping its path relative to the simulation directory.
+
+        Args:
+            name (str): Path of the file relative to the simulation directory.
+            destination_directory (str): Directory to extract into.
+
+        Returns:
+            str: Path to the extracted file.
+        """
+        destination = Path(destination_directory) / name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        destination.write_bytes(self.read(name))
+        entry = self.files[name]
+        os.chmod(destination, entry["mode"])
+        os.utime(destination, (entry["mtime"], entry["mtime"]))
+        return str(destination)
+
+    def extractall(self, destination_directory: str, names: Optional[List[str]] = None,
+                   num_threads: Optional[int] = None) -> List[str]:
+        """
+        Extract several (by default all) files in parallel.
+
+        Args:
+            destination_directory (str): Directory to extract into.
+            names (Optional[List[str]]): Files to extract. Defaults to all.
+            num_threads (Optional[int]): Number of decompression threads.
+
+        Returns:
+            List[str]: Paths to the extracted files.
+        """
+        names = self.names() if names is None else names
+        with ThreadPoolExecutor(max_workers=num_threads or os.cpu_count()) as executor:
+            return list(executor.map(lambda name: self.extract(name, destination_directory), names))
+
+    @contextmanager
+    def temporary_file(self, name: str) -> Iterator[str]:
+        """
+        Extract a single file to a temporary directory for the duration of a
+        `with` block, for readers which need a path rather than bytes.
+
+        Args:
+            name (str): Path of the file relative to the simulation directory.
+
+        Yields:
+            str: Path to the temporary file, with the original file name.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            yield self.extract(name, directory)
+
+
+def split_archive_path(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a path through an archive, such as
+    'simulations/3.lbma/VTKFluid/Fluid_t1000.vtr', into the archive and the
+    path inside it.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        Optional[Tuple[str, str]]: Archive path and member name, or None if
+        the path does not go through an archive.
+    """
+    path = Path(path)
+    for parent in [path] + list(path.parents):
+        if parent.suffix == ARCHIVE_SUFFIX and parent.is_file():
+            return str(parent), path.relative_to(parent).as_posix()
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack finished simulation directories into indexed archives.")
+    parser.add_argument("simulation_directories", nargs="+")
+    parser.add_argument("--threads", type=int, default=None, help="Number of compression threads.")
+    parser.add_argument("--level", type=int, default=6, help="zlib compression level.")
+    parser.add_argument("--remove", action="store_true", help="Delete each directory once it is archived.")
+    args = parser.parse_args()
+
+    for directory in args.simulation_directories:
+        archive_path = archive_simulation(directory, num_threads=args.threads, level=args.level, remove=args.remove)
+        print(f"{directory} -> {archive_path}")
+
+
+if __name__ == "__main__":
+    main()
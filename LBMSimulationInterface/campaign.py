@@ -0,0 +1,190 @@
+# campaign.py
+
+"""
+This module provides campaign level loaders, which use the simulation lookup
+JSON file (the run registry) in a root directory to find the simulations of a
+campaign and load their outputs into a single table.
+"""
+
+import os
+import json
+import zipfile
+import warnings
+import numpy as np
+import joblib as jb
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+from .particle_utils import parse_particle_statistics
+
+ParameterFilter = Dict[str, Union[Any, Callable[[Any], bool]]]
+
+
+def _to_number(value: Any) -> Any:
+    """
+    Convert a parameter value to a float if possible.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _flatten_parameters(parameters: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge the per-file parameter updates of a registry entry into one dictionary.
+    """
+    flat = {}
+    for updates in parameters.values():
+        flat.update(updates)
+    return flat
+
+
+def _matches(parameters: Dict[str, Any], parameter_filter: ParameterFilter) -> bool:
+    """
+    Check whether flattened parameters satisfy a parameter filter.
+    """
+    for path, condition in parameter_filter.items():
+        if path not in parameters:
+            return False
+        value = _to_number(parameters[path])
+        if callable(condition):
+            if not condition(value):
+                return False
+        elif value != _to_number(condition):
+            return False
+    return True
+
+
+def find_simulations(root_path: str,
+                     parameter_filter: Optional[ParameterFilter] = None,
+                     successful_only: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Find the simulations in the run registry that match a parameter filter.
+
+    Args:
+        root_path (str): Root path of the simulations.
+        parameter_filter (Optional[ParameterFilter]): Dotted parameter paths
+            (e.g. 'boundaries.Couette.velTopX') or physical parameters
+            recorded with the simulation (e.g. 'Ca') mapped to either the required
+            value or a predicate on the value. Numeric values are compared as
+            floats, so 0.03 matches '0.03'.
+        successful_only (bool): Only return simulations with exit code 0.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Flattened parameters and physical
+        parameters of every matching simulation, keyed by simulation ID.
+    """
+    lookup_file = Path(root_path) / "simulation_lookup.json"
+    with open(lookup_file, 'r') as infile:
+        lookup_data = json.load(infile)
+
+    simulations = {}
+    for simulation_id, simulation_info in lookup_data.items():
+        if successful_only and simulation_info["Exit code"] != 0:
+            continue
+        parameters = _flatten_parameters(simulation_info["Parameters"])
+        parameters.update(simulation_info.get("Physical", {}))
+        if parameter_filter is None or _matches(parameters, parameter_filter):
+            simulations[simulation_id] = parameters
+    return simulations
+
+
+def load_statistics_file(filepath: str, use_cache: bool = True) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Load a particle statistics file, using a binary columnar cache if possible.
+
+    The parsed columns are cached in a `.npz` file next to the statistics file
+    and reused for as long as the size and modification time of the source are
+    unchanged. A cache that cannot be read is rebuilt.
+
+    Args:
+        filepath (str): Path to the statistics file.
+        use_cache (bool): Read and write the cache.
+
+    Returns:
+        Optional[Dict[str, np.ndarray]]: One array per column, or None if the
+        file does not exist.
+    """
+    if not os.path.exists(filepath):
+        return None
+    stat = os.stat(filepath)
+    source = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    cache_file = filepath + ".npz"
+
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                if np.array_equal(cached["_source"], source):
+                    return {k: cached[k] for k in cached.files if k != "_source"}
+        except (zipfile.BadZipFile, KeyError, ValueError, EOFError, OSError):
+            # Damaged or from an older format: parse the source again
+            pass
+
+    with open(filepath, 'r') as f:
+        header, values = parse_particle_statistics(f.read())
+    columns = {name: values[:, i] for i, name in enumerate(header)}
+
+    if use_cache:
+        # Written under a temporary name, so concurrent readers never see a partial cache
+        temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temporary_file, 'wb') as f:
+            np.savez(f, _source=source, **columns)
+        os.replace(temporary_file, cache_file)
+    return columns
+
+
+def load_particle_statistics(root_path: str,
+                             parameter_filter: Optional[ParameterFilter] = None,
+                             statistics_file: str = os.path.join("Particles", "Axes_0.dat"),
+                             num_cores: int = 8,
+                             use_cache: bool = True):
+    """
+    Load the particle statistics of all matching simulations into one table.
+
+    Args:
+        root_path (str): Root path of the simulations.
+        parameter_filter (Optional[ParameterFilter]): Filter passed to `find_simulations`.
+        statistics_file (str): Statistics file, relative to each simulation directory.
+        num_cores (int): Number of cores to use for parallel loading.
+        use_cache (bool): Use the binary columnar cache of each statistics file.
+
+    Returns:
+        pandas.DataFrame: The statistics of all simulations, indexed by
+        simulation ID, the parameters which vary between the simulations, and
+        the timestep (the first column of the statistics file).
+    """
+    import pandas as pd
+
+    simulations = find_simulations(root_path, parameter_filter)
+    simulation_ids = list(simulations)
+    # Loading is dominated by file I/O once cached, so threads avoid the process start-up cost
+    results = jb.Parallel(n_jobs=num_cores, prefer="threads")(
+        jb.delayed(load_statistics_file)(
+            os.path.join(root_path, simulation_id, statistics_file), use_cache
+        )
+        for simulation_id in simulation_ids
+    )
+
+    # Only parameters that differ between simulations are useful as index levels
+    all_paths = sorted(set().union(*simulations.values())) if simulations else []
+    varying = [
+        path for path in all_paths
+        if len(set(str(p.get(path)) for p in simulations.values())) > 1
+    ]
+
+    frames = []
+    for simulation_id, columns in zip(simulation_ids, results):
+        if columns is None:
+            warnings.warn(f"No {statistics_file} found for simulation {simulation_id}")
+            continue
+        frame = pd.DataFrame(columns)
+        frame.insert(0, "Simulation ID", simulation_id)
+        for i, path in enumerate(varying):
+            frame.insert(i + 1, path, _to_number(simulations[simulation_id].get(path)))
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame()
+    table = pd.concat(frames, ignore_index=True)
+    time_column = table.columns[len(varying) + 1]
+    return table.set_index(["Simulation ID"] + varying + [time_column])
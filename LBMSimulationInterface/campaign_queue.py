@@ -0,0 +1,439 @@
+# campaign_queue.py
+
+"""
+This module provides a work queue of prepared simulations, kept as small
+lease files in the study's root directory, so that workers on any number of
+nodes sharing the file system pull simulations from one campaign instead of
+running hand-partitioned slices of it.
+
+A task moves between the directories `<root_path>/.queue/{pending,running,
+done,failed}` by `os.rename`, which is atomic, so exactly one worker wins
+each claim. A running worker touches its lease every `heartbeat` seconds;
+a lease that has not been touched for `lease_timeout` seconds belongs to a
+crashed node and is moved back to pending by the next worker looking for
+work, and the simulation restarts from its latest checkpoint. A worker
+whose lease is taken away this way (e.g. after a long file system stall)
+terminates its LBCode, so a simulation never runs twice at once.
+
+Start one worker per node (or several per node, each with its share of the
+cores):
+
+    python -m LBMSimulationInterface.campaign_queue work study/simulations --cores 8
+"""
+
+import os
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Union, TYPE_CHECKING
+from .file_system import FileSystem
+from .simulation_setup import SimulationSetup
+from .resource_monitor import ResourceSampler, signal_process
+from .checkpoints import prune_checkpoints
+
+if TYPE_CHECKING:
+    from .convergence_monitor import ConvergenceMonitor
+
+QUEUE_DIRECTORY = ".queue"
+STATES = ("pending", "running", "done", "failed")
+
+
+def _rewrite(path: Path, task: Dict) -> None:
+    # Opening with 'r+' fails instead of recreating a lease that was moved away
+    with open(path, 'r+') as f:
+        f.truncate()
+        f.write(json.dumps(task))
+
+
+class Lease:
+    """
+    A claimed task. `renew` keeps the claim alive; once the lease file has
+    been requeued or claimed by another worker, `lost` is set.
+    """
+
+    def __init__(self, path: Path, task: Dict):
+        self.path = path
+        self.task = task
+        self.lost = False
+
+    @property
+    def simulation_id(self) -> str:
+        return self.task["simulation"]
+
+    def renew(self, retry_delay: float = 1.0) -> bool:
+        """
+        Touch the lease file and check that it is still this worker's claim.
+
+        A worker checking for expired leases briefly moves the file away
+        (see `CampaignQueue.requeue_expired`), so a missing file is looked
+        for once more after `retry_delay` seconds.
+
+        Returns:
+            bool: False if the lease has been lost.
+        """
+        for attempt in range(2):
+            try:
+                os.utime(self.path)
+                owner = json.loads(self.path.read_text())
+            except (FileNotFoundError, ValueError):
+                if attempt == 0:
+                    time.sleep(retry_delay)
+                continue
+            if (owner.get("worker"), owner.get("claimed")) != (self.task.get("worker"), self.task.get("claimed")):
+                # Requeued and claimed again by another worker
+                break
+            return True
+        self.lost = True
+        return False
+
+    def keep_alive(self, interval: float, on_lost: Optional[Callable[[], None]] = None) -> threading.Event:
+        """
+        Renew the lease from a background thread until the returned event is set.
+
+        Args:
+            interval (float): Seconds between renewals.
+            on_lost (Optional[Callable[[], None]]): Called from the thread
+                once the lease is lost, e.g. to stop the simulation so that
+                two workers never run it at the same time.
+        """
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(interval):
+                if not self.renew():
+                    if on_lost is not None and not stop.is_set():
+                        on_lost()
+                    return
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        return stop
+
+
+class CampaignQueue:
+    """
+    Class for a queue of prepared simulations shared by workers on several nodes.
+
+    **Usage:**
+
+    ```python
+    # Once, on any node
+    queue = CampaignQueue("study/simulations")
+    queue.submit([SimulationSetup(...).simulation_directory for parameters in campaign], num_cores=8)
+
+    # On every node
+    CampaignQueue("study/simulations").work()
+    ```
+    """
+
+    def __init__(self,
+                 root_path: str,
+                 lease_timeout: float = 600,
+                 heartbeat: float = 60,
+                 max_attempts: int = 3,
+                 keep_checkpoints: Optional[int] = None,
+                 monitor: Optional["ConvergenceMonitor"] = None):
+        """
+        Args:
+            root_path (str): Root path of the simulations, shared by all nodes.
+            lease_timeout (float): Seconds after the last heartbeat after which
+                a running task is considered abandoned. The clocks of the
+                nodes and the file server should agree to well within this.
+            heartbeat (float): Seconds between lease renewals.
+            max_attempts (int): Number of times a task is started before it
+                is moved to failed instead of being requeued.
+            keep_checkpoints (Optional[int]): If given, keep only this many of
+                the most recent checkpoints of a simulation once it finishes
+                successfully.
+            monitor (Optional[ConvergenceMonitor]): Monitor which stops each
+                simulation once its convergence criteria are met, as in
+                `SimulationSetup.run_simulation`.
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.queue_path = Path(self.root_path) / QUEUE_DIRECTORY
+        self.lease_timeout = lease_timeout
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        self.keep_checkpoints = keep_checkpoints
+        self.monitor = monitor
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        for state in STATES:
+            (self.queue_path / state).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, state: str, simulation_id: str) -> Path:
+        return self.queue_path / state / simulation_id
+
+    def state(self, simulation_id: str) -> Optional[str]:
+        """
+        State of a task, or None if it was never submitted.
+        """
+        for state in STATES:
+            if self._path(state, simulation_id).exists():
+                return state
+        return None
+
+    def submit(self,
+               simulations: Iterable[Union[str, SimulationSetup]],
+               num_cores: int = 1,
+               logfile: str = "log.txt") -> List[str]:
+        """
+        Add prepared simulations to the queue. Simulations already in the
+        queue, in any state, are skipped.
+
+        Args:
+            simulations (Iterable[Union[str, SimulationSetup]]): Prepared
+                simulation directories inside the root path, or their setups.
+            num_cores (int): Number of cores per simulation.
+            logfile (str): Name of the LBCode log file in each simulation directory.
+
+        Returns:
+            List[str]: IDs of the simulations added.
+        """
+        added = []
+        for simulation in simulations:
+            directory = simulation.simulation_directory if isinstance(simulation, SimulationSetup) else simulation
+            directory = os.path.abspath(directory)
+            if os.path.dirname(directory) != self.root_path:
+                raise ValueError(f"{directory} is not a simulation in {self.root_path}")
+            simulation_id = os.path.basename(directory)
+            if self.state(simulation_id) is not None:
+                continue
+            task = {"simulation": simulation_id, "num_cores": num_cores, "logfile": logfile, "attempts": 0}
+            # Write under a temporary name, so workers never see a partial task
+            temporary = self.queue_path / f".{simulation_id}.{self.worker}.tmp"
+            temporary.write_text(json.dumps(task))
+            os.rename(temporary, self._path("pending", simulation_id))
+            added.append(simulation_id)
+        return added
+
+    def requeue_expired(self) -> List[str]:
+        """
+        Move running tasks whose lease has expired back to pending, or to
+        failed once they have used up their attempts.
+
+        Returns:
+            List[str]: IDs of the requeued tasks.
+        """
+        requeued = []
+        for lease_path in (self.queue_path / "running").iterdir():
+            try:
+                if time.time() - lease_path.stat().st_mtime < self.lease_timeout:
+                    continue
+                # Move the lease aside first: only one worker's rename succeeds
+                grabbed = self.queue_path / f".{lease_path.name}.{self.worker}.requeue"
+                os.rename(lease_path, grabbed)
+            except FileNotFoundError:
+                continue
+            try:
+                # The owner may have renewed it between the check and the rename
+                expired = time.time() - grabbed.stat().st_mtime >= self.lease_timeout
+                task = json.loads(grabbed.read_text()) if expired else None
+            except ValueError:
+                expired = False
+            if not expired:
+                os.rename(grabbed, lease_path)
+                continue
+            target = "pending" if task["attempts"] < self.max_attempts else "failed"
+            os.rename(grabbed, self._path(target, lease_path.name))
+            if target == "pending":
+                requeued.append(lease_path.name)
+        return requeued
+
+    def claim(self) -> Optional[Lease]:
+        """
+        Claim the next pending task, after requeuing expired leases.
+
+        Returns:
+            Optional[Lease]: The lease, or None if nothing is pending.
+        """
+        self.requeue_expired()
+        for pending_path in sorted((self.queue_path / "pending").iterdir()):
+            lease_path = self._path("running", pending_path.name)
+            try:
+                # Refresh the time stamp first, so the new lease is not taken for an expired one
+                os.utime(pending_path)
+                os.rename(pending_path, lease_path)
+            except FileNotFoundError:
+                # Claimed by another worker in the meantime
+                continue
+            try:
+                task = json.loads(lease_path.read_text())
+                task["attempts"] += 1
+                task["worker"] = self.worker
+                task["claimed"] = time.time()
+                _rewrite(lease_path, task)
+            except FileNotFoundError:
+                continue
+            return Lease(lease_path, task)
+        return None
+
+    def release(self, lease: Lease) -> None:
+        """
+        Give a task back to the queue without counting the attempt, e.g.
+        when the worker is preempted.
+        """
+        lease.task["attempts"] -= 1
+        try:
+            _rewrite(lease.path, lease.task)
+            os.rename(lease.path, self._path("pending", lease.simulation_id))
+        except FileNotFoundError:
+            lease.lost = True
+
+    def complete(self, lease: Lease, exit_code: int) -> bool:
+        """
+        Record the exit code of a task and move it to done (or failed).
+
+        Returns:
+            bool: False if the lease had been lost to another worker, in
+            which case nothing is recorded.
+        """
+        lease.task["exit_code"] = exit_code
+        target = "done" if exit_code == 0 else "failed"
+        try:
+            _rewrite(lease.path, lease.task)
+            os.rename(lease.path, self._path(target, lease.simulation_id))
+        except FileNotFoundError:
+            lease.lost = True
+            return False
+        FileSystem.update_exit_code(self.root_path, lease.simulation_id, exit_code)
+        return True
+
+    def status(self) -> Dict[str, List[str]]:
+        """
+        IDs of the tasks in every state.
+        """
+        return {
+            state: sorted(p.name for p in (self.queue_path / state).iterdir())
+            for state in STATES
+        }
+
+    def run(self, lease: Lease, num_cores: Optional[int] = None) -> Optional[int]:
+        """
+        Run the simulation of a lease in its directory, renewing the lease
+        while it runs. A simulation that was started before (by any worker,
+        including one that gave it back) continues from its latest
+        checkpoint, or from t=0 if there is none, and its log is appended
+        to. As in `SimulationSetup.run_simulation`, the queue's convergence
+        monitor may stop the simulation, old checkpoints are pruned after a
+        successful run and the resource usage of the run is recorded.
+
+        If this process receives SIGTERM, the simulation is stopped and the
+        task is given back to the queue. If the lease is lost (it expired and
+        was requeued, e.g. after the file system stalled), the simulation is
+        terminated and nothing is recorded, since another worker owns it.
+
+        Args:
+            lease (Lease): The claimed task.
+            num_cores (Optional[int]): Number of cores, overriding the task's.
+
+        Returns:
+            Optional[int]: Exit code, or None if the task was given back or
+            the lease was lost.
+        """
+        directory = os.path.join(self.root_path, lease.simulation_id)
+        # Released tasks get their attempt back, so whether to resume is recorded separately
+        resumed = lease.task.get("started", False)
+        if resumed:
+            SimulationSetup.restart_from_checkpoint(directory)
+        else:
+            lease.task["started"] = True
+            try:
+                _rewrite(lease.path, lease.task)
+            except FileNotFoundError:
+                lease.lost = True
+                return None
+
+        sampler = ResourceSampler()
+        stop_heartbeat = []
+
+        def start_heartbeat(process):
+            stop_heartbeat.append(lease.keep_alive(
+                self.heartbeat, on_lost=lambda: signal_process(process, signal.SIGTERM)
+            ))
+
+        try:
+            exit_code, preempted = SimulationSetup.execute(
+                directory, num_cores or lease.task["num_cores"], lease.task["logfile"],
+                append_log=resumed, monitor=self.monitor, sampler=sampler, on_start=start_heartbeat,
+            )
+        finally:
+            for stop in stop_heartbeat:
+                stop.set()
+
+        if lease.lost:
+            return None
+        if preempted:
+            self.release(lease)
+            return None
+        if exit_code == 0 and self.keep_checkpoints is not None:
+            prune_checkpoints(directory, self.keep_checkpoints)
+        resources = sampler.summary()
+        if self.complete(lease, exit_code) and resources is not None:
+            FileSystem.update_resources(self.root_path, lease.simulation_id, resources)
+        return exit_code
+
+    def work(self,
+             num_cores: Optional[int] = None,
+             wait_for_running: bool = True,
+             poll_interval: float = 10) -> List[str]:
+        """
+        Claim and run simulations until the queue is empty.
+
+        Args:
+            num_cores (Optional[int]): Number of cores per simulation,
+                overriding the value given at submission.
+            wait_for_running (bool): Once nothing is pending, keep polling
+                while other workers are still running tasks, in case one of
+                them crashes and its task is requeued.
+            poll_interval (float): Seconds between polls.
+
+        Returns:
+            List[str]: IDs of the simulations run by this worker.
+        """
+        completed = []
+        while True:
+            lease = self.claim()
+            if lease is None:
+                if wait_for_running and any((self.queue_path / "running").iterdir()):
+                    time.sleep(poll_interval)
+                    continue
+                return completed
+            exit_code = self.run(lease, num_cores)
+            if exit_code is None:
+                if lease.lost:
+                    # Another worker runs it now
+                    continue
+                # Preempted: stop taking work
+                return completed
+            completed.append(lease.simulation_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work through a queue of prepared simulations.")
+    parser.add_argument("command", choices=["work", "status", "requeue"])
+    parser.add_argument("root_path", help="Root path of the simulations, shared by all workers.")
+    parser.add_argument("--cores", type=int, default=None, help="Cores per simulation.")
+    parser.add_argument("--lease-timeout", type=float, default=600, help="Seconds before a silent lease expires.")
+    parser.add_argument("--heartbeat", type=float, default=60, help="Seconds between lease renewals.")
+    parser.add_argument("--no-wait", action="store_true", help="Stop as soon as nothing is pending.")
+    parser.add_argument("--keep-checkpoints", type=int, default=None,
+                        help="Checkpoints kept per simulation after a successful run.")
+    args = parser.parse_args()
+
+    queue = CampaignQueue(args.root_path, lease_timeout=args.lease_timeout, heartbeat=args.heartbeat,
+                          keep_checkpoints=args.keep_checkpoints)
+    if args.command == "work":
+        completed = queue.work(num_cores=args.cores, wait_for_running=not args.no_wait)
+        print(f"{queue.worker} ran {len(completed)} simulations")
+    elif args.command == "requeue":
+        print('\n'.join(queue.requeue_expired()))
+    else:
+        for state, simulation_ids in queue.status().items():
+            print(f"{state:>8s}: {len(simulation_ids)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# checkpoints.py
+
+"""
+This module provides helpers for working with the checkpoints that LBCode
+writes to the `Backup` directory of a simulation. LBCode writes one file per
+MPI rank for the fluid (LBM) state and, when particles are present, files for
+the membrane (MEM) state. Every checkpoint file carries its timestep as a
+`_t<timestep>` suffix, which is used to group the files into checkpoints.
+"""
+
+import os
+import re
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .xml_handler import XmlBioFM
+
+CHECKPOINT_PATTERN = re.compile(r"_t(?P<timestep>\d+)")
+MEMBRANE_PATTERN = re.compile(r"(mem|mesh|particle)", re.IGNORECASE)
+
+# Parameters which must be identical for a fluid checkpoint to be reusable
+FLUID_CONFIGURATION = ("MPI.", "lattice.size.", "boundaries.")
+
+
+def list_checkpoints(backup_directory: str) -> Dict[int, Dict[str, List[Path]]]:
+    """
+    Group the files in a Backup directory by checkpoint timestep.
+
+    Args:
+        backup_directory (str): Path to the Backup directory.
+
+    Returns:
+        Dict[int, Dict[str, List[Path]]]: For every timestep, the 'LBM' and
+        'MEM' files belonging to that checkpoint.
+    """
+    checkpoints = {}
+    backup_path = Path(backup_directory)
+    if not backup_path.is_dir():
+        return checkpoints
+
+    for path in backup_path.rglob("*"):
+        if not path.is_file():
+            continue
+        match = CHECKPOINT_PATTERN.search(str(path.relative_to(backup_path)))
+        if match is None:
+            continue
+        kind = "MEM" if MEMBRANE_PATTERN.search(path.name) else "LBM"
+        timestep = int(match.group("timestep"))
+        checkpoints.setdefault(timestep, {"LBM": [], "MEM": []})[kind].append(path)
+    return checkpoints
+
+
+def get_num_ranks(simulation_directory: str) -> int:
+    """
+    Read the number of MPI ranks from the parameters.xml of a simulation.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+
+    Returns:
+        int: Product of the MPI cores in the x, y and z directions.
+    """
+    parameter_file = os.path.join(simulation_directory, "parameters.xml")
+    num_ranks = 1
+    for axis in ("x", "y", "z"):
+        value = XmlBioFM.read_parameter(parameter_file, f"MPI.cores.{axis}")
+        num_ranks *= int(float(value)) if value is not None else 1
+    return num_ranks
+
+
+def is_complete_checkpoint(files: Dict[str, List[Path]], num_ranks: int) -> bool:
+    """
+    Check whether a checkpoint was written completely by all ranks.
+
+    A checkpoint is complete if every rank wrote its LBM file and none of the
+    checkpoint files is empty, which is what is left behind when a job is
+    killed while writing.
+
+    Args:
+        files (Dict[str, List[Path]]): The 'LBM' and 'MEM' files of a checkpoint.
+        num_ranks (int): Number of MPI ranks the simulation was run with.
+
+    Returns:
+        bool: True if the checkpoint can be restarted from.
+    """
+    if len(files["LBM"]) < num_ranks:
+        return False
+    return all(f.stat().st_size > 0 for f in files["LBM"] + files["MEM"])
+
+
+def find_latest_checkpoint(simulation_directory: str) -> Optional[Tuple[int, int]]:
+    """
+    Find the latest complete checkpoint in the Backup directory of a simulation.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+
+    Returns:
+        Optional[Tuple[int, int]]: The restart times (timeLBM, timeMEM) of the
+        latest complete checkpoint, with timeMEM set to -1 if the checkpoint
+        has no membrane state. None if there is no complete checkpoint.
+    """
+    checkpoints = list_checkpoints(os.path.join(simulation_directory, "Backup"))
+    num_ranks = get_num_ranks(simulation_directory)
+
+    for timestep in sorted(checkpoints, reverse=True):
+        files = checkpoints[timestep]
+        if is_complete_checkpoint(files, num_ranks):
+            time_mem = timestep if files["MEM"] else -1
+            return timestep, time_mem
+    return None
+
+
+def prunable_checkpoints(simulation_directory: str, keep: int,
+                         checkpoints: Optional[Dict[int, Dict[str, List[Path]]]] = None) -> List[int]:
+    """
+    Timesteps of the checkpoints `prune_checkpoints` would delete.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+        keep (int): Number of complete checkpoints to keep.
+        checkpoints (Optional[Dict[int, Dict[str, List[Path]]]]): Result of
+            `list_checkpoints` for the Backup directory, if already known.
+
+    Returns:
+        List[int]: Timesteps of the checkpoints to delete, newest first.
+    """
+    if checkpoints is None:
+        checkpoints = list_checkpoints(os.path.join(simulation_directory, "Backup"))
+    num_ranks = get_num_ranks(simulation_directory)
+
+    kept = []
+    prunable = []
+    for timestep in sorted(checkpoints, reverse=True):
+        files = checkpoints[timestep]
+        if len(kept) < keep and is_complete_checkpoint(files, num_ranks):
+            kept.append(timestep)
+            continue
+        if len(kept) < keep:
+            # Possibly still being written, or the only data there is
+            continue
+        prunable.append(timestep)
+    return prunable
+
+
+def prune_checkpoints(simulation_directory: str, keep: int) -> List[int]:
+    """
+    Delete all but the most recent complete checkpoints of a simulation.
+
+    Incomplete checkpoints older than the newest kept checkpoint are deleted
+    as well.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+        keep (int): Number of complete checkpoints to keep.
+
+    Returns:
+        List[int]: Timesteps of the deleted checkpoints.
+    """
+    backup_directory = os.path.join(simulation_directory, "Backup")
+    checkpoints = list_checkpoints(backup_directory)
+
+    deleted = prunable_checkpoints(simulation_directory, keep, checkpoints)
+    for timestep in deleted:
+        files = checkpoints[timestep]
+        for path in files["LBM"] + files["MEM"]:
+            path.unlink()
+
+    # Remove per-timestep subdirectories left empty by the deletion
+    for root, dirs, _ in os.walk(backup_directory, topdown=False):
+        for d in dirs:
+            path = os.path.join(root, d)
+            if not os.listdir(path):
+                shutil.rmtree(path)
+    return deleted
+
+
+def copy_checkpoint(source_directory: str, destination_directory: str, timestep: int,
+                    kinds: Sequence[str] = ("LBM", "MEM")) -> None:
+    """
+    Copy the files of one checkpoint to the Backup directory of another simulation.
+
+    Args:
+        source_directory (str): Simulation directory holding the checkpoint.
+        destination_directory (str): Simulation directory to copy it to.
+        timestep (int): Timestep of the checkpoint.
+        kinds (Sequence[str]): Which state to copy, 'LBM' and/or 'MEM'.
+    """
+    source_backup = Path(source_directory) / "Backup"
+    destination_backup = Path(destination_directory) / "Backup"
+    files = list_checkpoints(str(source_backup))[timestep]
+    for kind in kinds:
+        for path in files[kind]:
+            destination = destination_backup / path.relative_to(source_backup)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, destination)
+
+
+def _parameter_distance(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """
+    Sum of the relative differences of the numeric parameters of two simulations.
+    """
+    distance = 0.0
+    for path in set(a) | set(b):
+        try:
+            x, y = float(a.get(path, 0)), float(b.get(path, 0))
+        except ValueError:
+            distance += float(a.get(path) != b.get(path))
+            continue
+        scale = max(abs(x), abs(y))
+        if scale > 0:
+            distance += abs(x - y) / scale
+    return distance
+
+
+def find_warm_start_donor(root_path: str, simulation_directory: str,
+                          parameters: Dict[str, Dict[str, Any]]
+                          ) -> Optional[Tuple[str, int]]:
+    """
+    Find the closest completed simulation whose fluid checkpoint can be reused.
+
+    Candidates are the successful simulations in the lookup json of the root
+    path with the same MPI decomposition, lattice size and boundary settings
+    (compared on the written parameters.xml files) and a complete checkpoint.
+    Of those, the one whose parameter updates differ least is chosen.
+
+    Args:
+        root_path (str): Root path of the simulations.
+        simulation_directory (str): Prepared simulation directory to warm start.
+        parameters (Dict[str, Dict[str, Any]]): Parameter updates of the new
+            simulation, as returned by `ParameterUpdates.get_parameter_updates`.
+
+    Returns:
+        Optional[Tuple[str, int]]: Directory and timestep of the donor
+        checkpoint, or None if there is no suitable simulation.
+    """
+    lookup_file = os.path.join(root_path, "simulation_lookup.json")
+    if not os.path.exists(lookup_file):
+        return None
+    with open(lookup_file, 'r') as f:
+        lookup_data = json.load(f)
+
+    def configuration(directory: str) -> Dict[str, str]:
+        flat = XmlBioFM.flatten_parameters(os.path.join(directory, "parameters.xml"))
+        return {k: v for k, v in flat.items() if k.startswith(FLUID_CONFIGURATION)}
+
+    target_configuration = configuration(simulation_directory)
+    flat_parameters = {k: v for updates in parameters.values() for k, v in updates.items()}
+
+    best = None
+    for simulation_id, simulation_info in lookup_data.items():
+        directory = os.path.join(root_path, simulation_id)
+        if simulation_info["Exit code"] != 0:
+            continue
+        if not os.path.exists(os.path.join(directory, "parameters.xml")):
+            continue
+        if os.path.samefile(directory, simulation_directory):
+            continue
+        if configuration(directory) != target_configuration:
+            continue
+        checkpoint = find_latest_checkpoint(directory)
+        if checkpoint is None:
+            continue
+        donor_parameters = {k: v for updates in simulation_info["Parameters"].values() for k, v in updates.items()}
+        distance = _parameter_distance(flat_parameters, donor_parameters)
+        if best is None or distance < best[0]:
+            best = (distance, directory, checkpoint[0])
+
+    return None if best is None else (best[1], best[2])
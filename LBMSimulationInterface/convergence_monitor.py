@@ -0,0 +1,182 @@
+# convergence_monitor.py
+
+"""
+This module provides a monitor which runs alongside
+`SimulationSetup.run_simulation`, tails a particle statistics file while
+LBCode is running, and stops the simulation once a convergence criterion is
+met. Criteria are callables which take the statistics read so far (a
+dictionary of column arrays) and return True once the run has converged, so
+users can add their own next to the ones defined here.
+"""
+
+import os
+import time
+import signal
+import threading
+import subprocess
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from .particle_utils import parse_particle_statistics, taylor_deformation
+from .resource_monitor import process_exited, signal_process
+
+Criterion = Callable[[Dict[str, np.ndarray]], bool]
+
+# Seconds between checks whether a stopped simulation has exited
+TERMINATE_POLL_INTERVAL = 0.5
+
+
+class RelativeChangeCriterion:
+    """
+    Converged once a quantity changes by less than a relative tolerance over a
+    window of the most recent samples.
+    """
+
+    def __init__(
+        self,
+        quantity: Callable[[Dict[str, np.ndarray]], np.ndarray] = taylor_deformation,
+        window: int = 20,
+        tolerance: float = 1e-3,
+        time_ignore: float = 0,
+        time_column: Optional[str] = None,
+    ):
+        """
+        Args:
+            quantity (Callable): Function computing the monitored quantity from
+                the statistics columns. Defaults to the Taylor deformation.
+            window (int): Number of most recent samples to compare.
+            tolerance (float): Maximum of (max - min)/|mean| over the window.
+            time_ignore (float): Samples before this time are not considered,
+                like `convergence.timeIgnore` in parameters.xml.
+            time_column (Optional[str]): Name of the time column. Defaults to
+                the first column of the statistics file.
+        """
+        self.quantity = quantity
+        self.window = window
+        self.tolerance = tolerance
+        self.time_ignore = time_ignore
+        self.time_column = time_column
+
+    def __call__(self, statistics: Dict[str, np.ndarray]) -> bool:
+        time_column = self.time_column or next(iter(statistics))
+        values = self.quantity(statistics)[statistics[time_column] >= self.time_ignore]
+        if len(values) < self.window:
+            return False
+        recent = values[-self.window:]
+        scale = abs(np.mean(recent))
+        if scale == 0:
+            return np.ptp(recent) == 0
+        return np.ptp(recent) / scale < self.tolerance
+
+
+class ConvergenceMonitor:
+    """
+    Class to tail a particle statistics file and stop LBCode on convergence.
+
+    **Usage:**
+
+    ```python
+    monitor = ConvergenceMonitor([RelativeChangeCriterion(window=50, tolerance=1e-4)])
+    setup.run_simulation(num_cores=6, monitor=monitor)
+    print(monitor.converged, monitor.converged_time)
+    ```
+    """
+
+    def __init__(
+        self,
+        criteria: List[Criterion],
+        statistics_file: str = os.path.join("Particles", "Axes_0.dat"),
+        poll_interval: float = 10.0,
+        stop_timeout: float = 60.0,
+    ):
+        """
+        Args:
+            criteria (List[Criterion]): Convergence criteria. The simulation is
+                stopped as soon as any of them is met.
+            statistics_file (str): Statistics file, relative to the simulation directory.
+            poll_interval (float): Seconds between reads of the statistics file.
+            stop_timeout (float): Seconds to wait for LBCode to exit after
+                SIGTERM before it is killed.
+        """
+        self.criteria = criteria
+        self.statistics_file = statistics_file
+        self.poll_interval = poll_interval
+        self.stop_timeout = stop_timeout
+        self.converged = False
+        self.converged_criterion = None
+        self.converged_time = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self, simulation_directory: str, process: subprocess.Popen) -> None:
+        """
+        Start monitoring a running simulation in a background thread.
+
+        Args:
+            simulation_directory (str): Path to the simulation directory.
+            process (subprocess.Popen): The running LBCode (or mpiexec) process.
+        """
+        self.converged = False
+        self.converged_criterion = None
+        self.converged_time = None
+        self._stop_event.clear()
+        filepath = os.path.join(os.path.abspath(simulation_directory), self.statistics_file)
+        self._thread = threading.Thread(
+            target=self._monitor, args=(filepath, process), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop monitoring and wait for the background thread to finish.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _monitor(self, filepath: str, process: subprocess.Popen) -> None:
+        header = None
+        rows = []
+        offset = 0
+        while not self._stop_event.wait(self.poll_interval):
+            if process_exited(process):
+                return
+            if not os.path.exists(filepath):
+                continue
+
+            # Only read what was appended since the last poll
+            with open(filepath, 'r') as f:
+                f.seek(offset)
+                text = f.read()
+            complete = text[:text.rfind('\n') + 1]
+            offset += len(complete.encode())
+            header, values = parse_particle_statistics(complete, header)
+            if not header:
+                header = None
+                continue
+            if len(values):
+                rows.append(values)
+            if not rows:
+                continue
+
+            values = np.concatenate(rows)
+            rows = [values]
+            statistics = {name: values[:, i] for i, name in enumerate(header)}
+            for criterion in self.criteria:
+                if criterion(statistics):
+                    self.converged = True
+                    self.converged_criterion = criterion
+                    self.converged_time = statistics[header[0]][-1]
+                    self._terminate(process)
+                    return
+
+    def _terminate(self, process: subprocess.Popen) -> None:
+        # The process is only polled, never waited for: the thread running it
+        # reaps it (see `ResourceSampler.wait`)
+        signal_process(process, signal.SIGTERM)
+        deadline = time.monotonic() + self.stop_timeout
+        while time.monotonic() < deadline:
+            if process_exited(process):
+                return
+            time.sleep(min(TERMINATE_POLL_INTERVAL, self.stop_timeout))
+        signal_process(process, signal.SIGKILL)
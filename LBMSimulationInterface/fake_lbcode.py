@@ -0,0 +1,335 @@
+# fake_lbcode.py
+
+"""
+This module is a stand-in for the LBCode binary, for testing and
+benchmarking the Python side (running, monitoring, merging, analysis) without
+MPI or real compute time. Run from a prepared simulation directory, it reads
+the three XML parameter files and writes output with the same names and
+layout as LBCode for the configured decomposition, lattice size and output
+steps:
+
+- `VTKFluid/Fluid_p<rank>_t<t>.vtk`: STRUCTURED_POINTS block of each rank
+  with a Couette shear profile ('velocity') and 'density'
+- `VTKParticles/Particles_rank<rank>_t<t>.vtk` and `Axes_rank<rank>_t<t>.vtk`:
+  the particle mesh, deformed into an ellipsoid, from the rank owning its centroid
+- `Particles/Axes_0.dat`: semi-axes over time
+- `Backup/`: checkpoint files every checkpoint.save.step
+
+Progress is printed every lattice.times.info steps. Under mpiexec every
+process writes its own rank; otherwise one process writes all ranks.
+
+Usage, from a simulation directory:
+
+    python -m LBMSimulationInterface.fake_lbcode [--seconds-per-step 0.001]
+
+`install_fake_lbcode(template_path)` puts an `LBCode` script running this
+module into a template, so `SimulationSetup` runs it like the real solver.
+"""
+
+import os
+import sys
+import math
+import time
+import stat
+import argparse
+import numpy as np
+from typing import Dict, List, Tuple
+from .xml_handler import XmlBioFM
+from .particle_utils import read_mesh
+
+
+def _get(parameters: Dict[str, str], path: str, default: float) -> float:
+    try:
+        return float(parameters[path])
+    except (KeyError, ValueError):
+        return default
+
+
+def _write_structured_points(filename: str, origin: Tuple[int, int, int],
+                             velocity: np.ndarray, density: np.ndarray) -> None:
+    """
+    Write a legacy binary STRUCTURED_POINTS file. `velocity` is (z, y, x, 3).
+    """
+    nz, ny, nx = density.shape
+    header = (
+        "# vtk DataFile Version 3.0\n"
+        "LBCode fluid\n"
+        "BINARY\n"
+        "DATASET STRUCTURED_POINTS\n"
+        f"DIMENSIONS {nx} {ny} {nz}\n"
+        f"ORIGIN {origin[0]} {origin[1]} {origin[2]}\n"
+        "SPACING 1 1 1\n"
+        f"POINT_DATA {density.size}\n"
+        "VECTORS velocity float\n"
+    )
+    with open(filename, 'wb') as f:
+        f.write(header.encode())
+        f.write(velocity.astype('>f4').tobytes())
+        f.write(b"\nSCALARS density float 1\nLOOKUP_TABLE default\n")
+        f.write(density.astype('>f4').tobytes())
+        f.write(b"\n")
+
+
+def _write_polydata(filename: str, points: np.ndarray, cells: np.ndarray, kind: str) -> None:
+    """
+    Write a legacy binary POLYDATA file with POLYGONS or LINES.
+    """
+    connectivity = np.hstack([np.full((len(cells), 1), cells.shape[1]), cells]).astype('>i4')
+    with open(filename, 'wb') as f:
+        f.write(
+            f"# vtk DataFile Version 3.0\nLBCode particles\nBINARY\nDATASET POLYDATA\n"
+            f"POINTS {len(points)} float\n".encode()
+        )
+        f.write(points.astype('>f4').tobytes())
+        f.write(f"\n{kind} {len(cells)} {connectivity.size}\n".encode())
+        f.write(connectivity.tobytes())
+        f.write(b"\n")
+
+
+class FakeLBCode:
+    """
+    Class generating LBCode-like output for a prepared simulation directory.
+    """
+
+    def __init__(self, simulation_directory: str = ".", seconds_per_step: float = 0.0):
+        """
+        Args:
+            simulation_directory (str): Directory with the three XML files.
+            seconds_per_step (float): Wall time spent per lattice step, to
+                mimic the run time of a real simulation.
+        """
+        self.directory = simulation_directory
+        self.seconds_per_step = seconds_per_step
+        parameters = XmlBioFM.flatten_parameters(os.path.join(simulation_directory, "parameters.xml"))
+        meshes = XmlBioFM.flatten_parameters(os.path.join(simulation_directory, "parametersMeshes.xml"))
+        positions_file = os.path.join(simulation_directory, "parametersPositions.xml")
+        positions = XmlBioFM.flatten_parameters(positions_file) if os.path.exists(positions_file) else {}
+
+        self.cores = tuple(int(_get(parameters, f"MPI.cores.{a}", 1)) for a in "xyz")
+        self.size = tuple(int(_get(parameters, f"lattice.size.N{a}", 10)) for a in "XYZ")
+        restart = int(_get(parameters, "checkpoint.restart.timeLBM", -1))
+        self.start = max(restart, int(_get(parameters, "lattice.times.start", 0)))
+        self.end = int(_get(parameters, "lattice.times.end", 0))
+        self.info_step = int(_get(parameters, "lattice.times.info", 0))
+        self.checkpoint_step = int(_get(parameters, "checkpoint.save.step", 0))
+        self.fluid_step = int(_get(parameters, "data.fluid.VTK.step", 0)) \
+            if _get(parameters, "data.fluid.VTK.active", 0) > 0 else 0
+        self.particle_step = int(_get(parameters, "data.particles.VTK.step", 0)) \
+            if _get(parameters, "data.particles.VTK.active", 0) > 0 else 0
+        self.statistics_step = int(_get(parameters, "data.particles.statistics.step", 0)) \
+            if _get(parameters, "data.particles.statistics.active", 0) > 0 else 0
+
+        # Couette flow along x between walls normal to z (or y for velocities along y)
+        self.couette = _get(parameters, "boundaries.Couette.active", 0) > 0
+        self.wall_velocity = np.array([
+            _get(parameters, "boundaries.Couette.velTopX", 0) - _get(parameters, "boundaries.Couette.velBotX", 0),
+            _get(parameters, "boundaries.Couette.velTopY", 0) - _get(parameters, "boundaries.Couette.velBotY", 0),
+        ])
+        self.bottom_velocity = np.array([
+            _get(parameters, "boundaries.Couette.velBotX", 0), _get(parameters, "boundaries.Couette.velBotY", 0)
+        ])
+        tau = _get(parameters, "LBM.relaxation.tau", 1.0)
+
+        self.radius = _get(meshes, "mesh.general.radius", 0)
+        self.centre = np.array([_get(positions, f"particle.{a}", n / 2) for a, n in zip("XYZ", self.size)])
+        mesh_file = os.path.join(simulation_directory, meshes.get("mesh.general.file", ""))
+        self.particles = self.radius > 0 and os.path.isfile(mesh_file)
+        if self.particles:
+            nodes, self.triangles = read_mesh(mesh_file)
+            self.nodes = nodes / np.linalg.norm(nodes, axis=1, keepdims=True)
+        # Steady deformation from the capillary number Ca = nu * shear rate * radius / kS
+        kS = _get(meshes, "mesh.physics.kS", 0)
+        shear_rate = np.linalg.norm(self.wall_velocity) / max(self.size[2] - 1, 1) if self.couette else 0.0
+        capillary = (tau - 0.5) / 3 * shear_rate * self.radius / kS if kS > 0 else 0.0
+        self.steady_deformation = min(0.4, 25 / 12 * capillary)
+        self.relaxation_time = max(self.end / 10, 1)
+
+        self.ranks = self._assigned_ranks()
+
+    def _assigned_ranks(self) -> List[int]:
+        """
+        Ranks written by this process: its own under mpiexec, otherwise all.
+        """
+        num_ranks = int(np.prod(self.cores))
+        for rank_variable, size_variable in (("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE"),
+                                             ("PMI_RANK", "PMI_SIZE"), ("PMIX_RANK", None)):
+            if rank_variable in os.environ:
+                rank = int(os.environ[rank_variable])
+                size = int(os.environ.get(size_variable, num_ranks)) if size_variable else num_ranks
+                return list(range(rank, num_ranks, size))
+        return list(range(num_ranks))
+
+    def rank_blocks(self) -> List[Tuple[Tuple[int, int, int], Tuple[int, int, int]]]:
+        """
+        (origin, dimensions) of the block of every rank, ranks ordered x fastest.
+        """
+        splits = [np.array_split(np.arange(n), c) for n, c in zip(self.size, self.cores)]
+        blocks = []
+        for z in splits[2]:
+            for y in splits[1]:
+                for x in splits[0]:
+                    blocks.append(((int(x[0]), int(y[0]), int(z[0])), (len(x), len(y), len(z))))
+        return blocks
+
+    def deformation(self, t: int) -> float:
+        return self.steady_deformation * (1 - math.exp(-t / self.relaxation_time))
+
+    def write_fluid(self, t: int, rank: int, block) -> None:
+        (x0, y0, z0), (nx, ny, nz) = block
+        z = np.arange(z0, z0 + nz, dtype=float)
+        velocity = np.zeros((nz, ny, nx, 3), dtype=np.float32)
+        if self.couette:
+            profile = self.bottom_velocity + np.outer(z / max(self.size[2] - 1, 1), self.wall_velocity)
+            velocity[..., :2] = profile[:, None, None, :]
+        # Small travelling disturbance so timesteps differ
+        x = np.arange(x0, x0 + nx)
+        velocity[..., 2] += 1e-4 * np.sin(2 * np.pi * (x - 1e-3 * t) / self.size[0])[None, None, :]
+        density = np.ones((nz, ny, nx), dtype=np.float32)
+        _write_structured_points(
+            os.path.join(self.directory, "VTKFluid", f"Fluid_p{rank}_t{t}.vtk"), (x0, y0, z0), velocity, density
+        )
+
+    def particle_shape(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nodes of the ellipsoidal particle and its semi-axes (a, b, c).
+        """
+        deformation = self.deformation(t)
+        axes = self.radius * np.array([1 + deformation, 1.0, 1 - deformation])
+        # Inclined at 45 degrees in the shear plane, relaxing towards the flow direction
+        angle = np.pi / 4 * (1 - 0.5 * deformation)
+        rotation = np.array([[np.cos(angle), 0, -np.sin(angle)], [0, 1, 0], [np.sin(angle), 0, np.cos(angle)]])
+        return self.centre + (self.nodes * axes) @ rotation.T, axes
+
+    def owner_rank(self) -> int:
+        for rank, ((x0, y0, z0), (nx, ny, nz)) in enumerate(self.rank_blocks()):
+            if all(o <= c < o + n for c, o, n in zip(self.centre, (x0, y0, z0), (nx, ny, nz))):
+                return rank
+        return 0
+
+    def write_particles(self, t: int, rank: int) -> None:
+        points, axes = self.particle_shape(t)
+        directory = os.path.join(self.directory, "VTKParticles")
+        _write_polydata(os.path.join(directory, f"Particles_rank{rank}_t{t}.vtk"), points, self.triangles, "POLYGONS")
+        ends = np.vstack([self.centre, self.centre + np.diag(axes)])
+        _write_polydata(os.path.join(directory, f"Axes_rank{rank}_t{t}.vtk"), ends,
+                        np.array([[0, 1], [0, 2], [0, 3]]), "LINES")
+
+    def write_checkpoint(self, t: int, rank: int, block) -> None:
+        backup = os.path.join(self.directory, "Backup")
+        _, dimensions = block
+        # 19 populations per node, as for D3Q19
+        np.zeros(int(np.prod(dimensions)) * 19, dtype=np.float64).tofile(
+            os.path.join(backup, f"LBM_p{rank}_t{t}.dat")
+        )
+        if self.particles and rank == self.owner_rank():
+            self.particle_shape(t)[0].tofile(os.path.join(backup, f"mem_rank{rank}_t{t}.dat"))
+
+    def event_times(self) -> List[int]:
+        times = {self.start, self.end}
+        for step in (self.info_step, self.checkpoint_step, self.fluid_step, self.particle_step, self.statistics_step):
+            if step > 0:
+                times.update(range(self.start - self.start % step + step, self.end + 1, step))
+        return sorted(t for t in times if self.start <= t <= self.end)
+
+    def run(self) -> int:
+        """
+        Write the output of the whole simulation.
+
+        Returns:
+            int: Exit code, 0.
+        """
+        for name in ("VTKFluid", "VTKParticles", "Particles", "Backup"):
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+        blocks = self.rank_blocks()
+        lead = 0 in self.ranks
+        owner = self.owner_rank()
+        statistics_file = os.path.join(self.directory, "Particles", "Axes_0.dat")
+        if lead and self.particles and self.statistics_step > 0 and not os.path.exists(statistics_file):
+            with open(statistics_file, 'w') as f:
+                f.write("t a b c\n")
+
+        if lead:
+            print(f"LBCode (synthetic): lattice {self.size[0]}x{self.size[1]}x{self.size[2]}, "
+                  f"{len(blocks)} ranks, t = {self.start} -> {self.end}", flush=True)
+        previous = self.start
+        wall_start = time.time()
+        for t in self.event_times():
+            time.sleep(self.seconds_per_step * (t - previous))
+            previous = t
+
+            for rank in self.ranks:
+                if self.fluid_step > 0 and t % self.fluid_step == 0:
+                    self.write_fluid(t, rank, blocks[rank])
+                if self.particles and self.particle_step > 0 and t % self.particle_step == 0 and rank == owner:
+                    self.write_particles(t, rank)
+                if self.checkpoint_step > 0 and t % self.checkpoint_step == 0 and t > self.start:
+                    self.write_checkpoint(t, rank, blocks[rank])
+
+            if lead and self.particles and self.statistics_step > 0 and t % self.statistics_step == 0:
+                _, (a, b, c) = self.particle_shape(t)
+                with open(statistics_file, 'a') as f:
+                    f.write(f"{t} {a:.8g} {b:.8g} {c:.8g}\n")
+
+            if lead and self.info_step > 0 and t % self.info_step == 0:
+                elapsed = time.time() - wall_start
+                updates = np.prod(self.size) * (t - self.start)
+                mlups = updates / elapsed / 1e6 if elapsed > 0 else float('inf')
+                print(f"t = {t} / {self.end} ({100 * t / max(self.end, 1):.1f}%), "
+                      f"MLUPS = {mlups:.2f}, D = {self.deformation(t):.6f}", flush=True)
+
+        if lead:
+            print("Simulation finished.", flush=True)
+        return 0
+
+
+def _is_fake_lbcode(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return b"-m LBMSimulationInterface.fake_lbcode" in f.read(4096)
+
+
+def install_fake_lbcode(template_path: str, overwrite: bool = False) -> str:
+    """
+    Write an executable `LBCode` script into a template directory which runs
+    the fake solver with the current Python interpreter.
+
+    Args:
+        template_path (str): Path to the template directory.
+        overwrite (bool): Replace an existing `LBCode` that is not the fake
+            solver's script, e.g. the real binary of a copied template.
+
+    Returns:
+        str: Path to the script.
+
+    Raises:
+        FileExistsError: If the template already has another `LBCode` and
+            `overwrite` is not set.
+    """
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script_path = os.path.join(template_path, "LBCode")
+    if os.path.exists(script_path) and not overwrite and not _is_fake_lbcode(script_path):
+        raise FileExistsError(
+            f"{script_path} is not the fake solver; pass overwrite=True to replace it "
+            f"(use a copy of the template, not the template itself)."
+        )
+    with open(script_path, 'w') as f:
+        f.write(
+            "#!/bin/sh\n"
+            f'PYTHONPATH="{package_root}${{PYTHONPATH:+:$PYTHONPATH}}" '
+            f'exec "{sys.executable}" -m LBMSimulationInterface.fake_lbcode "$@"\n'
+        )
+    os.chmod(script_path, os.stat(script_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return script_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic stand-in for LBCode.")
+    parser.add_argument("--directory", default=".", help="Simulation directory.")
+    parser.add_argument("--seconds-per-step", type=float,
+                        default=float(os.environ.get("FAKE_LBCODE_SECONDS_PER_STEP", 0)),
+                        help="Wall time spent per lattice step.")
+    args = parser.parse_args()
+    sys.exit(FakeLBCode(args.directory, args.seconds_per_step).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# field_comparison.py
+
+"""
+This module compares the fluid fields of two runs, e.g. the x-driven and the
+y-driven Couette flow of `couette_symmetry_test`, or the same case before and
+after a change to LBCode or the template.
+
+The runs are streamed one timestep at a time and every field is compared in
+slabs of `chunk_size` z-planes, so neither time series is ever held in
+memory. An optional axis permutation and reflection maps the second run
+onto the first before comparing (vector components are permuted and
+reflected with it), and the L2, L-infinity and relative errors of every
+field and timestep are checked against tolerances.
+
+Use it as a regression gate from the command line; the exit code is 1 if a
+tolerance is exceeded:
+
+    python -m LBMSimulationInterface.field_comparison data/x_velocity_merged data/y_velocity_merged --permutation y x z
+"""
+
+import re
+import sys
+import json
+import pathlib
+import argparse
+import numpy as np
+import pyvista as pv
+import joblib as jb
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+from .vtk_utils import AXES, read_vtk, interpolate_fluid_timestep
+
+METRICS = ("l2", "linf", "relative_l2", "relative_linf")
+DEFAULT_TOLERANCES = {"relative_l2": 1e-3}
+# Added by pyvista's interpolation, not a field of the simulation
+IGNORED_ARRAYS = ("vtkValidPointMask",)
+
+
+class FieldError(NamedTuple):
+    """
+    Errors of one field at one timestep. `l2` is the root mean square and
+    `linf` the maximum of the pointwise difference (its magnitude for
+    vectors); the relative errors divide by the same norms of the reference.
+    """
+    timestep: int
+    field: str
+    l2: float
+    linf: float
+    relative_l2: float
+    relative_linf: float
+    passed: bool
+
+
+class Transform(NamedTuple):
+    """
+    Mapping of the second run onto the first: axis `i` of the first run is
+    axis `permutation[i]` of the second, reflected if `reflect[i]` is set.
+    """
+    permutation: Tuple[int, int, int] = (0, 1, 2)
+    reflect: Tuple[bool, bool, bool] = (False, False, False)
+
+    @classmethod
+    def create(cls,
+               permutation: Optional[Sequence[Union[int, str]]] = None,
+               reflect: Iterable[Union[int, str]] = ()) -> "Transform":
+        """
+        Args:
+            permutation (Optional[Sequence[Union[int, str]]]): Axes of the
+                second run in the order of the axes of the first, e.g.
+                ('y', 'x', 'z') to compare x-driven with y-driven flow.
+            reflect (Iterable[Union[int, str]]): Axes of the first run along
+                which the second run is mirrored, e.g. ('z',).
+        """
+        axis = lambda a: AXES[a] if isinstance(a, str) else int(a)
+        permutation = tuple(axis(a) for a in permutation) if permutation is not None else (0, 1, 2)
+        if sorted(permutation) != [0, 1, 2]:
+            raise ValueError(f"{permutation} is not a permutation of the axes")
+        reflected = {axis(a) for a in reflect}
+        return cls(permutation, tuple(i in reflected for i in range(3)))
+
+    @property
+    def identity(self) -> bool:
+        return self.permutation == (0, 1, 2) and not any(self.reflect)
+
+    def apply(self, values: np.ndarray) -> np.ndarray:
+        """
+        Apply the mapping to a field shaped (z, y, x, ...), as views of the data.
+        """
+        if self.identity:
+            return values
+        # Axis i of the lattice is numpy axis 2 - i
+        spatial = [2 - self.permutation[2 - k] for k in range(3)]
+        values = values.transpose(spatial + list(range(3, values.ndim)))
+        for i in range(3):
+            if self.reflect[i]:
+                values = np.flip(values, axis=2 - i)
+        return values
+
+    def apply_components(self, values: np.ndarray) -> np.ndarray:
+        """
+        Permute and reflect the components of a vector field.
+        """
+        if self.identity:
+            return values
+        values = values[..., list(self.permutation)]
+        signs = np.where(self.reflect, -1, 1).astype(values.dtype)
+        return values * signs
+
+
+class FieldComparison:
+    """
+    Class for the result of `compare_runs`.
+    """
+
+    def __init__(self, errors: List[FieldError], missing: Dict[str, List[int]], tolerances: Dict[str, float]):
+        self.errors = errors
+        self.missing = missing
+        self.tolerances = tolerances
+
+    @property
+    def passed(self) -> bool:
+        """
+        True if every field of every timestep is within the tolerances and
+        no timestep is missing from either run.
+        """
+        return all(e.passed for e in self.errors) and not any(self.missing.values())
+
+    def failures(self) -> List[FieldError]:
+        return [e for e in self.errors if not e.passed]
+
+    def worst(self) -> Dict[str, Dict[str, float]]:
+        """
+        Largest value of every metric over the timesteps, per field.
+        """
+        worst = {}
+        for e in self.errors:
+            field = worst.setdefault(e.field, {m: 0.0 for m in METRICS})
+            for m in METRICS:
+                field[m] = max(field[m], getattr(e, m))
+        return worst
+
+    def to_dataframe(self):
+        """
+        Returns:
+            pandas.DataFrame: One row per timestep and field.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.errors, columns=FieldError._fields)
+
+    def to_dict(self) -> Dict:
+        return {
+            "passed": self.passed,
+            "tolerances": self.tolerances,
+            "missing": self.missing,
+            "worst": self.worst(),
+            "errors": [e._asdict() for e in self.errors],
+        }
+
+    def save(self, filename: str) -> None:
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def __repr__(self) -> str:
+        timesteps = len({e.timestep for e in self.errors})
+        state = "passed" if self.passed else f"failed ({len(self.failures())} field errors)"
+        return f"FieldComparison({timesteps} timesteps, {state})"
+
+
+def fluid_timesteps(run_path: str) -> Dict[int, Callable[[], pv.DataSet]]:
+    """
+    Loaders of the fluid timesteps of a run.
+
+    Args:
+        run_path (str): A merged simulation directory, its `VTKFluid`
+            directory, or an unmerged simulation, whose rank files are
+            merged in memory one timestep at a time.
+
+    Returns:
+        Dict[int, Callable[[], pyvista.DataSet]]: Loader of every timestep.
+    """
+    path = pathlib.Path(run_path)
+    if (path / "VTKFluid").is_dir():
+        path = path / "VTKFluid"
+
+    merged = re.compile(r"Fluid_t(?P<timestep>\d+)\.vtr$")
+    loaders = {}
+    for filename in path.iterdir():
+        match = merged.match(filename.name)
+        if match:
+            loaders[int(match.group('timestep'))] = lambda filename=filename: read_vtk(filename)
+    if loaders:
+        return dict(sorted(loaders.items()))
+
+    ranks = re.compile(r"Fluid_p(?P<core>\d+)_t(?P<timestep>\d+)\.vtk$")
+    matches = [m for m in (ranks.match(f.name) for f in path.iterdir()) if m]
+    if not matches:
+        raise FileNotFoundError(f"No fluid files in {path}")
+    mpi_cores = max(int(m.group('core')) for m in matches) + 1
+    for timestep in sorted({int(m.group('timestep')) for m in matches}):
+        loaders[timestep] = lambda timestep=timestep: interpolate_fluid_timestep(timestep, mpi_cores, path)[0]
+    return loaders
+
+
+def _field(grid: pv.DataSet, name: str) -> np.ndarray:
+    values = np.asarray(grid.point_data[name])
+    return values.reshape(tuple(grid.dimensions[::-1]) + values.shape[1:])
+
+
+def compare_fields(reference: np.ndarray, other: np.ndarray, chunk_size: int = 16,
+                   map_slab: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> Dict[str, float]:
+    """
+    Errors between two fields of the same shape (z, y, x, ...), accumulated
+    over slabs of `chunk_size` z-planes in double precision.
+
+    Args:
+        reference (np.ndarray): Reference field.
+        other (np.ndarray): Compared field.
+        chunk_size (int): Number of z-planes per slab.
+        map_slab (Optional[Callable[[np.ndarray], np.ndarray]]): Applied to
+            each slab of `other` before comparing, e.g. to map vector components.
+
+    Returns:
+        Dict[str, float]: The values of `METRICS`.
+    """
+    if reference.shape != other.shape:
+        raise ValueError(f"Fields of shape {reference.shape} and {other.shape} cannot be compared")
+    vector = reference.ndim > 3
+    squared_error = squared_norm = 0.0
+    max_error = max_norm = 0.0
+    for start in range(0, reference.shape[0], chunk_size):
+        a = reference[start:start + chunk_size].astype(np.float64)
+        b = other[start:start + chunk_size]
+        if map_slab is not None:
+            b = map_slab(b)
+        d = b - a
+        if vector:
+            d = np.sqrt(np.einsum('...i,...i->...', d, d))
+            a = np.sqrt(np.einsum('...i,...i->...', a, a))
+        else:
+            d = np.abs(d)
+            a = np.abs(a)
+        squared_error += float(np.dot(d.ravel(), d.ravel()))
+        squared_norm += float(np.dot(a.ravel(), a.ravel()))
+        max_error = max(max_error, float(d.max(initial=0.0)))
+        max_norm = max(max_norm, float(a.max(initial=0.0)))
+
+    n = max(int(np.prod(reference.shape[:3])), 1)
+    l2 = np.sqrt(squared_error / n)
+    return {
+        "l2": float(l2),
+        "linf": max_error,
+        "relative_l2": float(np.sqrt(squared_error / squared_norm)) if squared_norm else float(l2),
+        "relative_linf": max_error / max_norm if max_norm else max_error,
+    }
+
+
+def compare_timestep(reference: pv.DataSet, other: pv.DataSet, timestep: int,
+                     transform: Transform = Transform(),
+                     fields: Optional[Sequence[str]] = None,
+                     tolerances: Optional[Dict[str, float]] = None,
+                     chunk_size: int = 16) -> List[FieldError]:
+    """
+    Compare the fields of two grids of one timestep. See `compare_runs`.
+    """
+    tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+    if fields is None:
+        fields = [n for n in reference.point_data.keys()
+                  if n in other.point_data.keys() and n not in IGNORED_ARRAYS]
+    errors = []
+    for name in fields:
+        a = _field(reference, name)
+        b = transform.apply(_field(other, name))
+        map_slab = None
+        if not transform.identity and b.ndim > 3:
+            if b.shape[-1] != 3:
+                raise ValueError(f"Cannot transform the {b.shape[-1]} components of {name}")
+            map_slab = transform.apply_components
+        metrics = compare_fields(a, b, chunk_size, map_slab)
+        passed = all(metrics[m] <= tolerance for m, tolerance in tolerances.items())
+        errors.append(FieldError(timestep, name, passed=passed, **metrics))
+    return errors
+
+
+def _compare_loaded(timestep: int, load_reference: Callable, load_other: Callable, **options) -> List[FieldError]:
+    return compare_timestep(load_reference(), load_other(), timestep, **options)
+
+
+def compare_runs(reference_path: str, other_path: str,
+                 permutation: Optional[Sequence[Union[int, str]]] = None,
+                 reflect: Iterable[Union[int, str]] = (),
+                 fields: Optional[Sequence[str]] = None,
+                 timesteps: Optional[Sequence[int]] = None,
+                 tolerances: Optional[Dict[str, float]] = None,
+                 chunk_size: int = 16,
+                 num_cores: int = 1,
+                 fail_fast: bool = False) -> FieldComparison:
+    """
+    Compare the fluid fields of two runs timestep by timestep.
+
+    **Usage:**
+
+    ```python
+    # x-driven against y-driven Couette flow
+    comparison = compare_runs("data/x_velocity_merged", "data/y_velocity_merged",
+                              permutation=('y', 'x', 'z'), tolerances={"relative_l2": 1e-4})
+    print(comparison.worst())
+    comparison.to_dataframe().pivot(index="timestep", columns="field", values="relative_l2").plot()
+    ```
+
+    Args:
+        reference_path (str): The reference run, merged or not (see `fluid_timesteps`).
+        other_path (str): The run compared against it.
+        permutation (Optional[Sequence[Union[int, str]]]): Axes of the other
+            run in the order of the reference's axes.
+        reflect (Iterable[Union[int, str]]): Axes of the reference along
+            which the other run is mirrored.
+        fields (Optional[Sequence[str]]): Point arrays to compare. Defaults
+            to all arrays in both runs.
+        timesteps (Optional[Sequence[int]]): Timesteps to compare. Defaults
+            to all timesteps of either run; timesteps missing from one run
+            fail the comparison.
+        tolerances (Optional[Dict[str, float]]): Upper limits of any of
+            `METRICS`, applied to every field. Defaults to a relative L2
+            error of 1e-3.
+        chunk_size (int): Number of z-planes compared at once.
+        num_cores (int): Number of timesteps compared in parallel. Each
+            worker holds one timestep of both runs.
+        fail_fast (bool): Stop after the first timestep that fails, e.g.
+            for a quick regression gate. Only with `num_cores=1`.
+
+    Returns:
+        FieldComparison: The errors of every field and timestep.
+    """
+    tolerances = DEFAULT_TOLERANCES if tolerances is None else dict(tolerances)
+    unknown = set(tolerances) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}; use {METRICS}")
+
+    reference = fluid_timesteps(reference_path)
+    other = fluid_timesteps(other_path)
+    if timesteps is None:
+        timesteps = sorted(set(reference) | set(other))
+    missing = {
+        "reference": [t for t in timesteps if t not in reference],
+        "other": [t for t in timesteps if t not in other],
+    }
+    common = [t for t in timesteps if t in reference and t in other]
+    options = dict(transform=Transform.create(permutation, reflect), fields=fields,
+                   tolerances=tolerances, chunk_size=chunk_size)
+
+    errors = []
+    if num_cores == 1:
+        for timestep in common:
+            timestep_errors = _compare_loaded(timestep, reference[timestep], other[timestep], **options)
+            errors.extend(timestep_errors)
+            if fail_fast and not all(e.passed for e in timestep_errors):
+                break
+    else:
+        for timestep_errors in jb.Parallel(n_jobs=num_cores)(
+            jb.delayed(_compare_loaded)(t, reference[t], other[t], **options) for t in common
+        ):
+            errors.extend(timestep_errors)
+    return FieldComparison(errors, missing, tolerances)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fluid fields of two runs.")
+    parser.add_argument("reference", help="Reference run.")
+    parser.add_argument("other", help="Run compared against the reference.")
+    parser.add_argument("--permutation", nargs=3, default=None, help="Axes of the other run, e.g. y x z.")
+    parser.add_argument("--reflect", nargs="*", default=(), help="Axes along which the other run is mirrored.")
+    parser.add_argument("--fields", nargs="*", default=None, help="Point arrays to compare.")
+    parser.add_argument("--timesteps", nargs="*", type=int, default=None, help="Timesteps to compare.")
+    parser.add_argument("--tolerance", nargs="*", default=None, metavar="METRIC=VALUE",
+                        help=f"Tolerances of {', '.join(METRICS)}. Defaults to relative_l2=1e-3.")
+    parser.add_argument("--cores", type=int, default=1, help="Timesteps compared in parallel.")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop at the first failing timestep.")
+    parser.add_argument("--output", default=None, help="Save the report as JSON.")
+    args = parser.parse_args()
+
+    tolerances = None
+    if args.tolerance is not None:
+        tolerances = {m: float(v) for m, v in (t.split("=", 1) for t in args.tolerance)}
+    comparison = compare_runs(
+        args.reference, args.other, permutation=args.permutation, reflect=args.reflect,
+        fields=args.fields, timesteps=args.timesteps, tolerances=tolerances,
+        num_cores=args.cores, fail_fast=args.fail_fast,
+    )
+    if args.output:
+        comparison.save(args.output)
+
+    for field, metrics in comparison.worst().items():
+        print(f"{field:>12s}: " + "  ".join(f"{m}={v:.3e}" for m, v in metrics.items()))
+    for run, timesteps in comparison.missing.items():
+        if timesteps:
+            print(f"Missing from {run}: {timesteps}")
+    for e in comparison.failures():
+        print(f"FAIL t={e.timestep} {e.field}: " + "  ".join(f"{m}={getattr(e, m):.3e}" for m in METRICS))
+    print("passed" if comparison.passed else "failed")
+    sys.exit(0 if comparison.passed else 1)
+
+
+if __name__ == "__main__":
+    main()
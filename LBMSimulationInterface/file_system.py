@@ -3,14 +3,34 @@
 import os
 import shutil
 import json
+import threading
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
+from .tracing import span, directory_size
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _lock(f) -> None:
+    """
+    Take an exclusive lock on an open file until it is closed, so processes
+    on other nodes sharing the root directory do not interleave updates.
+    """
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
 
 class FileSystem:
     """
     Class for handling file system operations.
     """
 
+    # Serialises updates of the lookup json by simulations run from threads
+    _lookup_lock = threading.Lock()
+
     @staticmethod
     def create_directory(directory_name: str, overwrite: bool = False) -> None:
         """
@@ -21,11 +41,12 @@ class FileSystem:
             overwrite (bool): Overwrite if directory exists.
         """
         path = Path(directory_name)
-        if not path.exists():
-            path.mkdir(parents=True)
-        elif overwrite:
-            shutil.rmtree(path)
-            path.mkdir(parents=True)
+        with span("create_directory", simulation=path.name):
+            if not path.exists():
+                path.mkdir(parents=True)
+            elif overwrite:
+                shutil.rmtree(path)
+                path.mkdir(parents=True)
 
     @staticmethod
     def copy_file(source_file: str, destination_directory: str) -> None:
@@ -37,7 +58,10 @@ class FileSystem:
             destination_directory (str): Path to the destination directory.
         """
         destination = Path(destination_directory) / Path(source_file).name
-        shutil.copy2(source_file, destination)
+        with span("copy_file", simulation=Path(destination_directory).name, file=destination.name) as s:
+            shutil.copy2(source_file, destination)
+            if s:
+                s.add(bytes=os.path.getsize(destination), files=1)
 
     @staticmethod
     def copy_directory(source_directory: str, destination_directory: str) -> None:
@@ -50,7 +74,10 @@ class FileSystem:
         """
         destination = Path(destination_directory) / Path(source_directory).name
         if Path(source_directory).exists():
-            shutil.copytree(source_directory, destination)
+            with span("copy_directory", simulation=Path(destination_directory).name, directory=destination.name) as s:
+                shutil.copytree(source_directory, destination)
+                if s:
+                    s.add(**directory_size(destination))
         else:
             raise FileNotFoundError(f"Source directory {source_directory} not found.")
 
@@ -82,48 +109,140 @@ class FileSystem:
         else:
             with open(lookup_file, 'r') as infile:
                 lookup_data = json.load(infile)
-                return max(map(int, lookup_data.keys())) + 1
+                # Named simulations (e.g. 'Ca=0.1') do not take part in the numbering
+                numeric_ids = [int(k) for k in lookup_data.keys() if k.isdigit()]
+                return max(numeric_ids) + 1 if numeric_ids else 0
 
     @staticmethod
     def update_json(root_directory: str,
                     parameters_dictionary: Dict[str, Any],
-                    exit_code: int) -> None:
+                    exit_code: Optional[int],
+                    simulation_id: Optional[Union[int, str]] = None,
+                    physical_parameters: Optional[Dict[str, Any]] = None,
+                    unit_conversion: Optional[Dict[str, Any]] = None,
+                    resources: Optional[Dict[str, Any]] = None) -> None:
         """
         Update the simulation lookup JSON file.
 
         Args:
             root_directory (str): Path to the root directory.
             parameters_dictionary (Dict[str, Any]): Parameters used in the simulation.
-            exit_code (int): Exit code of the simulation.
+            exit_code (Optional[int]): Exit code of the simulation, or None if
+                it has not been run yet.
+            simulation_id (Optional[Union[int, str]]): ID of the simulation. An
+                existing entry with the same ID is replaced. Defaults to the
+                next free numeric ID.
+            physical_parameters (Optional[Dict[str, Any]]): Physical inputs
+                the parameters were computed from, stored as "Physical".
+            unit_conversion (Optional[Dict[str, Any]]): How the lattice values
+                were computed, stored as "Unit conversion".
+            resources (Optional[Dict[str, Any]]): Resource usage of the run,
+                as from `ResourceSampler.summary`, stored as "Resources". The
+                usage of the individual ranks is only kept in simulation_info.json.
         """
         lookup_file = Path(root_directory) / "simulation_lookup.json"
-        simulation_ID = FileSystem.get_next_ID(str(lookup_file))
+        simulation_ID = simulation_id
+        if simulation_ID is None:
+            simulation_ID = FileSystem.get_next_ID(str(lookup_file))
 
-        if simulation_ID == 0:
-            with open(lookup_file, 'w') as outfile:
-                json.dump({}, outfile)
-        with open(lookup_file, 'r+') as f:
-            lookup_data = json.load(f)
-            lookup_data[str(simulation_ID)] = {
-                "Simulation ID": simulation_ID,
-                "Parameters": parameters_dictionary,
-                "Exit code": exit_code
-            }
+        entry = {
+            "Simulation ID": simulation_ID,
+            "Parameters": parameters_dictionary,
+        }
+        if physical_parameters is not None:
+            entry["Physical"] = physical_parameters
+        if unit_conversion is not None:
+            entry["Unit conversion"] = unit_conversion
+        if resources is not None:
+            entry["Resources"] = resources
+
+        with FileSystem._lookup_lock, open(lookup_file, 'a+') as f:
+            _lock(f)
+            f.seek(0)
+            contents = f.read()
+            lookup_data = json.loads(contents) if contents.strip() else {}
+            lookup_data[str(simulation_ID)] = FileSystem._registry_entry(dict(entry, **{"Exit code": exit_code}))
             f.seek(0)
-            json.dump(lookup_data, f, indent=4)
             f.truncate()
+            json.dump(lookup_data, f, indent=4)
 
         # Write simulation info to a file in the simulation directory
         simulation_subfolder = Path(root_directory) / str(simulation_ID)
         simulation_info_path = simulation_subfolder / "simulation_info.json"
         with open(simulation_info_path, 'w') as info_file:
-            json.dump({
-                "Simulation ID": simulation_ID,
-                "Parameters": parameters_dictionary
-            }, info_file, indent=4)
+            json.dump(entry, info_file, indent=4)
         
     @staticmethod
-    def check_simulation_exists(root_directory: str, parameter_updates: Dict[str, Any]) -> bool:
+    def _registry_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The entry as stored in the lookup json, without per-rank details.
+        """
+        if isinstance(entry.get("Resources"), dict) and "ranks" in entry["Resources"]:
+            entry = dict(entry, Resources={k: v for k, v in entry["Resources"].items() if k != "ranks"})
+        return entry
+
+    @staticmethod
+    def update_resources(root_directory: str,
+                         simulation_id: Union[int, str],
+                         resources: Optional[Dict[str, Any]]) -> None:
+        """
+        Record the resource usage of an already registered simulation in the
+        lookup json and its simulation_info.json.
+
+        Args:
+            root_directory (str): Path to the root directory.
+            simulation_id (Union[int, str]): ID of the simulation.
+            resources (Optional[Dict[str, Any]]): Resource usage, as from
+                `ResourceSampler.summary`.
+
+        Raises:
+            KeyError: If the simulation is not in the lookup json.
+        """
+        lookup_file = Path(root_directory) / "simulation_lookup.json"
+        with FileSystem._lookup_lock, open(lookup_file, 'r+') as f:
+            _lock(f)
+            lookup_data = json.load(f)
+            entry = dict(lookup_data[str(simulation_id)], Resources=resources)
+            lookup_data[str(simulation_id)] = FileSystem._registry_entry(entry)
+            f.seek(0)
+            json.dump(lookup_data, f, indent=4)
+            f.truncate()
+
+        simulation_info_path = Path(root_directory) / str(simulation_id) / "simulation_info.json"
+        if simulation_info_path.exists():
+            with open(simulation_info_path, 'r') as info_file:
+                simulation_info = json.load(info_file)
+            simulation_info["Resources"] = resources
+            with open(simulation_info_path, 'w') as info_file:
+                json.dump(simulation_info, info_file, indent=4)
+
+    @staticmethod
+    def update_exit_code(root_directory: str,
+                         simulation_id: Union[int, str],
+                         exit_code: Optional[int]) -> None:
+        """
+        Record the exit code of an already registered simulation.
+
+        Args:
+            root_directory (str): Path to the root directory.
+            simulation_id (Union[int, str]): ID of the simulation.
+            exit_code (Optional[int]): Exit code of the simulation.
+
+        Raises:
+            KeyError: If the simulation is not in the lookup json.
+        """
+        lookup_file = Path(root_directory) / "simulation_lookup.json"
+        with FileSystem._lookup_lock, open(lookup_file, 'r+') as f:
+            _lock(f)
+            lookup_data = json.load(f)
+            lookup_data[str(simulation_id)]["Exit code"] = exit_code
+            f.seek(0)
+            json.dump(lookup_data, f, indent=4)
+            f.truncate()
+
+    @staticmethod
+    def check_simulation_exists(root_directory: str, parameter_updates: Dict[str, Any],
+                                physical_parameters: Optional[Dict[str, Any]] = None) -> bool:
         """
         Check if any simulation with matching parameters exists in the lookup json.
         If found, verify consistency with simulation_info.json.
@@ -131,6 +250,8 @@ class FileSystem:
         Args:
             root_directory: Root directory containing simulation data
             parameter_updates: Dictionary of parameter updates to match against
+            physical_parameters: If given, match the recorded physical
+                parameters instead of the parameter updates
 
         Returns:
             bool: True if matching simulation exists and is consistent
@@ -139,13 +260,18 @@ class FileSystem:
             ValueError: If simulation found in lookup but mismatch in simulation_info.json
         """
         lookup_file = Path(root_directory) / "simulation_lookup.json"
+
+        def matches(simulation_info: Dict[str, Any]) -> bool:
+            if physical_parameters is not None:
+                return simulation_info.get("Physical") == physical_parameters
+            return simulation_info["Parameters"] == parameter_updates
         
         # Find matching simulation by parameters
         matching_simulation_id = None
         with open(lookup_file, 'r') as infile:
             lookup_data = json.load(infile)
             for simulation_id, simulation_info in lookup_data.items():
-                if simulation_info["Parameters"] == parameter_updates:
+                if matches(simulation_info):
                     matching_simulation_id = simulation_id
                     break
         
@@ -158,7 +284,7 @@ class FileSystem:
         
         with open(simulation_info_path, 'r') as info_file:
             simulation_info = json.load(info_file)
-            if simulation_info["Parameters"] != parameter_updates:
+            if not matches(simulation_info):
                 raise ValueError(f"Simulation {matching_simulation_id} found in lookup json but mismatch in simulation_info.json")
         
         return True
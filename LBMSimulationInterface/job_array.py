@@ -0,0 +1,284 @@
+# job_array.py
+
+"""
+This module provides backends which run a whole campaign of prepared
+simulations as one job array. The campaign is rendered as a manifest, with
+the simulation directory of array index i on line i + 1, and a shell script
+which looks up its directory in the manifest and runs LBCode there. No Python
+process is involved per task, and the same script is used by the SLURM
+backend and by the local stand-in, so campaigns can be tested offline.
+"""
+
+import os
+import re
+import shlex
+import subprocess
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+from .file_system import FileSystem
+from .simulation_setup import SimulationSetup
+
+EXIT_CODE_FILE = "exit_code"
+
+
+class JobArray:
+    """
+    Class describing a campaign of prepared simulations to run as a job array.
+
+    **Usage:**
+
+    ```python
+    setups = [SimulationSetup(...) for parameters in campaign]
+    job_array = JobArray.from_setups(setups, "study/jobs/ca_sweep", num_cores=6)
+    SlurmBackend(time="12:00:00").submit(job_array)
+    # ... once the array has finished
+    job_array.collect_exit_codes()
+    ```
+    """
+
+    def __init__(self,
+                 simulation_directories: List[str],
+                 job_directory: str,
+                 num_cores: int = 1,
+                 logfile: str = "log.txt"):
+        """
+        Args:
+            simulation_directories (List[str]): Prepared simulation directories,
+                each of the form `<root_path>/<simulation_id>`.
+            job_directory (str): Directory for the manifest, script and scheduler logs.
+            num_cores (int): Number of cores per simulation.
+            logfile (str): Name of the LBCode log file in each simulation directory.
+        """
+        self.simulation_directories = [os.path.abspath(d) for d in simulation_directories]
+        self.job_directory = os.path.abspath(job_directory)
+        self.num_cores = num_cores
+        self.logfile = logfile
+
+    @classmethod
+    def from_setups(cls, setups: List[SimulationSetup], job_directory: str,
+                    num_cores: int = 1, logfile: str = "log.txt") -> "JobArray":
+        """
+        Create a job array from prepared SimulationSetup objects.
+
+        Args:
+            setups (List[SimulationSetup]): Prepared simulations.
+            job_directory (str): Directory for the manifest, script and scheduler logs.
+            num_cores (int): Number of cores per simulation.
+            logfile (str): Name of the LBCode log file in each simulation directory.
+
+        Returns:
+            JobArray: The job array.
+        """
+        return cls([s.simulation_directory for s in setups], job_directory, num_cores, logfile)
+
+    def __len__(self) -> int:
+        return len(self.simulation_directories)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.job_directory, "manifest.txt")
+
+    def write_manifest(self) -> str:
+        """
+        Write the index-to-directory manifest.
+
+        Returns:
+            str: Path to the manifest.
+        """
+        FileSystem.create_root(self.job_directory)
+        with open(self.manifest_path, 'w') as f:
+            f.write(''.join(f"{d}\n" for d in self.simulation_directories))
+        return self.manifest_path
+
+    def task_commands(self, index_variable: str) -> str:
+        """
+        Shell commands which run the simulation of one array index.
+
+        Args:
+            index_variable (str): Environment variable holding the array index.
+
+        Returns:
+            str: The commands.
+        """
+        command = ' '.join(shlex.quote(c) for c in SimulationSetup.simulation_command(self.num_cores))
+        return (
+            f'DIRECTORY=$(sed -n "$(( ${{{index_variable}}} + 1 ))p" {shlex.quote(self.manifest_path)})\n'
+            f'cd "$DIRECTORY" || exit 1\n'
+            f'{command} > {shlex.quote(self.logfile)} 2>&1\n'
+            f'EXIT_CODE=$?\n'
+            f'echo $EXIT_CODE > {EXIT_CODE_FILE}\n'
+            f'exit $EXIT_CODE\n'
+        )
+
+    def collect_exit_codes(self) -> List[Optional[int]]:
+        """
+        Read the exit code of every simulation and record it in the lookup json
+        of its root directory.
+
+        Returns:
+            List[Optional[int]]: Exit code per array index, or None for
+            simulations which have not finished.
+        """
+        exit_codes = []
+        for directory in self.simulation_directories:
+            exit_code_file = Path(directory) / EXIT_CODE_FILE
+            exit_code = int(exit_code_file.read_text()) if exit_code_file.exists() else None
+            exit_codes.append(exit_code)
+            if exit_code is not None:
+                FileSystem.update_exit_code(
+                    os.path.dirname(directory), os.path.basename(directory), exit_code
+                )
+        return exit_codes
+
+
+class Backend(ABC):
+    """
+    Base class for job array backends.
+    """
+
+    index_variable = "TASK_ID"
+    script_name = "job.sh"
+
+    def render(self, job_array: JobArray) -> str:
+        """
+        Write the manifest and the job script of a job array.
+
+        Args:
+            job_array (JobArray): The job array.
+
+        Returns:
+            str: Path to the job script.
+
+        Raises:
+            ValueError: If the job array has no simulations.
+        """
+        if len(job_array) == 0:
+            raise ValueError(f"The job array in {job_array.job_directory} has no simulations")
+        job_array.write_manifest()
+        script_path = os.path.join(job_array.job_directory, self.script_name)
+        with open(script_path, 'w') as f:
+            f.write(self.script_header(job_array))
+            f.write(job_array.task_commands(self.index_variable))
+        os.chmod(script_path, 0o755)
+        return script_path
+
+    def script_header(self, job_array: JobArray) -> str:
+        """
+        Lines of the job script before the task commands.
+        """
+        return "#!/bin/bash\n"
+
+    @abstractmethod
+    def submit(self, job_array: JobArray):
+        """
+        Render and run (or queue) all tasks of a job array.
+        """
+
+
+class SlurmBackend(Backend):
+    """
+    Backend rendering a job array as a SLURM sbatch script.
+    """
+
+    index_variable = "SLURM_ARRAY_TASK_ID"
+    script_name = "job.sbatch"
+
+    def __init__(self,
+                 time: str = "24:00:00",
+                 partition: Optional[str] = None,
+                 account: Optional[str] = None,
+                 max_concurrent: Optional[int] = None,
+                 job_name: str = "LBCode",
+                 directives: Optional[List[str]] = None):
+        """
+        Args:
+            time (str): Wall time limit per task.
+            partition (Optional[str]): SLURM partition.
+            account (Optional[str]): SLURM account.
+            max_concurrent (Optional[int]): Maximum number of tasks running at once.
+            job_name (str): Name of the job.
+            directives (Optional[List[str]]): Additional `#SBATCH` options,
+                e.g. ['--mem-per-cpu=2G'].
+        """
+        self.time = time
+        self.partition = partition
+        self.account = account
+        self.max_concurrent = max_concurrent
+        self.job_name = job_name
+        self.directives = directives or []
+
+    def script_header(self, job_array: JobArray) -> str:
+        array = f"0-{len(job_array) - 1}"
+        if self.max_concurrent is not None:
+            array += f"%{self.max_concurrent}"
+        directives = [
+            f"--job-name={self.job_name}",
+            f"--array={array}",
+            f"--ntasks={job_array.num_cores}",
+            f"--time={self.time}",
+            f"--output={os.path.join(job_array.job_directory, 'slurm_%A_%a.out')}",
+        ]
+        if self.partition is not None:
+            directives.append(f"--partition={self.partition}")
+        if self.account is not None:
+            directives.append(f"--account={self.account}")
+        directives.extend(self.directives)
+        return "#!/bin/bash\n" + ''.join(f"#SBATCH {d}\n" for d in directives) + "\n"
+
+    def submit(self, job_array: JobArray) -> str:
+        """
+        Render the job array and submit it with sbatch.
+
+        Args:
+            job_array (JobArray): The job array.
+
+        Returns:
+            str: The SLURM job ID.
+        """
+        script_path = self.render(job_array)
+        output = subprocess.run(
+            ["sbatch", script_path], capture_output=True, text=True, check=True
+        ).stdout
+        return re.search(r"(\d+)", output).group(1)
+
+
+class LocalBackend(Backend):
+    """
+    Backend running a job array on the local machine, with the same script
+    and manifest as a scheduler would use.
+    """
+
+    index_variable = "SLURM_ARRAY_TASK_ID"
+
+    def __init__(self, total_cores: Optional[int] = None):
+        """
+        Args:
+            total_cores (Optional[int]): Number of cores shared by the tasks.
+                Defaults to the number of CPUs of the machine.
+        """
+        self.total_cores = total_cores or os.cpu_count()
+
+    def submit(self, job_array: JobArray) -> List[int]:
+        """
+        Render the job array and run all of its tasks, as many at a time as
+        fit in the available cores.
+
+        Args:
+            job_array (JobArray): The job array.
+
+        Returns:
+            List[int]: Exit code per array index.
+        """
+        script_path = self.render(job_array)
+
+        def run_task(index: int) -> int:
+            env = dict(os.environ, **{self.index_variable: str(index)})
+            return subprocess.run(["bash", script_path], env=env).returncode
+
+        max_workers = max(1, self.total_cores // job_array.num_cores)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            exit_codes = list(executor.map(run_task, range(len(job_array))))
+        job_array.collect_exit_codes()
+        return exit_codes
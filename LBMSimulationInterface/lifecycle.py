@@ -0,0 +1,366 @@
+# lifecycle.py
+
+"""
+This module provides a data lifecycle manager for the simulations in a root
+path. A policy assigns a retention rule to each class of artefact found in a
+simulation directory (copied template, raw per-rank VTK files, checkpoints,
+merged output, logs), and can enforce a byte quota by evicting the least
+valuable data of the oldest simulations first. Plans can be reported as a
+dry run before anything is deleted.
+
+Only simulations which have finished (according to the lookup json) and
+have not been modified recently are touched, so the manager can run while a
+campaign is still going.
+"""
+
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import shutil
+import warnings
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+from .checkpoints import list_checkpoints, prunable_checkpoints
+
+# Glob patterns, relative to a simulation directory, of each artefact class
+ARTEFACT_CLASSES = {
+    "template": ["LBCode", "MeshGenerator"],
+    "raw": [
+        os.path.join("VTKFluid", "Fluid_p*_t*.vtk"),
+        os.path.join("VTKLocalFluid", "localFluid_p*_t*.vtk"),
+        os.path.join("VTKParticles", "*_rank*_t*.vtk"),
+    ],
+    "checkpoints": ["Backup"],
+    "merged": [
+        os.path.join("VTKFluid", "*.vtr"),
+        os.path.join("VTKLocalFluid", "*.vtr"),
+        os.path.join("VTKParticles", "*.vtp"),
+    ],
+    "logs": ["log.txt", os.path.join("logs", "*.log")],
+}
+
+Rule = Union[str, tuple]
+
+# Suffix of the sibling directory holding the out-of-place merge of a simulation
+MERGED_SUFFIX = "_merged"
+# Marker left in the output directory by the merge stage of the pipeline
+MERGE_MARKER = os.path.join(".postprocessing", "merge.done")
+
+
+class LifecycleAction(NamedTuple):
+    simulation_directory: str
+    artefact_class: str
+    action: str
+    paths: List[str]
+    size: int
+    reason: str
+
+
+def _size(path: str) -> int:
+    """
+    Size in bytes of a file or of all files below a directory.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _last_modified(path: str) -> float:
+    """
+    Latest modification time of a directory tree.
+    """
+    latest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                pass
+    return latest
+
+
+class LifecyclePolicy:
+    """
+    Class describing the retention rule of each artefact class and the quota.
+
+    Rules are 'keep', 'delete', 'delete_if_merged' (raw per-rank files whose
+    timestep has a merged file), 'compress' (gzip) or ('keep_last', n)
+    (checkpoints).
+
+    **Usage:**
+
+    ```python
+    policy = LifecyclePolicy(quota_bytes=2 * 1024**4)
+    manager = LifecycleManager("study1/simulations", policy)
+    print(manager.report())   # dry run
+    manager.apply()
+    ```
+    """
+
+    def __init__(self,
+                 rules: Optional[Dict[str, Rule]] = None,
+                 quota_bytes: Optional[int] = None,
+                 eviction_order: Sequence[str] = ("checkpoints", "raw", "template"),
+                 min_age: float = 3600.0):
+        """
+        Args:
+            rules (Optional[Dict[str, Rule]]): Rule per artefact class. Classes
+                not given keep their default rule: raw files are deleted after
+                a verified merge, the last checkpoint is kept, logs are
+                compressed and everything else is kept.
+            quota_bytes (Optional[int]): Maximum total size of the root path.
+            eviction_order (Sequence[str]): Artefact classes evicted, oldest
+                simulations first, while the quota is exceeded.
+            min_age (float): Simulations modified within this many seconds
+                are left alone.
+        """
+        self.rules = {
+            "template": "keep",
+            "raw": "delete_if_merged",
+            "checkpoints": ("keep_last", 1),
+            "merged": "keep",
+            "logs": "compress",
+        }
+        self.rules.update(rules or {})
+        self.quota_bytes = quota_bytes
+        self.eviction_order = list(eviction_order)
+        self.min_age = min_age
+
+
+class LifecycleManager:
+    """
+    Class to plan and apply a lifecycle policy to the simulations in a root path.
+    """
+
+    def __init__(self, root_path: str, policy: Optional[LifecyclePolicy] = None,
+                 merged_root: Optional[str] = None):
+        """
+        Args:
+            root_path (str): Root path of the simulations.
+            policy (Optional[LifecyclePolicy]): Policy to apply. Defaults to
+                `LifecyclePolicy()`.
+            merged_root (Optional[str]): Directory holding the merged output
+                of each simulation under the same name (as written by
+                `convert_simulation_directories`). The `<simulation>_merged`
+                sibling and the simulation directory itself are always checked.
+        """
+        self.root_path = root_path
+        self.policy = policy or LifecyclePolicy()
+        self.merged_root = merged_root
+        # Bytes above the quota left after the last plan
+        self.quota_shortfall = 0
+
+    def simulation_directories(self) -> List[str]:
+        """
+        Finished simulation directories which are old enough to be managed,
+        oldest first.
+
+        Returns:
+            List[str]: Paths to the simulation directories.
+        """
+        lookup_file = os.path.join(self.root_path, "simulation_lookup.json")
+        lookup_data = {}
+        if os.path.exists(lookup_file):
+            with open(lookup_file, 'r') as f:
+                lookup_data = json.load(f)
+
+        now = time.time()
+        directories = []
+        for entry in os.scandir(self.root_path):
+            if (not entry.is_dir() or entry.name.startswith('.')
+                    or entry.name.endswith(("_temp_merge", "_temp_raw", MERGED_SUFFIX))):
+                continue
+            if entry.name in lookup_data and lookup_data[entry.name]["Exit code"] is None:
+                # Prepared or still running
+                continue
+            last_modified = _last_modified(entry.path)
+            if now - last_modified < self.policy.min_age:
+                continue
+            directories.append((last_modified, entry.path))
+        return [d for _, d in sorted(directories)]
+
+    def artefacts(self, simulation_directory: str, artefact_class: str) -> List[str]:
+        """
+        Paths of one artefact class in a simulation directory.
+        """
+        paths = []
+        for pattern in ARTEFACT_CLASSES[artefact_class]:
+            paths.extend(sorted(glob.glob(os.path.join(simulation_directory, pattern))))
+        return paths
+
+    def _rule_actions(self, simulation_directory: str, artefact_class: str, rule: Rule) -> List[LifecycleAction]:
+        paths = self.artefacts(simulation_directory, artefact_class)
+        if not paths or rule == "keep":
+            return []
+
+        if rule == "delete":
+            return [LifecycleAction(simulation_directory, artefact_class, "delete", paths,
+                                    sum(_size(p) for p in paths), "rule: delete")]
+
+        if rule == "compress":
+            paths = [p for p in paths if os.path.isfile(p) and not p.endswith(".gz")]
+            return [LifecycleAction(simulation_directory, artefact_class, "compress", [p],
+                                    _size(p), "rule: compress") for p in paths]
+
+        if rule == "delete_if_merged":
+            verified = [p for p in paths if self._is_merged(simulation_directory, p)]
+            if not verified:
+                return []
+            return [LifecycleAction(simulation_directory, artefact_class, "delete", verified,
+                                    sum(_size(p) for p in verified), "rule: merged output verified")]
+
+        if isinstance(rule, tuple) and rule[0] == "keep_last":
+            checkpoints = list_checkpoints(os.path.join(simulation_directory, "Backup"))
+            actions = []
+            for timestep in prunable_checkpoints(simulation_directory, rule[1], checkpoints):
+                files = [str(f) for f in checkpoints[timestep]["LBM"] + checkpoints[timestep]["MEM"]]
+                actions.append(LifecycleAction(simulation_directory, artefact_class, "delete", files,
+                                               sum(_size(f) for f in files),
+                                               f"rule: keep last {rule[1]} checkpoints (t={timestep})"))
+            return actions
+
+        raise ValueError(f"Unknown lifecycle rule {rule!r} for {artefact_class}.")
+
+    def merged_directories(self, simulation_directory: str) -> List[str]:
+        """
+        Existing directories which may hold the merged output of a simulation.
+        """
+        name = os.path.basename(os.path.normpath(simulation_directory))
+        candidates = [os.path.join(os.path.dirname(os.path.normpath(simulation_directory)), name + MERGED_SUFFIX)]
+        if self.merged_root is not None:
+            candidates.append(os.path.join(self.merged_root, name))
+        candidates.append(simulation_directory)
+        return [d for d in candidates if os.path.isdir(d)]
+
+    def _is_merged(self, simulation_directory: str, raw_file: str) -> bool:
+        """
+        Check that the timestep of a raw per-rank file has been merged: either
+        the pipeline's merge marker exists in a merged output directory of the
+        simulation, or the merged file of the timestep exists there.
+        """
+        name = os.path.basename(raw_file)
+        match = re.match(r"(?P<prefix>Fluid|localFluid|Particles|Axes)_(p|rank)\d+_t(?P<timestep>\d+)\.vtk", name)
+        if match is None:
+            return False
+        prefix = "Particles" if match.group("prefix") in ("Particles", "Axes") else match.group("prefix")
+        extension = "vtp" if prefix == "Particles" else "vtr"
+        relative = os.path.join(os.path.relpath(os.path.dirname(raw_file), simulation_directory),
+                                f"{prefix}_t{match.group('timestep')}.{extension}")
+        for directory in self.merged_directories(simulation_directory):
+            merged = os.path.join(directory, relative)
+            if os.path.exists(merged) and os.path.getsize(merged) > 0:
+                return True
+            # An out-of-place merge also covers timesteps it did not write (e.g. statistics only)
+            if (not os.path.samefile(directory, simulation_directory)
+                    and os.path.exists(os.path.join(directory, MERGE_MARKER))):
+                return True
+        return False
+
+    def plan(self) -> List[LifecycleAction]:
+        """
+        Plan the actions required by the policy, without changing anything.
+
+        Raw per-rank files are only evicted once their timestep has been
+        merged. If the quota cannot be met by evicting from the managed
+        simulations (unfinished runs, recently modified runs and merged
+        output are never evicted), a warning is issued and the shortfall is
+        kept in `quota_shortfall` and shown by `report`.
+
+        Returns:
+            List[LifecycleAction]: Actions from the rules, followed by any
+            evictions needed to meet the quota.
+        """
+        self.quota_shortfall = 0
+        directories = self.simulation_directories()
+        actions = []
+        for directory in directories:
+            for artefact_class, rule in self.policy.rules.items():
+                actions.extend(self._rule_actions(directory, artefact_class, rule))
+
+        if self.policy.quota_bytes is None:
+            return actions
+
+        # Compressed logs are assumed to shrink to nothing for the quota estimate
+        usage = _size(self.root_path) - sum(a.size for a in actions)
+        planned = {p for a in actions if a.action == "delete" for p in a.paths}
+        for artefact_class in self.policy.eviction_order:
+            for directory in directories:
+                if usage <= self.policy.quota_bytes:
+                    return actions
+                paths = [p for p in self.artefacts(directory, artefact_class) if p not in planned]
+                if artefact_class == "raw":
+                    paths = [p for p in paths if self._is_merged(directory, p)]
+                if not paths:
+                    continue
+                size = sum(_size(p) for p in paths)
+                actions.append(LifecycleAction(directory, artefact_class, "delete", paths, size,
+                                               "quota exceeded"))
+                planned.update(paths)
+                usage -= size
+        if usage > self.policy.quota_bytes:
+            self.quota_shortfall = usage - self.policy.quota_bytes
+            warnings.warn(
+                f"{self.root_path} stays {self.quota_shortfall / 1024**2:.1f} MB above its quota after all "
+                f"evictions; the rest is unmerged raw output, merged output or unfinished or recent simulations."
+            )
+        return actions
+
+    def report(self, actions: Optional[List[LifecycleAction]] = None) -> str:
+        """
+        Describe planned actions (a dry run).
+
+        Args:
+            actions (Optional[List[LifecycleAction]]): Planned actions.
+                Defaults to `plan()`.
+
+        Returns:
+            str: One line per action, the total bytes freed and, if the
+            quota cannot be met, the remaining excess.
+        """
+        if actions is None:
+            actions = self.plan()
+        lines = [
+            f"{a.action:8s} {a.size / 1024**2:10.1f} MB  {os.path.relpath(a.simulation_directory, self.root_path)}"
+            f"  {a.artefact_class} ({len(a.paths)} paths, {a.reason})"
+            for a in actions
+        ]
+        lines.append(f"Total: {sum(a.size for a in actions) / 1024**2:.1f} MB in {len(actions)} actions")
+        if self.quota_shortfall:
+            lines.append(f"Quota still exceeded by {self.quota_shortfall / 1024**2:.1f} MB")
+        return '\n'.join(lines)
+
+    def apply(self, actions: Optional[List[LifecycleAction]] = None) -> List[LifecycleAction]:
+        """
+        Carry out planned actions.
+
+        Args:
+            actions (Optional[List[LifecycleAction]]): Planned actions.
+                Defaults to `plan()`.
+
+        Returns:
+            List[LifecycleAction]: The actions that were carried out.
+        """
+        if actions is None:
+            actions = self.plan()
+        for action in actions:
+            for path in action.paths:
+                if not os.path.exists(path):
+                    continue
+                if action.action == "compress":
+                    with open(path, 'rb') as source, gzip.open(path + ".gz", 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    os.remove(path)
+                elif os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+        return actions
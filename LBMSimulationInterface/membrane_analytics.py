@@ -0,0 +1,378 @@
+# membrane_analytics.py
+
+"""
+This module computes shape metrics of the particle membranes from their node
+positions and the fixed triangle connectivity of the particle mesh, so that
+metrics beyond the Taylor deformation in `Axes_0.dat` need no re-run.
+
+All functions take node arrays of shape (..., nodes, 3), e.g. (timesteps,
+nodes, 3) for a whole trajectory, and are evaluated with batched NumPy
+operations over the timesteps and faces. Volume integrals are turned into
+sums over the surface triangles with the divergence theorem, each triangle
+spanning a tetrahedron with the origin.
+"""
+
+import os
+import re
+import glob
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+from .particle_utils import read_mesh
+from .xml_handler import XmlBioFM
+
+# Number of timesteps evaluated together, bounding the (timesteps, faces, 3) temporaries
+DEFAULT_CHUNK_SIZE = 64
+
+
+def orient_triangles(triangles: np.ndarray) -> np.ndarray:
+    """
+    Reorder the nodes of triangles so that neighbouring triangles are
+    consistently oriented, as the divergence theorem requires. Some of the
+    meshes in MeshGenerator contain triangles wound the other way round.
+
+    The connectivity is fixed, so this is done once per mesh. The first
+    triangle of every connected surface keeps its orientation, and the
+    orientation is propagated across shared edges one front of neighbours
+    at a time, each front as one array operation.
+
+    Args:
+        triangles (np.ndarray): (faces, 3) node indices of a closed surface.
+
+    Returns:
+        np.ndarray: (faces, 3) node indices, consistently oriented.
+    """
+    triangles = np.array(triangles)
+    num_faces = len(triangles)
+    # Directed edges (start, end) of every face, and the undirected edge they lie on
+    start = triangles.ravel()
+    end = triangles[:, [1, 2, 0]].ravel()
+    face = np.repeat(np.arange(num_faces), 3)
+    edge = np.minimum(start, end) * (int(triangles.max(initial=0)) + 1) + np.maximum(start, end)
+
+    # Pair every directed edge with the first directed edge on the same undirected edge
+    order = np.argsort(edge, kind='stable')
+    first = np.r_[True, edge[order][1:] != edge[order][:-1]]
+    group_first = order[np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]
+    other = order[~first]
+    a, b = face[group_first[~first]], face[other]
+    # A consistently oriented neighbour runs along the shared edge the other way
+    flip_relative = start[group_first[~first]] == start[other]
+    a, b, flip_relative = np.r_[a, b], np.r_[b, a], np.r_[flip_relative, flip_relative]
+    # Neighbours of each face as compressed rows
+    by_face = np.argsort(a, kind='stable')
+    a, b, flip_relative = a[by_face], b[by_face], flip_relative[by_face]
+    row_start = np.r_[0, np.cumsum(np.bincount(a, minlength=num_faces))]
+
+    flip = np.zeros(num_faces, dtype=bool)
+    known = np.zeros(num_faces, dtype=bool)
+    while not known.all():
+        front = np.array([np.argmin(known)])
+        known[front] = True
+        while len(front):
+            lengths = row_start[front + 1] - row_start[front]
+            pairs = np.repeat(row_start[front] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            pairs = pairs[~known[b[pairs]]]
+            flip[b[pairs]] = flip[a[pairs]] ^ flip_relative[pairs]
+            front = np.unique(b[pairs])
+            known[front] = True
+    triangles[flip] = triangles[flip][:, [0, 2, 1]]
+    return triangles
+
+
+def _triangle_vertices(nodes: np.ndarray, triangles: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vertices of every triangle as (..., 3, faces) arrays. Keeping the faces
+    on the last axis makes the gathers and products below contiguous.
+    """
+    components = np.ascontiguousarray(np.swapaxes(nodes, -1, -2))
+    return tuple(np.take(components, triangles[:, k], axis=-1) for k in range(3))
+
+
+def _cross(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    # Cross product over the component axis -2
+    return np.stack([
+        u[..., 1, :] * v[..., 2, :] - u[..., 2, :] * v[..., 1, :],
+        u[..., 2, :] * v[..., 0, :] - u[..., 0, :] * v[..., 2, :],
+        u[..., 0, :] * v[..., 1, :] - u[..., 1, :] * v[..., 0, :],
+    ], axis=-2)
+
+
+def _area(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    normal = _cross(b - a, c - a)
+    return 0.5 * np.sqrt(np.einsum('...if,...if->...f', normal, normal)).sum(axis=-1)
+
+
+def surface_area(nodes: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Surface area of the membrane.
+
+    Args:
+        nodes (np.ndarray): (..., nodes, 3) node positions.
+        triangles (np.ndarray): (faces, 3) node indices, as from `read_mesh`.
+
+    Returns:
+        np.ndarray: Area with the leading shape of `nodes`.
+    """
+    return _area(*_triangle_vertices(nodes, triangles))
+
+
+def enclosed_volume(nodes: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Volume enclosed by the membrane, positive regardless of the orientation
+    of the surface.
+
+    Args:
+        nodes (np.ndarray): (..., nodes, 3) node positions.
+        triangles (np.ndarray): (faces, 3) node indices, consistently
+            oriented (see `orient_triangles`).
+
+    Returns:
+        np.ndarray: Volume with the leading shape of `nodes`.
+    """
+    a, b, c = _triangle_vertices(nodes, triangles)
+    return np.abs(np.einsum('...if,...if->...', a, _cross(b, c)) / 6)
+
+
+def _ellipsoid(a: np.ndarray, b: np.ndarray, c: np.ndarray
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Six times the signed volume of each tetrahedron (origin, a, b, c)
+    det = np.einsum('...if,...if->...f', a, _cross(b, c))
+    volume = det.sum(axis=-1) / 6
+    det *= np.sign(volume)[..., None]
+    volume = np.abs(volume)
+
+    # Integral of x x^T over a tetrahedron (0, a, b, c):
+    # det / 120 * (a a^T + b b^T + c c^T + s s^T) with s = a + b + c
+    s = a + b + c
+    weights = det[..., None, :]
+    second_moment = sum(np.matmul(v * weights, np.swapaxes(v, -1, -2)) for v in (a, b, c, s)) / 120
+    first_moment = np.einsum('...f,...if->...i', det, s) / 24
+
+    centroid = first_moment / volume[..., None]
+    central = second_moment - volume[..., None, None] * centroid[..., :, None] * centroid[..., None, :]
+    eigenvalues, eigenvectors = np.linalg.eigh(central)
+    # eigh sorts ascending; report the major axis first
+    eigenvalues, eigenvectors = eigenvalues[..., ::-1], eigenvectors[..., ::-1]
+    semi_axes = np.sqrt(np.clip(5 * eigenvalues / volume[..., None], 0, None))
+    return volume, centroid, semi_axes, eigenvectors
+
+
+def inertia_ellipsoid(nodes: np.ndarray, triangles: np.ndarray
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Volume, centroid and the ellipsoid with the same second moments as the
+    volume enclosed by the membrane.
+
+    For a solid ellipsoid with semi-axes a, b, c the second moment tensor
+    about the centroid has the eigenvalues V a^2 / 5, V b^2 / 5 and
+    V c^2 / 5, which is used to turn the tensor into semi-axes.
+
+    Args:
+        nodes (np.ndarray): (..., nodes, 3) node positions.
+        triangles (np.ndarray): (faces, 3) node indices, consistently
+            oriented (see `orient_triangles`).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Volume (...),
+        centroid (..., 3), semi-axes (..., 3) sorted from largest to
+        smallest, and the matching unit axis directions (..., 3, 3) with
+        one direction per column.
+    """
+    # Integrate relative to the mean node position to avoid cancellation
+    origin = nodes.mean(axis=-2, keepdims=True)
+    volume, centroid, semi_axes, directions = _ellipsoid(*_triangle_vertices(nodes - origin, triangles))
+    return volume, centroid + origin[..., 0, :], semi_axes, directions
+
+
+def inclination_angle(directions: np.ndarray, plane: Tuple[int, int] = (0, 2)) -> np.ndarray:
+    """
+    Angle of the major axis to the first axis of a plane, e.g. the
+    inclination to the flow direction x in the x-z shear plane.
+
+    Args:
+        directions (np.ndarray): (..., 3, 3) axis directions as returned by
+            `inertia_ellipsoid`, the major axis in the first column.
+        plane (Tuple[int, int]): Indices of the flow and gradient directions.
+
+    Returns:
+        np.ndarray: Angle in degrees, in (-90, 90].
+    """
+    major = directions[..., :, 0]
+    angle = np.degrees(np.arctan2(major[..., plane[1]], major[..., plane[0]]))
+    # The sign of an eigenvector is arbitrary
+    return np.where(angle > 90, angle - 180, np.where(angle <= -90, angle + 180, angle))
+
+
+def membrane_shape_analytics(nodes: np.ndarray,
+                             triangles: np.ndarray,
+                             time: Optional[np.ndarray] = None,
+                             plane: Tuple[int, int] = (0, 2),
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Shape metrics of a membrane trajectory.
+
+    Args:
+        nodes (np.ndarray): (timesteps, ..., nodes, 3) node positions.
+        triangles (np.ndarray): (faces, 3) node indices, which are
+            oriented consistently first.
+        time (Optional[np.ndarray]): Time of every timestep, needed for the
+            centroid velocity. Defaults to the timestep index.
+        plane (Tuple[int, int]): Flow and gradient directions for the inclination.
+        chunk_size (int): Number of timesteps evaluated at once.
+
+    Returns:
+        Dict[str, np.ndarray]: 'time', 'area', 'volume', 'centroid',
+        'semi_axes' (a >= b >= c), 'taylor_deformation' (a - c)/(a + c),
+        'inclination' in degrees and 'centroid_velocity', per timestep.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    triangles = orient_triangles(triangles)
+    if time is None:
+        time = np.arange(len(nodes), dtype=float)
+    time = np.asarray(time, dtype=float)
+
+    chunks = {"area": [], "volume": [], "centroid": [], "semi_axes": [], "inclination": []}
+    for start in range(0, len(nodes), chunk_size):
+        chunk = nodes[start:start + chunk_size]
+        origin = chunk.mean(axis=-2, keepdims=True)
+        vertices = _triangle_vertices(chunk - origin, triangles)
+        volume, centroid, semi_axes, directions = _ellipsoid(*vertices)
+        centroid += origin[..., 0, :]
+        chunks["area"].append(_area(*vertices))
+        chunks["volume"].append(volume)
+        chunks["centroid"].append(centroid)
+        chunks["semi_axes"].append(semi_axes)
+        chunks["inclination"].append(inclination_angle(directions, plane))
+    results = {name: np.concatenate(values) if values else np.empty(0) for name, values in chunks.items()}
+
+    semi_axes = results["semi_axes"]
+    results["time"] = time
+    results["taylor_deformation"] = (
+        (semi_axes[..., 0] - semi_axes[..., 2]) / (semi_axes[..., 0] + semi_axes[..., 2])
+        if len(semi_axes) else np.empty(0)
+    )
+    results["centroid_velocity"] = (
+        np.gradient(results["centroid"], time, axis=0) if len(time) > 1 else np.zeros_like(results["centroid"])
+    )
+    return results
+
+
+def _timestep(filename: str) -> int:
+    return int(re.search(r"_t(\d+)\.", filename).group(1))
+
+
+def load_particle_trajectory(data_path: str,
+                             num_nodes: Optional[int] = None,
+                             timesteps: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read the node positions of the merged particle files of a simulation.
+
+    Args:
+        data_path (str): Path to the merged simulation directory.
+        num_nodes (Optional[int]): Number of nodes of one particle mesh. If
+            given, the nodes are split into particles, assuming the particles
+            are stored one after another.
+        timesteps (Optional[Sequence[int]]): Only read these timesteps.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The timesteps, and the node positions
+        as (timesteps, nodes, 3), or (timesteps, particles, nodes, 3) if
+        `num_nodes` is given.
+
+    Raises:
+        ValueError: If the files do not all have the same connectivity (so
+            the node order differs between timesteps), or the number of
+            nodes is not a multiple of `num_nodes`.
+    """
+    from .vtk_utils import read_vtk
+
+    files = sorted(glob.glob(os.path.join(data_path, "VTKParticles", "Particles_t*.vtp")), key=_timestep)
+    if timesteps is not None:
+        wanted = set(timesteps)
+        files = [f for f in files if _timestep(f) in wanted]
+    time = np.array([_timestep(f) for f in files])
+    if not files:
+        return time, np.empty((0, 0, 3))
+
+    meshes = [read_vtk(f) for f in files]
+    for f, mesh in zip(files[1:], meshes[1:]):
+        if mesh.n_points != meshes[0].n_points or not np.array_equal(mesh.faces, meshes[0].faces):
+            raise ValueError(f"The particle nodes of {f} differ from those of {files[0]}.")
+    nodes = np.stack([np.asarray(mesh.points, dtype=float) for mesh in meshes])
+    if num_nodes is not None:
+        if nodes.shape[1] % num_nodes:
+            raise ValueError(f"{files[0]} has {nodes.shape[1]} nodes, not a multiple of {num_nodes} per particle.")
+        nodes = nodes.reshape(len(files), -1, num_nodes, 3)
+    return time, nodes
+
+
+def load_particle_triangles(data_path: str, num_nodes: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Read the triangle connectivity stored in the merged particle files, so
+    the node order of the files need not match the mesh file.
+
+    Args:
+        data_path (str): Path to the merged simulation directory.
+        num_nodes (Optional[int]): Number of nodes of one particle. If given,
+            the connectivity of one particle is returned, after checking
+            that every particle has the same connectivity on its own nodes.
+
+    Returns:
+        Optional[np.ndarray]: (faces, 3) node indices, or None if the files
+        have no triangles.
+
+    Raises:
+        ValueError: If the particles do not share one connectivity on
+            consecutive blocks of `num_nodes` nodes.
+    """
+    from .vtk_utils import read_vtk
+
+    files = sorted(glob.glob(os.path.join(data_path, "VTKParticles", "Particles_t*.vtp")), key=_timestep)
+    if not files:
+        return None
+    mesh = read_vtk(files[0])
+    if mesh.n_cells == 0 or not mesh.is_all_triangles:
+        return None
+    triangles = mesh.faces.reshape(-1, 4)[:, 1:]
+    if num_nodes is None:
+        return triangles
+
+    num_particles, remainder = divmod(mesh.n_points, num_nodes)
+    if remainder or len(triangles) % max(num_particles, 1):
+        raise ValueError(f"{files[0]} cannot be split into particles of {num_nodes} nodes.")
+    per_particle = triangles.reshape(num_particles, -1, 3)
+    offsets = np.arange(num_particles)[:, None, None] * num_nodes
+    if not np.array_equal(per_particle - offsets, np.broadcast_to(per_particle[0], per_particle.shape)):
+        raise ValueError(f"The particles in {files[0]} are not stored one after another with the same mesh.")
+    return per_particle[0]
+
+
+def analyse_particle_trajectory(data_path: str,
+                                mesh_file: Optional[str] = None,
+                                plane: Tuple[int, int] = (0, 2),
+                                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Shape metrics of the particles of a merged simulation.
+
+    Args:
+        data_path (str): Path to the merged simulation directory.
+        mesh_file (Optional[str]): The particle mesh, which gives the number
+            of nodes per particle. Defaults to the file set in
+            `parametersMeshes.xml` of the simulation. The triangles are taken
+            from the particle files, or from the mesh if the files have none.
+        plane (Tuple[int, int]): Flow and gradient directions for the inclination.
+        chunk_size (int): Number of timesteps evaluated at once.
+
+    Returns:
+        Dict[str, np.ndarray]: As `membrane_shape_analytics`, with a particle
+        axis after the time axis, e.g. 'volume' of shape (timesteps, particles).
+    """
+    if mesh_file is None:
+        meshes = XmlBioFM.flatten_parameters(os.path.join(data_path, "parametersMeshes.xml"))
+        mesh_file = os.path.join(data_path, meshes["mesh.general.file"])
+    mesh_nodes, mesh_triangles = read_mesh(mesh_file)
+    time, nodes = load_particle_trajectory(data_path, num_nodes=len(mesh_nodes))
+    triangles = load_particle_triangles(data_path, num_nodes=len(mesh_nodes))
+    if triangles is None:
+        triangles = mesh_triangles
+    return membrane_shape_analytics(nodes, triangles, time, plane, chunk_size)
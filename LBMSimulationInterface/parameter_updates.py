@@ -1,6 +1,7 @@
 # parameter_updates.py
 
 import math
+import numbers
 from typing import Dict, Tuple, Any
 
 class ParameterUpdates:
@@ -23,9 +24,16 @@ class ParameterUpdates:
     - Use the provided methods to specify parameter changes.
     - Pass the `ParameterUpdates` instance to `SimulationSetup` to apply the changes.
 
+    The physical inputs the lattice parameters were computed from (`physical`),
+    and how each lattice value was obtained from them (`conversion`), can be
+    recorded as well. Both are stored in the lookup json and
+    simulation_info.json next to the parameter updates.
+
     """
 
-    def __init__(self, parameter_updates: Dict[str, Dict[Tuple[str, ...], Any]] = None):
+    def __init__(self, parameter_updates: Dict[str, Dict[Tuple[str, ...], Any]] = None,
+                 physical_parameters: Dict[str, Any] = None,
+                 unit_conversion: Dict[str, Dict[str, Any]] = None):
         if parameter_updates is None:
             self.parameter_updates = {
                 "parameters.xml": {},
@@ -34,6 +42,36 @@ class ParameterUpdates:
             }
         else:
             self.parameter_updates = parameter_updates
+        self.physical_parameters = dict(physical_parameters or {})
+        self.unit_conversion = dict(unit_conversion or {})
+
+    def physical(self, **parameters: Any) -> "ParameterUpdates":
+        """
+        Record the physical input parameters of the simulation, e.g. Re_p, Ca.
+
+        Args:
+            **parameters: Physical parameters by name.
+
+        Returns:
+            ParameterUpdates: Self for method chaining.
+        """
+        self.physical_parameters.update(parameters)
+        return self
+
+    def conversion(self, quantity: str, formula: str, value: Any) -> "ParameterUpdates":
+        """
+        Record how a lattice quantity was computed from the physical parameters.
+
+        Args:
+            quantity (str): Name of the lattice quantity, e.g. 'kS'.
+            formula (str): The conversion, e.g. 'nu*shear_rate*radius/Ca'.
+            value (Any): The resulting lattice value.
+
+        Returns:
+            ParameterUpdates: Self for method chaining.
+        """
+        self.unit_conversion[quantity] = {"formula": formula, "value": value}
+        return self
 
     def MPI(self, mpi: Tuple[int, int, int]) -> "ParameterUpdates":
         """
@@ -239,4 +277,38 @@ class ParameterUpdates:
             json_compatible_updates[file_key] = {
                 '.'.join(k): str(v) for k, v in updates.items()
             }
-        return json_compatible_updates
\ No newline at end of file
+        return json_compatible_updates
+
+    def get_physical_parameters(self) -> Dict[str, Any]:
+        """
+        Get the physical parameters with JSON serializable values.
+
+        Returns:
+            Dict[str, Any]: Physical parameters by name.
+        """
+        return {k: _json_value(v) for k, v in self.physical_parameters.items()}
+
+    def get_unit_conversion(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the unit conversion record with JSON serializable values.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Formula and value per lattice quantity.
+        """
+        return {
+            quantity: {"formula": record["formula"], "value": _json_value(record["value"])}
+            for quantity, record in self.unit_conversion.items()
+        }
+
+
+def _json_value(value: Any) -> Any:
+    """
+    Convert a parameter value (possibly a numpy scalar) to a JSON type.
+    """
+    if isinstance(value, (bool, str)) or value is None:
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return str(value)
@@ -0,0 +1,101 @@
+# particle_utils.py
+
+"""
+This module provides functions for reading the particle statistics files that
+LBCode writes to the `Particles` directory of a simulation (e.g. `Axes_0.dat`),
+and for computing derived quantities such as the Taylor deformation.
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+def parse_particle_statistics(text: str,
+                              header: Optional[List[str]] = None
+                              ) -> Tuple[List[str], np.ndarray]:
+    """
+    Parse whitespace separated particle statistics.
+
+    Comment lines starting with '#' are skipped. The first remaining line holds
+    the column names unless `header` is given. Only complete lines are parsed,
+    so a file that is still being written can be read safely.
+
+    Args:
+        text (str): Contents of the statistics file.
+        header (Optional[List[str]]): Column names, if already known.
+
+    Returns:
+        Tuple[List[str], np.ndarray]: Column names and a (rows, columns) array.
+    """
+    if not text.endswith('\n'):
+        text = text[:text.rfind('\n') + 1]
+    lines = [line for line in text.splitlines() if line.strip() and not line.startswith('#')]
+    if header is None:
+        if not lines:
+            return [], np.empty((0, 0))
+        header = lines[0].split()
+        lines = lines[1:]
+    values = np.array(' '.join(lines).split(), dtype=float)
+    return header, values.reshape(-1, len(header))
+
+
+def read_particle_statistics(filepath: str) -> Dict[str, np.ndarray]:
+    """
+    Read a particle statistics file into a dictionary of columns.
+
+    Args:
+        filepath (str): Path to the statistics file, e.g. 'Particles/Axes_0.dat'.
+
+    Returns:
+        Dict[str, np.ndarray]: One array per column, keyed by column name.
+    """
+    with open(filepath, 'r') as f:
+        header, values = parse_particle_statistics(f.read())
+    return {name: values[:, i] for i, name in enumerate(header)}
+
+
+def taylor_deformation(statistics: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Calculate the Taylor deformation D = (a - c)/(a + c) from the particle axes.
+
+    Args:
+        statistics (Dict[str, np.ndarray]): Particle statistics containing the
+            semi-axes 'a' and 'c'.
+
+    Returns:
+        np.ndarray: Taylor deformation for every row of the statistics.
+    """
+    return (statistics['a'] - statistics['c']) / (statistics['a'] + statistics['c'])
+
+
+def read_mesh(filepath: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read the nodes and triangles of a Gmsh 2 mesh file, as used for the
+    particle meshes in MeshGenerator (e.g. 'sph_ico_1280.msh').
+
+    Args:
+        filepath (str): Path to the .msh file.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (nodes, 3) node coordinates and
+        (faces, 3) zero-based node indices of the triangles.
+    """
+    with open(filepath, 'r') as f:
+        lines = f.read().splitlines()
+
+    start = lines.index("$Nodes") + 1
+    num_nodes = int(lines[start])
+    nodes = np.array(' '.join(lines[start + 1:start + 1 + num_nodes]).split(), dtype=float).reshape(num_nodes, 4)
+    node_index = {int(i): n for n, i in enumerate(nodes[:, 0])}
+
+    start = lines.index("$Elements") + 1
+    num_elements = int(lines[start])
+    triangles = []
+    for line in lines[start + 1:start + 1 + num_elements]:
+        words = line.split()
+        # id, type (2 = triangle), number of tags, tags..., node ids
+        if words[1] != '2':
+            continue
+        triangles.append([node_index[int(w)] for w in words[3 + int(words[2]):]])
+    return nodes[:, 1:], np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
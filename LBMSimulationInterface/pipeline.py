@@ -0,0 +1,288 @@
+# pipeline.py
+
+"""
+This module provides a post-processing pipeline for completed simulations.
+Each simulation goes through the stages merge -> reduce -> prune in a worker
+pool, so post-processing of finished runs overlaps with the runs that are
+still going. The merge already drops the per-rank VTK files; on request, the
+prune stage deletes old checkpoints in `Backup` and the raw simulation
+directory of an out-of-place merge. Every stage leaves a completion marker
+in the merged output, so a pipeline that was interrupted resumes at the
+first unfinished stage.
+"""
+
+import os
+import re
+import glob
+import shutil
+import numpy as np
+import pyvista as pv
+from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+from .vtk_utils import merge_all_timesteps, velocity_array
+from .particle_utils import taylor_deformation
+from .campaign import load_statistics_file
+from .checkpoints import prune_checkpoints
+
+Reduction = Callable[[str], Dict[str, np.ndarray]]
+
+
+def _timestep(filename: str) -> int:
+    return int(re.search(r"_t(\d+)\.", filename).group(1))
+
+
+def reduce_deformation(data_path: str) -> Dict[str, np.ndarray]:
+    """
+    Taylor deformation of the particle over time, from `Particles/Axes_0.dat`.
+
+    Args:
+        data_path (str): Path to the (merged) simulation directory.
+
+    Returns:
+        Dict[str, np.ndarray]: 'time' and 'deformation' arrays.
+    """
+    statistics = load_statistics_file(os.path.join(data_path, "Particles", "Axes_0.dat"))
+    if statistics is None:
+        return {}
+    return {
+        "time": next(iter(statistics.values())),
+        "deformation": taylor_deformation(statistics),
+    }
+
+
+def reduce_centroid(data_path: str) -> Dict[str, np.ndarray]:
+    """
+    Centroid of the particle nodes over time, from the merged particle files.
+
+    Args:
+        data_path (str): Path to the merged simulation directory.
+
+    Returns:
+        Dict[str, np.ndarray]: 'time' and (timesteps, 3) 'centroid' arrays.
+    """
+    files = sorted(glob.glob(os.path.join(data_path, "VTKParticles", "Particles_t*.vtp")), key=_timestep)
+    if not files:
+        return {}
+    return {
+        "time": np.array([_timestep(f) for f in files]),
+        "centroid": np.array([pv.read(f).points.mean(axis=0) for f in files]),
+    }
+
+
+def reduce_flow_rate(data_path: str, axis: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Volumetric flow rate through the centre plane normal to an axis, from the
+    merged fluid files.
+
+    Args:
+        data_path (str): Path to the merged simulation directory.
+        axis (int): Flow direction (0, 1 or 2 for x, y or z).
+
+    Returns:
+        Dict[str, np.ndarray]: 'time' and 'flow_rate' arrays.
+    """
+    files = sorted(glob.glob(os.path.join(data_path, "VTKFluid", "Fluid_t*.vtr")), key=_timestep)
+    if not files:
+        return {}
+    flow_rates = []
+    for f in files:
+        grid = pv.read(f)
+        velocity = velocity_array(grid)
+        # Point data of a rectilinear grid is ordered with x varying fastest
+        velocity = velocity.reshape(grid.dimensions[::-1] + (3,))
+        centre = grid.dimensions[axis] // 2
+        plane = np.take(velocity, centre, axis=2 - axis)
+        flow_rates.append(plane[..., axis].sum())
+    return {
+        "time": np.array([_timestep(f) for f in files]),
+        "flow_rate": np.array(flow_rates),
+    }
+
+
+DEFAULT_REDUCTIONS = {
+    "deformation": reduce_deformation,
+    "centroid": reduce_centroid,
+    "flow_rate": reduce_flow_rate,
+}
+
+# Number of complete checkpoints kept in Backup by the prune stage (None keeps all)
+DEFAULT_KEEP_CHECKPOINTS = None
+
+
+def _is_merged(directory: str) -> bool:
+    """
+    Check that a directory holds merged output and no per-rank files, as an
+    in-place merge leaves it even if it was interrupted before its marker.
+    """
+    raw = glob.glob(os.path.join(directory, "VTK*", "*.vtk"))
+    merged = glob.glob(os.path.join(directory, "VTK*", "*.vt[rp]"))
+    return not raw and bool(merged)
+
+
+def process_simulation(simulation_directory: str,
+                       output_directory: Optional[str] = None,
+                       reductions: Optional[Dict[str, Reduction]] = None,
+                       prune_patterns: Optional[List[str]] = None,
+                       merge_cores: int = 1,
+                       keep_checkpoints: Optional[int] = DEFAULT_KEEP_CHECKPOINTS,
+                       remove_raw: bool = False) -> str:
+    """
+    Run the merge, reduce and prune stages for a single simulation.
+
+    Stages that have already completed (as recorded by a marker file in
+    `<output_directory>/.postprocessing`) are skipped.
+
+    Args:
+        simulation_directory (str): Path to the completed simulation directory.
+        output_directory (Optional[str]): Where the merged output is written.
+            Defaults to the simulation directory itself (an in-place merge).
+        reductions (Optional[Dict[str, Reduction]]): Reductions to compute,
+            each saved to `<output_directory>/reductions/<name>.npz`.
+        prune_patterns (Optional[List[str]]): Glob patterns, relative to the
+            output directory, of further files to delete once the merge and
+            reductions are done.
+        merge_cores (int): Number of cores used to merge the timesteps.
+        keep_checkpoints (Optional[int]): Number of complete checkpoints kept
+            in the `Backup` directory of the output, or None to keep all.
+            Pruned checkpoints can no longer be resumed from.
+        remove_raw (bool): After an out-of-place merge, delete the raw
+            simulation directory. The run registry still points at it, so
+            the simulation cannot be resumed or merged again afterwards.
+
+    Returns:
+        str: Path to the output directory.
+    """
+    if output_directory is None:
+        output_directory = simulation_directory
+    if reductions is None:
+        reductions = DEFAULT_REDUCTIONS
+    if prune_patterns is None:
+        prune_patterns = []
+    markers = Path(output_directory) / ".postprocessing"
+
+    if not (markers / "merge.done").exists():
+        if not (os.path.abspath(simulation_directory) == os.path.abspath(output_directory)
+                and _is_merged(output_directory)):
+            merge_all_timesteps(simulation_directory, output_directory, num_cores=merge_cores)
+        markers.mkdir(parents=True, exist_ok=True)
+        (markers / "merge.done").touch()
+
+    if not (markers / "reduce.done").exists():
+        reductions_path = Path(output_directory) / "reductions"
+        reductions_path.mkdir(exist_ok=True)
+        for name, reduction in reductions.items():
+            np.savez(reductions_path / f"{name}.npz", **reduction(output_directory))
+        (markers / "reduce.done").touch()
+
+    if not (markers / "prune.done").exists():
+        if remove_raw and os.path.abspath(simulation_directory) != os.path.abspath(output_directory):
+            # Errors propagate, so a partly deleted directory is reported
+            shutil.rmtree(simulation_directory)
+        if keep_checkpoints is not None:
+            prune_checkpoints(output_directory, keep_checkpoints)
+        for pattern in prune_patterns:
+            for f in glob.glob(os.path.join(output_directory, pattern)):
+                os.remove(f)
+        (markers / "prune.done").touch()
+
+    return output_directory
+
+
+class PostProcessingPipeline:
+    """
+    Class to post-process completed simulations in a pool of worker processes.
+
+    **Usage:**
+
+    ```python
+    pipeline = PostProcessingPipeline(num_workers=2)
+    for parameters in campaign:
+        setup = SimulationSetup(...)
+        setup.run_simulation(num_cores=6)
+        pipeline.submit(setup.simulation_directory)  # returns immediately
+    pipeline.wait()
+    ```
+    """
+
+    def __init__(self,
+                 num_workers: int = 4,
+                 merge_cores: int = 1,
+                 reductions: Optional[Dict[str, Reduction]] = None,
+                 prune_patterns: Optional[List[str]] = None,
+                 keep_checkpoints: Optional[int] = DEFAULT_KEEP_CHECKPOINTS,
+                 remove_raw: bool = False):
+        """
+        Args:
+            num_workers (int): Number of simulations processed concurrently.
+            merge_cores (int): Number of cores each worker uses for merging.
+            reductions (Optional[Dict[str, Reduction]]): Reductions to compute.
+                Defaults to deformation, centroid and flow rate.
+            prune_patterns (Optional[List[str]]): Further files to delete,
+                relative to the output directory.
+            keep_checkpoints (Optional[int]): Number of complete checkpoints
+                kept in `Backup`, or None to keep all.
+            remove_raw (bool): Delete the raw simulation directory after an
+                out-of-place merge.
+        """
+        self.merge_cores = merge_cores
+        self.reductions = reductions
+        self.prune_patterns = prune_patterns
+        self.keep_checkpoints = keep_checkpoints
+        self.remove_raw = remove_raw
+        self.executor = ProcessPoolExecutor(max_workers=num_workers)
+        self.futures: Dict[str, Future] = {}
+
+    def submit(self, simulation_directory: str, output_directory: Optional[str] = None) -> Future:
+        """
+        Queue a completed simulation for post-processing.
+
+        Args:
+            simulation_directory (str): Path to the completed simulation directory.
+            output_directory (Optional[str]): Where the merged output is written.
+                Defaults to an in-place merge.
+
+        Returns:
+            Future: Resolves to the output directory once all stages are done.
+        """
+        future = self.executor.submit(
+            process_simulation,
+            simulation_directory,
+            output_directory,
+            self.reductions,
+            self.prune_patterns,
+            self.merge_cores,
+            self.keep_checkpoints,
+            self.remove_raw,
+        )
+        self.futures[simulation_directory] = future
+        return future
+
+    def run(self, simulation_directories: List[str]) -> Dict[str, str]:
+        """
+        Post-process a list of completed simulations and wait for them.
+
+        Args:
+            simulation_directories (List[str]): Paths to the simulation directories.
+
+        Returns:
+            Dict[str, str]: Output directory of every simulation.
+        """
+        for simulation_directory in simulation_directories:
+            self.submit(simulation_directory)
+        return self.wait()
+
+    def wait(self) -> Dict[str, str]:
+        """
+        Wait for all submitted simulations and shut down the worker pool.
+
+        Returns:
+            Dict[str, str]: Output directory of every submitted simulation.
+
+        Raises:
+            Exception: The first exception raised by a stage. Completed stages
+            keep their markers, so the pipeline can simply be run again.
+        """
+        results = {d: f.result() for d, f in self.futures.items()}
+        self.executor.shutdown()
+        return results
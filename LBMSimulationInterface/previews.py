@@ -0,0 +1,331 @@
+# previews.py
+
+"""
+This module renders small PNG previews of merged fluid fields straight from
+NumPy arrays, without VTK rendering or a display: the velocity magnitude on
+the three centre planes, colour-mapped, with the outline of the particle
+where its surface crosses the plane. Previews of a whole campaign are tiled
+into one contact sheet, so a sweep can be triaged at a glance.
+
+PNG files are written (and read back for the contact sheet) with zlib and
+struct only.
+"""
+
+import os
+import re
+import glob
+import json
+import zlib
+import struct
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from .lifecycle import MERGED_SUFFIX
+
+PLANES = ("xy", "xz", "yz")
+PREVIEW_DIRECTORY = "previews"
+
+# Viridis, sampled at nine points and interpolated to 256 entries
+_VIRIDIS = np.array([
+    [68, 1, 84], [71, 44, 122], [59, 81, 139], [44, 113, 142], [33, 144, 141],
+    [39, 173, 129], [92, 200, 99], [170, 220, 50], [253, 231, 37],
+], dtype=float)
+COLORMAP = np.stack([
+    np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(_VIRIDIS)), _VIRIDIS[:, c]) for c in range(3)
+], axis=1).round().astype(np.uint8)
+
+OUTLINE_COLOUR = np.array([255, 255, 255], dtype=np.uint8)
+
+# 3x5 bitmap glyphs for the labels of the contact sheet, one row per string
+_FONT = {
+    "0": ["111", "101", "101", "101", "111"], "1": ["010", "110", "010", "010", "111"],
+    "2": ["111", "001", "111", "100", "111"], "3": ["111", "001", "111", "001", "111"],
+    "4": ["101", "101", "111", "001", "001"], "5": ["111", "100", "111", "001", "111"],
+    "6": ["111", "100", "111", "101", "111"], "7": ["111", "001", "010", "010", "010"],
+    "8": ["111", "101", "111", "101", "111"], "9": ["111", "101", "111", "001", "111"],
+    ".": ["000", "000", "000", "000", "010"], "-": ["000", "000", "111", "000", "000"],
+    "_": ["000", "000", "000", "000", "111"], "=": ["000", "111", "000", "111", "000"],
+}
+
+
+def write_png(filename: str, image: np.ndarray, level: int = 6) -> None:
+    """
+    Write an 8-bit RGB image as PNG.
+
+    Args:
+        filename (str): Output path.
+        image (np.ndarray): (height, width, 3) uint8 array, top row first.
+        level (int): zlib compression level.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width, _ = image.shape
+    # Every row starts with filter type 0 (none)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, -1)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    with open(filename, 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        f.write(chunk(b"IEND", b""))
+
+
+def read_png(filename: str) -> np.ndarray:
+    """
+    Read a PNG written by `write_png` (8-bit RGB, unfiltered rows).
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 array.
+
+    Raises:
+        ValueError: For other kinds of PNG files.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError(f"{filename} is not a PNG file.")
+    position, idat = 8, []
+    while position < len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if kind == b"IHDR":
+            width, height, depth, colour_type = struct.unpack(">IIBB", body[:10])
+            if depth != 8 or colour_type != 2:
+                raise ValueError(f"{filename} is not an 8-bit RGB PNG.")
+        elif kind == b"IDAT":
+            idat.append(body)
+        position += length + 12
+    rows = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, width * 3 + 1)
+    if rows[:, 0].any():
+        raise ValueError(f"{filename} uses PNG row filters, which are not supported.")
+    return rows[:, 1:].reshape(height, width, 3).copy()
+
+
+def apply_colormap(values: np.ndarray, vmin: Optional[float] = None, vmax: Optional[float] = None) -> np.ndarray:
+    """
+    Map values to RGB with the viridis lookup table.
+
+    Args:
+        values (np.ndarray): Array of any shape.
+        vmin (Optional[float]): Value mapped to the first colour. Defaults to the minimum.
+        vmax (Optional[float]): Value mapped to the last colour. Defaults to the maximum.
+
+    Returns:
+        np.ndarray: uint8 array with a trailing axis of 3.
+    """
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    scale = 255 / (vmax - vmin) if vmax > vmin else 0.0
+    indices = np.clip(np.nan_to_num((values - vmin) * scale), 0, 255).astype(np.uint8)
+    return COLORMAP[indices]
+
+
+def _plane_axes(plane: str) -> Tuple[int, int, int]:
+    """
+    Indices of the horizontal, vertical and normal axes of a plane.
+    """
+    horizontal, vertical = "xyz".index(plane[0]), "xyz".index(plane[1])
+    return horizontal, vertical, 3 - horizontal - vertical
+
+
+def _outline(points: np.ndarray, triangles: np.ndarray, normal: int, position: float) -> np.ndarray:
+    """
+    Points where the edges of a triangulated surface cross a plane.
+    """
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    a, b = points[edges[:, 0]], points[edges[:, 1]]
+    da, db = a[:, normal] - position, b[:, normal] - position
+    crossing = (da * db <= 0) & (da != db)
+    t = (da[crossing] / (da[crossing] - db[crossing]))[:, None]
+    return a[crossing] + t * (b[crossing] - a[crossing])
+
+
+def render_slice(magnitude: np.ndarray,
+                 coordinates: Sequence[np.ndarray],
+                 plane: str,
+                 particle: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                 vmax: Optional[float] = None,
+                 min_size: int = 256) -> np.ndarray:
+    """
+    Render the centre plane of a scalar field.
+
+    Args:
+        magnitude (np.ndarray): (z, y, x) field.
+        coordinates (Sequence[np.ndarray]): x, y and z coordinates of the grid.
+        plane (str): 'xy', 'xz' or 'yz'; the first axis is drawn horizontally.
+        particle (Optional[Tuple[np.ndarray, np.ndarray]]): Particle nodes
+            (n, 3) and triangles (m, 3), drawn as an outline.
+        vmax (Optional[float]): Value of the top of the colour scale.
+        min_size (int): The image is enlarged by an integer factor (nearest
+            neighbour) until its longer side is at least this many pixels.
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 image, with the vertical axis pointing up.
+    """
+    horizontal, vertical, normal = _plane_axes(plane)
+    centre = magnitude.shape[2 - normal] // 2
+    # Move the (z, y, x) array to (vertical, horizontal)
+    section = np.take(magnitude, centre, axis=2 - normal)
+    if horizontal > vertical:
+        section = section.T
+    # Rows of the section run along the vertical axis; flip so it points up
+    image = apply_colormap(section[::-1], 0.0, vmax)
+
+    if particle is not None:
+        points, triangles = particle
+        crossings = _outline(points, triangles, normal, coordinates[normal][centre])
+        if len(crossings):
+            columns = np.rint(np.interp(crossings[:, horizontal], coordinates[horizontal],
+                                        np.arange(len(coordinates[horizontal])))).astype(int)
+            rows = np.rint(np.interp(crossings[:, vertical], coordinates[vertical],
+                                     np.arange(len(coordinates[vertical])))).astype(int)
+            image[image.shape[0] - 1 - rows, columns] = OUTLINE_COLOUR
+
+    factor = max(1, -(-min_size // max(image.shape[:2])))
+    return np.repeat(np.repeat(image, factor, axis=0), factor, axis=1)
+
+
+def write_fluid_previews(grid,
+                         output_directory: str,
+                         timestep: int,
+                         particle: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                         planes: Sequence[str] = PLANES) -> List[str]:
+    """
+    Write PNG previews of the velocity magnitude through the centre planes
+    of a merged fluid grid, as `Fluid_t<t>_<plane>.png`.
+
+    Args:
+        grid: Merged rectilinear grid (pyvista or `SharedGrid`), with the
+            velocity as its three-component point array.
+        output_directory (str): Directory for the PNG files.
+        timestep (int): Timestep, for the file names.
+        particle (Optional[Tuple[np.ndarray, np.ndarray]]): Particle nodes
+            and triangles to outline.
+        planes (Sequence[str]): Planes to render.
+
+    Returns:
+        List[str]: Paths of the PNG files.
+    """
+    if hasattr(grid, "point_data"):
+        arrays = {name: np.asarray(grid.point_data[name]) for name in grid.point_data.keys()}
+        coordinates = [np.asarray(grid.x), np.asarray(grid.y), np.asarray(grid.z)]
+    else:
+        arrays = dict(grid.arrays)
+        coordinates = [arrays.pop("x"), arrays.pop("y"), arrays.pop("z")]
+    dimensions = tuple(len(c) for c in coordinates)
+    # LBCode writes the velocity as the only three-component array
+    velocity = next((a for a in arrays.values() if a.ndim == 2 and a.shape[1] == 3), None)
+    if velocity is None:
+        raise KeyError("No velocity array found in the fluid data.")
+    velocity = velocity.reshape(dimensions[::-1] + (3,))
+    magnitude = np.linalg.norm(velocity, axis=-1)
+    vmax = float(magnitude.max())
+
+    os.makedirs(output_directory, exist_ok=True)
+    filenames = []
+    for plane in planes:
+        filename = os.path.join(output_directory, f"Fluid_t{timestep}_{plane}.png")
+        write_png(filename, render_slice(magnitude, coordinates, plane, particle, vmax))
+        filenames.append(filename)
+    return filenames
+
+
+def _draw_label(image: np.ndarray, text: str, scale: int = 2) -> None:
+    """
+    Draw text in the top left corner of an image, on a black background.
+    """
+    glyphs = [_FONT[c] for c in text if c in _FONT]
+    if not glyphs:
+        return
+    height, width = 5 * scale + 2, min(image.shape[1], len(glyphs) * 4 * scale + 2)
+    image[:height, :width] = 0
+    for i, glyph in enumerate(glyphs):
+        bitmap = np.array([[int(bit) for bit in row] for row in glyph], dtype=bool)
+        bitmap = np.repeat(np.repeat(bitmap, scale, axis=0), scale, axis=1)
+        left = 1 + i * 4 * scale
+        if left + bitmap.shape[1] > image.shape[1]:
+            break
+        image[1:1 + bitmap.shape[0], left:left + bitmap.shape[1]][bitmap] = 255
+
+
+def _resize(image: np.ndarray, size: int) -> np.ndarray:
+    """
+    Fit an image into a size x size tile with nearest neighbour sampling.
+    """
+    scale = size / max(image.shape[:2])
+    rows = np.minimum((np.arange(int(image.shape[0] * scale)) / scale).astype(int), image.shape[0] - 1)
+    columns = np.minimum((np.arange(int(image.shape[1] * scale)) / scale).astype(int), image.shape[1] - 1)
+    tile = np.zeros((size, size, 3), dtype=np.uint8)
+    resized = image[rows][:, columns]
+    tile[:resized.shape[0], :resized.shape[1]] = resized
+    return tile
+
+
+def _timestep(filename: str) -> int:
+    return int(re.search(r"_t(\d+)_", os.path.basename(filename)).group(1))
+
+
+def contact_sheet(root_path: str,
+                  output_file: Optional[str] = None,
+                  plane: str = "xz",
+                  timestep: Optional[int] = None,
+                  simulation_directories: Optional[Sequence[str]] = None,
+                  columns: int = 8,
+                  tile_size: int = 192) -> Optional[str]:
+    """
+    Tile the previews of the simulations of a campaign into one PNG, each
+    labelled with its simulation ID (without the `_merged` suffix of an
+    out-of-place merge). The order of the tiles is also written to a JSON
+    file next to the sheet; tiles of simulations whose names contain other
+    characters than digits and `.-_=` are labelled with their position in it.
+
+    Args:
+        root_path (str): Root path of the (merged) simulations.
+        output_file (Optional[str]): Path of the sheet. Defaults to
+            `<root_path>/contact_sheet_<plane>.png`.
+        plane (str): Plane of the previews to use.
+        timestep (Optional[int]): Timestep to show. Defaults to the latest
+            preview of every simulation.
+        simulation_directories (Optional[Sequence[str]]): Simulations to
+            include. Defaults to all directories in the root path with previews.
+        columns (int): Number of tiles per row.
+        tile_size (int): Size of the square tiles in pixels.
+
+    Returns:
+        Optional[str]: Path of the sheet, or None if there were no previews.
+    """
+    if simulation_directories is None:
+        simulation_directories = sorted(
+            os.path.dirname(os.path.dirname(p))
+            for p in glob.glob(os.path.join(root_path, "*", "VTKFluid", PREVIEW_DIRECTORY))
+        )
+
+    tiles: Dict[str, str] = {}
+    for directory in simulation_directories:
+        previews = glob.glob(os.path.join(directory, "VTKFluid", PREVIEW_DIRECTORY, f"Fluid_t*_{plane}.png"))
+        if timestep is not None:
+            previews = [p for p in previews if _timestep(p) == timestep]
+        if previews:
+            tiles[os.path.basename(os.path.normpath(directory))] = max(previews, key=_timestep)
+    if not tiles:
+        return None
+
+    rows = -(-len(tiles) // columns)
+    sheet = np.zeros((rows * tile_size, min(columns, len(tiles)) * tile_size, 3), dtype=np.uint8)
+    for index, (simulation_id, preview) in enumerate(tiles.items()):
+        tile = _resize(read_png(preview), tile_size)
+        label = simulation_id[:-len(MERGED_SUFFIX)] if simulation_id.endswith(MERGED_SUFFIX) else simulation_id
+        if not all(c in _FONT for c in label):
+            # The font cannot spell the name, so use the position of the tile in the JSON file
+            label = str(index)
+        _draw_label(tile, label)
+        row, column = divmod(index, columns)
+        sheet[row * tile_size:(row + 1) * tile_size, column * tile_size:(column + 1) * tile_size] = tile
+
+    output_file = output_file or os.path.join(root_path, f"contact_sheet_{plane}.png")
+    write_png(output_file, sheet)
+    with open(os.path.splitext(output_file)[0] + ".json", 'w') as f:
+        json.dump({"columns": columns, "tile_size": tile_size, "tiles": tiles}, f, indent=4)
+    return output_file
@@ -0,0 +1,234 @@
+# query.py
+
+"""
+This module provides a query engine over the run registry
+(`simulation_lookup.json`). The registry is turned into one table with a row
+per simulation and a column per parameter: the dotted XML paths of the
+parameter updates (e.g. `boundaries.Couette.velTopX`), the physical inputs
+(e.g. `Ca`) of runs which recorded them under "Physical", `exit_code`, the
+recorded resource usage (e.g. `resources.peak_rss`) and `directory`.
+Registries written before physical inputs were recorded have only the XML
+parameter columns; the other columns are missing values for such runs. The
+table is cached next to the registry and rebuilt only when the registry
+changes, and queries are evaluated on whole columns at once.
+
+Expressions are Python syntax:
+
+- comparisons, also chained: `exit_code == 0`, `0.01 <= Ca < 0.05`
+- closed ranges: `Ca in [0.01, 0.05]`
+- membership: `mesh.physics.kS in {0.01, 0.02}`, `not in` for either
+- `and`, `or`, `not` and parentheses
+"""
+
+import os
+import ast
+import json
+import pickle
+import operator
+from typing import Any, Dict, Optional
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+def _to_number(value: Any) -> Any:
+    """
+    Convert a parameter value to a float if possible.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class RunRegistry:
+    """
+    Class to query the simulations in the run registry of a root path.
+
+    **Usage:**
+
+    ```python
+    registry = RunRegistry("study1/simulations")
+    runs = registry.query("Ca in [0.01, 0.05] and exit_code == 0")
+    for directory in runs["directory"]:
+        ...
+    ```
+    """
+
+    def __init__(self, root_path: str, use_cache: bool = True):
+        """
+        Args:
+            root_path (str): Root path of the simulations.
+            use_cache (bool): Read and write the cached table next to the registry.
+        """
+        self.root_path = root_path
+        self.use_cache = use_cache
+        self.lookup_file = os.path.join(root_path, "simulation_lookup.json")
+        self._source = None
+        self._table = None
+
+    @property
+    def table(self):
+        """
+        pandas.DataFrame: One row per simulation, indexed by simulation ID.
+        Rebuilt when the registry has changed since it was last read.
+        """
+        stat = os.stat(self.lookup_file)
+        source = (stat.st_size, stat.st_mtime_ns)
+        if self._table is None or source != self._source:
+            self._table = self._load(source)
+            self._source = source
+        return self._table
+
+    def _load(self, source):
+        cache_file = self.lookup_file + ".pkl"
+        if self.use_cache and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached["_source"] == source:
+                    return cached["table"]
+            except (pickle.UnpicklingError, EOFError, KeyError):
+                pass
+
+        table = self._build()
+        if self.use_cache:
+            temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(temporary_file, 'wb') as f:
+                pickle.dump({"_source": source, "table": table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file, cache_file)
+        return table
+
+    def _build(self):
+        import pandas as pd
+
+        with open(self.lookup_file, 'r') as f:
+            lookup_data = json.load(f)
+
+        columns: Dict[str, Dict[str, Any]] = {}
+        for simulation_id, simulation_info in lookup_data.items():
+            row = {}
+            for updates in simulation_info["Parameters"].values():
+                row.update(updates)
+            row.update(simulation_info.get("Physical") or {})
+            row["exit_code"] = simulation_info["Exit code"]
+            for name, value in (simulation_info.get("Resources") or {}).items():
+                if not isinstance(value, (list, dict)):
+                    row[f"resources.{name}"] = value
+            row["directory"] = os.path.join(self.root_path, simulation_id)
+            for name, value in row.items():
+                columns.setdefault(name, {})[simulation_id] = value
+
+        table = pd.DataFrame(columns, index=pd.Index(list(lookup_data), name="Simulation ID"))
+        for name in table.columns:
+            if name == "directory":
+                continue
+            converted = table[name].map(_to_number, na_action="ignore")
+            # Columns with only numbers (and missing values) become float columns
+            if converted.map(lambda v: isinstance(v, float)).sum() == converted.notna().sum():
+                table[name] = converted.astype(float)
+        return table
+
+    def query(self, expression: Optional[str] = None):
+        """
+        Select the simulations matching an expression.
+
+        Args:
+            expression (Optional[str]): Query, e.g.
+                "Ca in [0.01, 0.05] and exit_code == 0". All simulations
+                are returned if None.
+
+        Returns:
+            pandas.DataFrame: The matching rows of `table`.
+        """
+        table = self.table
+        if not expression:
+            return table
+        tree = ast.parse(expression, mode='eval')
+        mask = _Evaluator(table).evaluate(tree.body)
+        return table[mask]
+
+
+class _Evaluator:
+    """
+    Evaluates a parsed query on the columns of a registry table.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def evaluate(self, node: ast.AST):
+        if isinstance(node, ast.BoolOp):
+            combine = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+            result = self.evaluate(node.values[0])
+            for value in node.values[1:]:
+                result = combine(result, self.evaluate(value))
+            return result
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ~self.evaluate(node.operand)
+        if isinstance(node, ast.Compare):
+            result = None
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                mask = self.compare(left, op, right)
+                result = mask if result is None else result & mask
+                left = right
+            return result
+        raise ValueError(f"Unsupported query expression: {ast.unparse(node)}")
+
+    def compare(self, left: ast.AST, op: ast.cmpop, right: ast.AST):
+        if isinstance(op, (ast.In, ast.NotIn)):
+            column = self.operand(left)
+            if isinstance(right, ast.List):
+                low, high = self.operand(right)
+                mask = (column >= low) & (column <= high)
+            elif isinstance(right, (ast.Set, ast.Tuple)):
+                mask = column.isin(self.operand(right))
+            else:
+                raise ValueError(f"Expected [low, high] or {{values}} after 'in': {ast.unparse(right)}")
+            return ~mask if isinstance(op, ast.NotIn) else mask
+        if type(op) not in _COMPARISONS:
+            raise ValueError(f"Unsupported comparison: {type(op).__name__}")
+        return _COMPARISONS[type(op)](self.operand(left), self.operand(right))
+
+    def operand(self, node: ast.AST):
+        if isinstance(node, (ast.Name, ast.Attribute)):
+            name = self.dotted_name(node)
+            if name not in self.table.columns:
+                raise KeyError(f"No simulation has the parameter {name!r}.")
+            return self.table[name]
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return [self.operand(element) for element in node.elts]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self.operand(node.operand)
+        if isinstance(node, ast.Constant):
+            return node.value
+        raise ValueError(f"Unsupported query operand: {ast.unparse(node)}")
+
+    @staticmethod
+    def dotted_name(node: ast.AST) -> str:
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute):
+            return f"{_Evaluator.dotted_name(node.value)}.{node.attr}"
+        raise ValueError(f"Unsupported parameter name: {ast.unparse(node)}")
+
+
+def query_simulations(root_path: str, expression: Optional[str] = None):
+    """
+    Select the simulations of a root path matching an expression.
+
+    Args:
+        root_path (str): Root path of the simulations.
+        expression (Optional[str]): Query, see `RunRegistry.query`.
+
+    Returns:
+        pandas.DataFrame: One row per matching simulation.
+    """
+    return RunRegistry(root_path).query(expression)
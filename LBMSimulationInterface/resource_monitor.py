@@ -0,0 +1,340 @@
+# resource_monitor.py
+
+"""
+This module provides a sampler which runs alongside a simulation and records
+the resources used by its process tree (`mpiexec`, the process managers it
+starts and the LBCode ranks), read from `/proc` at a fixed interval:
+
+- resident memory (RSS) of every process, and of the tree as a whole,
+- CPU time (user + system),
+- bytes read from and written to storage.
+
+`SimulationSetup.run_simulation` samples every run and stores the summary
+under "Resources" in `simulation_info.json` and the run registry, so a
+campaign collects the data needed to predict the memory and core hours of
+new runs from the lattice and mesh size (see `RunRegistry`, whose table has
+`resources.*` columns).
+
+The first sample is taken shortly after the start, once the ranks have
+been exec'd, rather than right after the fork. The totals of CPU time, I/O
+and the peak RSS of a single process are taken at exit from the resource
+usage `os.wait4` reports for the whole tree (mpiexec collects that of its
+ranks), so they include the last interval; the usage of individual ranks is
+as of the last sample before they exited. On systems without `/proc`
+nothing is recorded.
+"""
+
+import os
+import time
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional
+
+PROC = "/proc"
+# Environment variables holding the MPI rank, for MPICH/Intel MPI, Open MPI and PMIx
+RANK_VARIABLES = (b"PMI_RANK", b"OMPI_COMM_WORLD_RANK", b"PMIX_RANK")
+
+# Seconds before the first sample, so the ranks have been started
+FIRST_SAMPLE_DELAY = 1.0
+# Unit of ru_inblock and ru_oublock
+BLOCK_SIZE = 512
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE, CLOCK_TICKS = 4096, 100
+
+
+def _read(path: str, mode: str = 'r'):
+    with open(path, mode) as f:
+        return f.read()
+
+
+def _stat(pid: int) -> Optional[List[str]]:
+    """
+    Fields of /proc/<pid>/stat from the state on (field 3), or None if the
+    process is gone.
+    """
+    try:
+        stat = _read(f"{PROC}/{pid}/stat")
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    # The command name may contain spaces and parentheses
+    return stat[stat.rfind(')') + 2:].split()
+
+
+def process_tree(root_pid: int) -> Dict[int, int]:
+    """
+    PIDs of a process and all its descendants, with the PID of their parent.
+    """
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir(PROC):
+        if not entry.isdigit():
+            continue
+        fields = _stat(int(entry))
+        if fields is not None:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+
+    tree, stack = {root_pid: None}, [root_pid]
+    while stack:
+        pid = stack.pop()
+        for child in children.get(pid, []):
+            tree[child] = pid
+            stack.append(child)
+    return tree
+
+
+def read_process(pid: int) -> Optional[Dict[str, Any]]:
+    """
+    Current resource usage of a process.
+
+    Returns:
+        Optional[Dict[str, Any]]: `rss` and `read_bytes`/`write_bytes` in
+        bytes and `cpu_time` in seconds, or None if the process is gone.
+        The I/O counters are None if /proc/<pid>/io cannot be read.
+    """
+    fields = _stat(pid)
+    if fields is None:
+        return None
+    usage = {
+        "cpu_time": (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        "rss": int(fields[21]) * PAGE_SIZE,
+        "read_bytes": None,
+        "write_bytes": None,
+    }
+    try:
+        for line in _read(f"{PROC}/{pid}/io").splitlines():
+            name, _, value = line.partition(":")
+            if name in ("read_bytes", "write_bytes"):
+                usage[name] = int(value)
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return usage
+
+
+def process_exited(process: subprocess.Popen) -> bool:
+    """
+    Check whether a process has exited without reaping it, so that its
+    resource usage can still be collected by `ResourceSampler.wait`.
+    """
+    if process.returncode is not None:
+        return True
+    if not hasattr(os, "waitid"):
+        return process.poll() is not None
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        # Reaped elsewhere
+        return True
+
+
+def signal_process(process: subprocess.Popen, signum: int) -> None:
+    """
+    Send a signal to a process unless it has exited, without reaping it
+    (`Popen.send_signal` polls the process, which reaps it).
+    """
+    # An exited but unreaped process keeps its pid, so it cannot be reused
+    if process_exited(process):
+        return
+    try:
+        os.kill(process.pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _describe(pid: int) -> Dict[str, Any]:
+    """
+    Command line and MPI rank of a process, read once when it is first seen.
+    """
+    description = {"pid": pid, "command": None, "rank": None}
+    try:
+        arguments = _read(f"{PROC}/{pid}/cmdline", 'rb').split(b"\0")
+        description["command"] = [a.decode(errors='replace') for a in arguments if a]
+        environment = dict(
+            v.split(b"=", 1) for v in _read(f"{PROC}/{pid}/environ", 'rb').split(b"\0") if b"=" in v
+        )
+        for variable in RANK_VARIABLES:
+            if variable in environment:
+                description["rank"] = int(environment[variable])
+                break
+    except (FileNotFoundError, ProcessLookupError, PermissionError, ValueError):
+        pass
+    return description
+
+
+class ResourceSampler:
+    """
+    Class to sample the resources of a running simulation's process tree.
+
+    **Usage:**
+
+    ```python
+    sampler = ResourceSampler(interval=5)
+    setup.run_simulation(num_cores=6, resources=sampler)
+    print(sampler.summary()["peak_rss"] / 1024**3, "GiB")
+    ```
+    """
+
+    def __init__(self, interval: float = 10.0, executable: str = "LBCode"):
+        """
+        Args:
+            interval (float): Seconds between samples.
+            executable (str): Name of the simulation executable. Processes
+                running it are reported as ranks; the others (mpiexec and
+                process managers) only count towards the totals.
+        """
+        self.interval = interval
+        self.executable = executable
+        self.processes: Dict[int, Dict[str, Any]] = {}
+        self.samples: List[Dict[str, float]] = []
+        self.start_time = None
+        self.end_time = None
+        self.rusage = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def available() -> bool:
+        return os.path.isdir(os.path.join(PROC, "self"))
+
+    def start(self, process: subprocess.Popen) -> None:
+        """
+        Start sampling a running process and its descendants in a background thread.
+
+        Args:
+            process (subprocess.Popen): The running LBCode (or mpiexec) process.
+        """
+        self.processes = {}
+        self.samples = []
+        self.start_time = time.time()
+        self.end_time = None
+        self.rusage = None
+        self._stop_event.clear()
+        if not self.available():
+            return
+        self._thread = threading.Thread(target=self._sample_loop, args=(process,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop sampling and wait for the background thread to finish.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.end_time = time.time()
+
+    def wait(self, process: subprocess.Popen) -> int:
+        """
+        Wait for the process to exit, in place of `process.wait()`, and
+        keep the resource usage of the whole tree for the summary.
+
+        Returns:
+            int: The exit code, as from `process.wait()`.
+        """
+        if not hasattr(os, "wait4") or process.returncode is not None:
+            return process.wait()
+        try:
+            _, status, self.rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # Reaped elsewhere, e.g. by a poll()
+            return process.wait()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode
+
+    def _sample_loop(self, process: subprocess.Popen) -> None:
+        # Sample shortly after the start, so short runs are recorded too
+        delay = min(FIRST_SAMPLE_DELAY, self.interval)
+        while not self._stop_event.wait(delay):
+            if process_exited(process):
+                return
+            self.sample(process.pid)
+            delay = self.interval
+
+    def sample(self, root_pid: int) -> None:
+        """
+        Read the usage of every process in the tree under `root_pid`.
+        """
+        totals = {"time": time.time() - self.start_time, "rss": 0, "cpu_time": 0.0}
+        for pid, parent in process_tree(root_pid).items():
+            usage = read_process(pid)
+            if usage is None:
+                continue
+            record = self.processes.get(pid)
+            if record is None:
+                record = self.processes[pid] = dict(_describe(pid), parent=parent, peak_rss=0)
+            record.update(cpu_time=usage["cpu_time"], read_bytes=usage["read_bytes"],
+                          write_bytes=usage["write_bytes"])
+            record["peak_rss"] = max(record["peak_rss"], usage["rss"])
+            totals["rss"] += usage["rss"]
+        totals["cpu_time"] = sum(r["cpu_time"] for r in self.processes.values())
+        self.samples.append(totals)
+
+    def ranks(self) -> List[Dict[str, Any]]:
+        """
+        Usage of every process running the executable, ordered by MPI rank
+        (or by start if the rank is unknown). If the executable is not found
+        by name (e.g. a wrapper script), the leaves of the process tree are
+        taken as the ranks.
+        """
+        ranks = [
+            p for p in self.processes.values()
+            if p["command"] and any(os.path.basename(a) == self.executable for a in p["command"][:2])
+        ]
+        if not ranks:
+            parents = {p["parent"] for p in self.processes.values()}
+            ranks = [p for pid, p in self.processes.items() if pid not in parents]
+        return sorted(ranks, key=lambda p: (p["rank"] is None, p["rank"] if p["rank"] is not None else 0))
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """
+        Summary of the run, or None if nothing was sampled.
+
+        Returns:
+            Optional[Dict[str, Any]]: `wall_time` and `cpu_time` in seconds,
+            `cpu_utilisation` (CPU time per rank and second of wall time),
+            `peak_rss` (of the whole tree) and `peak_rss_per_rank`, `read_bytes`
+            and `write_bytes` in bytes, `num_ranks`, the sampling `interval`
+            and number of `samples`, and the usage of every rank under `ranks`.
+            `cpu_time`, the I/O and `peak_rss_per_rank` are the totals at
+            exit if the process was waited for with `wait`, and the last
+            sampled values otherwise.
+        """
+        if not self.samples and self.rusage is None:
+            return None
+        end_time = self.end_time if self.end_time is not None else time.time()
+        wall_time = end_time - self.start_time
+        ranks = self.ranks()
+        num_ranks = len(ranks) or 1
+
+        def total(name):
+            values = [p[name] for p in self.processes.values() if p[name] is not None]
+            return sum(values) if values else None
+
+        cpu_time = total("cpu_time") or 0.0
+        read_bytes, write_bytes = total("read_bytes"), total("write_bytes")
+        peak_rss_per_rank = max((p["peak_rss"] for p in ranks), default=None)
+        if self.rusage is not None:
+            cpu_time = self.rusage.ru_utime + self.rusage.ru_stime
+            read_bytes = self.rusage.ru_inblock * BLOCK_SIZE
+            write_bytes = self.rusage.ru_oublock * BLOCK_SIZE
+            # ru_maxrss is in KiB and is that of the largest single process
+            peak_rss_per_rank = max(peak_rss_per_rank or 0, self.rusage.ru_maxrss * 1024)
+        return {
+            "wall_time": round(wall_time, 3),
+            "cpu_time": round(cpu_time, 3),
+            "cpu_utilisation": round(cpu_time / (wall_time * num_ranks), 4) if wall_time > 0 else None,
+            "peak_rss": max((s["rss"] for s in self.samples), default=peak_rss_per_rank),
+            "peak_rss_per_rank": peak_rss_per_rank,
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "num_ranks": len(ranks),
+            "interval": self.interval,
+            "samples": len(self.samples),
+            "ranks": [
+                {name: p[name] for name in ("rank", "pid", "peak_rss", "cpu_time", "read_bytes", "write_bytes")}
+                for p in ranks
+            ],
+        }
@@ -0,0 +1,250 @@
+# shared_fields.py
+
+"""
+This module hands merged fluid fields from the merge stage to analysis code
+through shared memory instead of files. A merged timestep is copied once into
+a `multiprocessing.shared_memory` block; analysis workers in other processes
+attach to the block by name and get NumPy views of the fields, without
+copying or parsing anything. Writing the merged grid to disk is optional.
+"""
+
+import os
+import re
+import glob
+import pathlib
+import numpy as np
+import pyvista as pv
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+Descriptor = Dict[str, Any]
+
+# Keep every array 64-byte aligned inside the shared block
+ALIGNMENT = 64
+
+
+class SharedGrid:
+    """
+    Class holding the coordinates and point arrays of a rectilinear grid in
+    one shared memory block.
+
+    Point arrays are ordered as in VTK, with x varying fastest.
+
+    **Usage:**
+
+    ```python
+    # Producer
+    shared = share_fluid_timestep(1000, mpi_cores, input_dir)
+    executor.submit(analysis, shared.descriptor)
+
+    # Consumer, in another process
+    def analysis(descriptor):
+        with SharedGrid.attach(descriptor) as grid:
+            return np.abs(grid.arrays["velocity"]).max()
+    ```
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory,
+                 layout: Dict[str, Tuple[int, Tuple[int, ...], str]], owner: bool):
+        self.memory = memory
+        self.layout = layout
+        self.owner = owner
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()
+        }
+
+    @classmethod
+    def create(cls, arrays: Dict[str, np.ndarray]) -> "SharedGrid":
+        """
+        Copy arrays into a new shared memory block.
+
+        Args:
+            arrays (Dict[str, np.ndarray]): Arrays by name, including the
+                coordinates 'x', 'y' and 'z'.
+
+        Returns:
+            SharedGrid: The owner of the block, which unlinks it on `close`.
+        """
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            layout[name] = (size, tuple(array.shape), np.asarray(array).dtype.str)
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        grid = cls(memory, layout, owner=True)
+        for name, array in arrays.items():
+            grid.arrays[name][...] = array
+        return grid
+
+    @classmethod
+    def from_grid(cls, grid: pv.RectilinearGrid) -> "SharedGrid":
+        """
+        Copy the coordinates and point arrays of a rectilinear grid into shared memory.
+        """
+        arrays = {"x": np.asarray(grid.x), "y": np.asarray(grid.y), "z": np.asarray(grid.z)}
+        for name in grid.point_data.keys():
+            arrays[name] = np.asarray(grid.point_data[name])
+        return cls.create(arrays)
+
+    @classmethod
+    def attach(cls, descriptor: Descriptor) -> "SharedGrid":
+        """
+        Attach to a block created by another process.
+
+        Args:
+            descriptor (Descriptor): The `descriptor` of the owning SharedGrid.
+
+        Returns:
+            SharedGrid: Views of the shared arrays. Closing it does not free the block.
+        """
+        memory = shared_memory.SharedMemory(name=descriptor["name"])
+        layout = {name: (offset, tuple(shape), dtype) for name, (offset, shape, dtype) in descriptor["layout"].items()}
+        return cls(memory, layout, owner=False)
+
+    @property
+    def descriptor(self) -> Descriptor:
+        """
+        Small picklable description of the block for other processes.
+        """
+        return {"name": self.memory.name, "layout": self.layout}
+
+    @property
+    def dimensions(self) -> Tuple[int, int, int]:
+        return len(self.arrays["x"]), len(self.arrays["y"]), len(self.arrays["z"])
+
+    def field(self, name: str) -> np.ndarray:
+        """
+        View of a point array reshaped to (z, y, x[, components]).
+        """
+        array = self.arrays[name]
+        return array.reshape(self.dimensions[::-1] + array.shape[1:])
+
+    def to_pyvista(self) -> pv.RectilinearGrid:
+        """
+        Build a pyvista grid of the shared arrays (the arrays are copied).
+        """
+        grid = pv.RectilinearGrid(self.arrays["x"], self.arrays["y"], self.arrays["z"])
+        for name, array in self.arrays.items():
+            if name not in ("x", "y", "z"):
+                grid.point_data[name] = np.array(array)
+        return grid
+
+    def save(self, filename: str) -> None:
+        """
+        Persist the grid to disk, e.g. as `Fluid_t<t>.vtr`.
+        """
+        self.to_pyvista().save(str(filename))
+
+    def close(self) -> None:
+        """
+        Release the views; the owner also frees the shared memory block.
+        """
+        self.arrays = {}
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self) -> "SharedGrid":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def share_fluid_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Path,
+                         output_file: Optional[str] = None, **fluid_options) -> Optional[SharedGrid]:
+    """
+    Merge the fluid files of one timestep into shared memory.
+
+    Args:
+        timestep (int): Timestep to merge.
+        mpi_cores (int): Number of MPI cores.
+        input_dir (pathlib.Path): Directory containing the fluid VTK files.
+        output_file (Optional[str]): Also save the merged grid to this file.
+        **fluid_options: `region`, `stride` and `rank_bounds` as for
+            `merge_fluid_timestep`.
+
+    Returns:
+        Optional[SharedGrid]: The merged grid, or None if there were no files.
+    """
+    from .vtk_utils import interpolate_fluid_timestep
+
+    grid = interpolate_fluid_timestep(timestep, mpi_cores, pathlib.Path(input_dir), **fluid_options)[0]
+    if grid is None:
+        return None
+    if output_file is not None:
+        grid.save(str(output_file))
+    return SharedGrid.from_grid(grid)
+
+
+def _run_on_shared(analysis: Callable[[SharedGrid], Any], descriptor: Descriptor) -> Any:
+    with SharedGrid.attach(descriptor) as grid:
+        return analysis(grid)
+
+
+def map_fluid_timesteps(fluid_directory: str,
+                        analysis: Callable[[SharedGrid], Any],
+                        num_workers: int = 4,
+                        output_directory: Optional[str] = None,
+                        **fluid_options) -> Dict[int, Any]:
+    """
+    Merge every timestep of a fluid directory into shared memory and run an
+    analysis on it in a pool of worker processes.
+
+    At most `num_workers` merged timesteps are held in memory at once; each
+    block is freed as soon as its analysis has finished.
+
+    Args:
+        fluid_directory (str): Directory containing `Fluid_p*_t*.vtk` files.
+        analysis (Callable[[SharedGrid], Any]): Picklable (module level)
+            function of the attached grid, e.g. returning a reduction. It
+            must not return views of the shared arrays, which are released
+            when it returns.
+        num_workers (int): Number of analysis processes.
+        output_directory (Optional[str]): Also save each merged timestep as
+            `Fluid_t<t>.vtr` here.
+        **fluid_options: `region` and `stride` as for `merge_fluid_timestep`.
+
+    Returns:
+        Dict[int, Any]: Result of the analysis per timestep.
+    """
+    pattern = re.compile(r"Fluid_p(?P<core>\d+)_t(?P<timestep>\d+)\.vtk")
+    matches = [pattern.search(os.path.basename(f)) for f in glob.glob(os.path.join(fluid_directory, "Fluid_p*_t*.vtk"))]
+    matches = [m for m in matches if m]
+    if not matches:
+        return {}
+    timesteps = sorted({int(m.group("timestep")) for m in matches})
+    mpi_cores = max(int(m.group("core")) for m in matches) + 1
+
+    results = {}
+    pending = []
+
+    def collect():
+        timestep, shared, future = pending.pop(0)
+        try:
+            results[timestep] = future.result()
+        finally:
+            shared.close()
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        try:
+            for timestep in timesteps:
+                output_file = None
+                if output_directory is not None:
+                    os.makedirs(output_directory, exist_ok=True)
+                    output_file = os.path.join(output_directory, f"Fluid_t{timestep}.vtr")
+                shared = share_fluid_timestep(timestep, mpi_cores, fluid_directory, output_file, **fluid_options)
+                if shared is None:
+                    continue
+                pending.append((timestep, shared, executor.submit(_run_on_shared, analysis, shared.descriptor)))
+                if len(pending) >= num_workers:
+                    collect()
+            while pending:
+                collect()
+        finally:
+            for _, shared, future in pending:
+                future.cancel()
+                shared.close()
+    return results
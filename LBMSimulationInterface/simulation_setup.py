@@ -2,11 +2,25 @@
 
 import os
 import json
+import signal
+import threading
+import warnings
 import subprocess
-from typing import Optional
+from typing import Callable, List, Optional, Tuple, Union, TYPE_CHECKING
 from .file_system import FileSystem
 from .xml_handler import XmlBioFM
 from .parameter_updates import ParameterUpdates
+from .tracing import span
+from .resource_monitor import ResourceSampler, signal_process
+from .checkpoints import (
+    find_latest_checkpoint, prune_checkpoints, find_warm_start_donor, copy_checkpoint
+)
+
+if TYPE_CHECKING:
+    from .convergence_monitor import ConvergenceMonitor
+
+# Set by restarts and warm starts, so they may differ from the original updates
+RESTART_PARAMETERS = ("checkpoint.restart.timeLBM", "checkpoint.restart.timeMEM", "lattice.times.end")
 
 
 class SimulationSetup:
@@ -21,6 +35,8 @@ class SimulationSetup:
         parameter_updates: ParameterUpdates,
         simulation_id: Optional[int] = None,
         overwrite: bool = False,
+        resume: bool = False,
+        warm_start: bool = False,
     ):
         """
         Initialize the SimulationSetup object and prepare the simulation.
@@ -31,13 +47,27 @@ class SimulationSetup:
             parameter_updates (ParameterUpdates): Parameter updates.
             simulation_id (Optional[int]): Specific simulation ID.
             overwrite (bool): Overwrite existing simulation directory.
+            resume (bool): If the simulation directory already exists, restart
+                from its latest complete checkpoint instead of preparing it
+                again from the template.
+            warm_start (bool): Start the fluid from the latest checkpoint of
+                the closest completed simulation in the root path with the same
+                lattice, decomposition and boundaries, instead of from rest.
         """
         self.template_path = template_path
         self.root_path = root_path
         self.parameter_updates = parameter_updates
         self.simulation_id = simulation_id
         self.overwrite = overwrite
-        self.simulation_directory = self.prepare_simulation()
+        self.resume = resume
+        self.warm_start = warm_start
+        self.resumed_from = None
+        self.warm_started_from = None
+        self.preempted = False
+        self.resource_usage = None
+        with span("prepare_simulation") as s:
+            self.simulation_directory = self.prepare_simulation()
+            s.set(simulation=self.simulation_id)
 
     def prepare_simulation(self) -> str:
         """
@@ -54,6 +84,15 @@ class SimulationSetup:
             )
         directory_name = os.path.join(self.root_path, str(self.simulation_id))
 
+        if self.resume and os.path.exists(os.path.join(directory_name, "parameters.xml")):
+            self.check_resume_parameters(directory_name)
+            self.resumed_from = self.restart_from_checkpoint(directory_name)
+            if self.resumed_from is None:
+                warnings.warn(
+                    f"No complete checkpoint in {directory_name}; the simulation starts again from t=0"
+                )
+            return directory_name
+
         FileSystem.create_directory(directory_name, self.overwrite)
         FileSystem.copy_file(os.path.join(self.template_path, "LBCode"), directory_name)
         FileSystem.copy_directory(
@@ -67,44 +106,271 @@ class SimulationSetup:
             directory_name,
             self.parameter_updates.get_parameter_updates(),
         )
-        # FileSystem.update_json(self.root_path, self.parameter_updates.get_parameter_updates(), 0)
+        if self.warm_start:
+            self.warm_started_from = self.warm_start_from_nearest(directory_name)
+        # Register the prepared simulation; the exit code is filled in once it has run
+        self.register(None)
         return directory_name
 
+    def register(self, exit_code: Optional[int]) -> None:
+        """
+        Record the simulation, its physical parameters and unit conversion,
+        and its exit code in the lookup json and simulation_info.json.
+
+        Args:
+            exit_code (Optional[int]): Exit code, or None if it has not run yet.
+        """
+        FileSystem.update_json(
+            self.root_path,
+            self.parameter_updates.get_parameter_updates(),
+            exit_code,
+            simulation_id=self.simulation_id,
+            physical_parameters=self.parameter_updates.get_physical_parameters() or None,
+            unit_conversion=self.parameter_updates.get_unit_conversion() or None,
+            resources=self.resource_usage,
+        )
+
+    def check_resume_parameters(self, directory_name: str) -> None:
+        """
+        Check that the parameter updates agree with the parameter files of
+        the simulation being resumed. A resumed run continues with the
+        parameters it was started with, so differing updates are rejected
+        rather than silently ignored.
+
+        Args:
+            directory_name (str): Path to the existing simulation directory.
+
+        Raises:
+            ValueError: If an update differs from the value in the simulation.
+        """
+        differences = []
+        for filename, updates in self.parameter_updates.get_parameter_updates().items():
+            for dotted, value in updates.items():
+                if dotted in RESTART_PARAMETERS:
+                    continue
+                current = XmlBioFM.read_parameter(os.path.join(directory_name, filename), dotted)
+                try:
+                    same = current is not None and float(current) == float(value)
+                except (TypeError, ValueError):
+                    same = current == str(value)
+                if not same:
+                    differences.append(f"{filename}: {dotted} is {current}, update is {value}")
+        if differences:
+            raise ValueError(
+                f"Cannot resume {directory_name} with different parameters "
+                f"(use overwrite=True to start again):\n" + "\n".join(differences)
+            )
+
+    @staticmethod
+    def restart_from_checkpoint(directory_name: str) -> Optional[int]:
+        """
+        Point the restart times in parameters.xml at the latest complete
+        checkpoint, or reset them to start from t=0 if there is none.
+
+        Args:
+            directory_name (str): Path to an existing simulation directory.
+
+        Returns:
+            Optional[int]: The LBM timestep restarted from, or None if the
+            Backup directory holds no complete checkpoint.
+        """
+        checkpoint = find_latest_checkpoint(directory_name)
+        time_lbm, time_mem = checkpoint if checkpoint is not None else (-1, -1)
+        XmlBioFM.update_and_write_parameter_files(
+            directory_name,
+            directory_name,
+            {"parameters.xml": {
+                ('checkpoint', 'restart', 'timeLBM'): str(time_lbm),
+                ('checkpoint', 'restart', 'timeMEM'): str(time_mem),
+            }},
+        )
+        return time_lbm if checkpoint is not None else None
+
+    def warm_start_from_nearest(self, directory_name: str) -> Optional[str]:
+        """
+        Copy the fluid checkpoint of the closest completed simulation and set
+        the restart fields in parameters.xml to continue from it.
+
+        Only the fluid state is reused; the membrane starts afresh. The end
+        time is shifted by the restart time, so the simulation still runs for
+        the configured number of steps.
+
+        Args:
+            directory_name (str): Path to the prepared simulation directory.
+
+        Returns:
+            Optional[str]: Directory of the simulation the checkpoint was taken
+            from, or None if there was no suitable simulation.
+        """
+        donor = find_warm_start_donor(
+            self.root_path, directory_name, self.parameter_updates.get_parameter_updates()
+        )
+        if donor is None:
+            return None
+        donor_directory, timestep = donor
+        copy_checkpoint(donor_directory, directory_name, timestep, kinds=("LBM",))
+
+        parameter_file = os.path.join(directory_name, "parameters.xml")
+        end_time = float(XmlBioFM.read_parameter(parameter_file, "lattice.times.end"))
+        XmlBioFM.update_and_write_parameter_files(
+            directory_name,
+            directory_name,
+            {"parameters.xml": {
+                ('checkpoint', 'restart', 'timeLBM'): str(timestep),
+                ('checkpoint', 'restart', 'timeMEM'): "-1",
+                ('lattice', 'times', 'end'): str(int(end_time) + timestep),
+            }},
+        )
+        return donor_directory
+
     def run_simulation(
-        self, num_cores: int = 1, logfile: Optional[str] = None
+        self,
+        num_cores: int = 1,
+        logfile: Optional[str] = None,
+        keep_checkpoints: Optional[int] = None,
+        monitor: Optional["ConvergenceMonitor"] = None,
+        resources: Union[bool, ResourceSampler] = True,
     ) -> int:
         """
         Execute the simulation in the specified directory.
 
+        If the Python process receives SIGTERM (as sent by batch schedulers
+        when a job is preempted), the signal is forwarded to the simulation
+        and `preempted` is set, so the run can later be continued with
+        `resume=True`.
+
         Args:
             num_cores (int): Number of cores to use.
-            logfile (Optional[str]): Path to the logfile.
+            logfile (Optional[str]): Path to the logfile, relative to the
+                simulation directory.
+            keep_checkpoints (Optional[int]): If given, keep only this many of
+                the most recent checkpoints once the simulation finishes
+                successfully.
+            monitor (Optional[ConvergenceMonitor]): Monitor which stops the
+                simulation once its convergence criteria are met. A simulation
+                stopped this way counts as successful, with exit code 0.
+            resources (Union[bool, ResourceSampler]): Sample the memory, CPU
+                time and I/O of the LBCode processes while the simulation runs,
+                with a `ResourceSampler` (by default every 10 seconds). The
+                summary is kept in `resource_usage` and recorded under
+                "Resources" in simulation_info.json and the lookup json.
 
         Returns:
             int: Exit code of the simulation process.
         """
-        original_cwd = os.getcwd()
-        os.chdir(self.simulation_directory)
+        sampler = ResourceSampler() if resources is True else resources or None
+        with span("run_simulation", simulation=self.simulation_id, num_cores=num_cores) as s:
+            # Keep the log of the interrupted run when continuing from a checkpoint
+            exit_code, preempted = self.execute(
+                self.simulation_directory, num_cores, logfile,
+                append_log=self.resumed_from is not None, monitor=monitor, sampler=sampler,
+            )
+            self.preempted = self.preempted or preempted
+            if sampler is not None:
+                self.resource_usage = sampler.summary()
+                if self.resource_usage is not None:
+                    s.set(peak_rss=self.resource_usage["peak_rss"], cpu_time=self.resource_usage["cpu_time"])
+            s.set(exit_code=exit_code)
 
-        command = (
-            ["./LBCode"]
-            if num_cores == 1
-            else ["mpiexec", "-n", str(num_cores), "./LBCode"]
-        )
+        if exit_code == 0 and not self.preempted and keep_checkpoints is not None:
+            prune_checkpoints(self.simulation_directory, keep_checkpoints)
 
-        if logfile:
-            with open(logfile, "w") as f:
-                process = subprocess.Popen(
-                    command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-                )
+        self.register(exit_code)
+        return exit_code
+
+    @staticmethod
+    def execute(
+        simulation_directory: str,
+        num_cores: int = 1,
+        logfile: Optional[str] = None,
+        append_log: bool = False,
+        monitor: Optional["ConvergenceMonitor"] = None,
+        sampler: Optional[ResourceSampler] = None,
+        on_start: Optional[Callable[[subprocess.Popen], None]] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Run LBCode in a prepared simulation directory and wait for it to exit.
+        Used by `run_simulation` and `CampaignQueue.run`.
+
+        While it runs, SIGTERM received by this process is forwarded to the
+        simulation (only when called from the main thread, since signal
+        handlers cannot be installed from other threads).
+
+        Args:
+            simulation_directory (str): Path to the simulation directory.
+            num_cores (int): Number of cores to use.
+            logfile (Optional[str]): Path to the logfile, relative to the
+                simulation directory.
+            append_log (bool): Append to the logfile instead of overwriting it.
+            monitor (Optional[ConvergenceMonitor]): Monitor which stops the
+                simulation once its convergence criteria are met.
+            sampler (Optional[ResourceSampler]): Sampler of the resource usage
+                of the LBCode processes, stopped once they have exited.
+            on_start (Optional[Callable[[subprocess.Popen], None]]): Called
+                with the process as soon as it has started.
+
+        Returns:
+            Tuple[int, bool]: Exit code of the simulation process (0 if the
+            monitor stopped it), and whether SIGTERM was received.
+        """
+        # The process runs in the simulation directory without changing the
+        # working directory of Python, so simulations can be run from threads
+        simulation_directory = os.path.abspath(simulation_directory)
+        command = SimulationSetup.simulation_command(num_cores)
+        preempted = threading.Event()
+        previous_handler = None
+        log = open(os.path.join(simulation_directory, logfile), "a" if append_log else "w") if logfile else None
+        try:
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE if log is not None else None,
+                stderr=subprocess.STDOUT if log is not None else None,
+                cwd=simulation_directory,
+            )
+            if threading.current_thread() is threading.main_thread():
+                def handler(signum, frame):
+                    preempted.set()
+                    signal_process(process, signal.SIGTERM)
+                previous_handler = signal.signal(signal.SIGTERM, handler)
+            if on_start is not None:
+                on_start(process)
+            if monitor is not None:
+                monitor.start(simulation_directory, process)
+            if sampler is not None:
+                sampler.start(process)
+            if log is not None:
                 for line in iter(process.stdout.readline, b""):
-                    f.write(line.decode())
-                    f.flush()
+                    log.write(line.decode())
+                    log.flush()
                 process.stdout.close()
-                exit_code = process.wait()
-        else:
-            process = subprocess.Popen(command)
-            exit_code = process.wait()
+            exit_code = sampler.wait(process) if sampler is not None else process.wait()
+        finally:
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+            if log is not None:
+                log.close()
+            if sampler is not None:
+                sampler.stop()
+            if monitor is not None:
+                monitor.stop()
 
-        os.chdir(original_cwd)
-        return exit_code
+        if monitor is not None and monitor.converged:
+            exit_code = 0
+        return exit_code, preempted.is_set()
+
+    @staticmethod
+    def simulation_command(num_cores: int = 1) -> List[str]:
+        """
+        Command that runs LBCode from within a simulation directory.
+
+        Args:
+            num_cores (int): Number of cores to use.
+
+        Returns:
+            List[str]: The command and its arguments.
+        """
+        return (
+            ["./LBCode"]
+            if num_cores == 1
+            else ["mpiexec", "-n", str(num_cores), "./LBCode"]
+        )
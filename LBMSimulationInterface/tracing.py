@@ -0,0 +1,248 @@
+# tracing.py
+
+"""
+This module provides lightweight tracing of where campaign time goes. Stages
+are wrapped in `span` context managers, which record their duration and
+optional counters (bytes, files) as Chrome trace events.
+
+Tracing is off unless `enable_tracing(directory)` has been called or the
+environment variable LBMI_TRACE_DIR is set, in which case `span` returns a
+shared no-op object and costs a single check. Every process appends its
+events to `trace_<pid>.jsonl` in the trace directory; since the variable is
+inherited, joblib workers and other child processes started afterwards
+trace into the same directory. `collect_trace` merges the files into one
+Chrome trace (open in chrome://tracing or https://ui.perfetto.dev) and
+`summarize_trace` prints a table per stage.
+"""
+
+import os
+import json
+import glob
+import time
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+TRACE_DIRECTORY_VARIABLE = "LBMI_TRACE_DIR"
+
+_trace_directory: Optional[str] = os.environ.get(TRACE_DIRECTORY_VARIABLE) or None
+_write_lock = threading.Lock()
+
+
+class _NullSpan:
+    """
+    Span returned while tracing is disabled.
+    """
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def __bool__(self) -> bool:
+        return False
+
+    def add(self, **counters: float) -> None:
+        pass
+
+    def set(self, **args: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    A traced stage. Counters added with `add` are summed and stored with the event.
+    """
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "Span":
+        self.timestamp = time.time_ns() // 1000
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        duration = (time.perf_counter_ns() - self.start) // 1000
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _write_event({
+            "name": self.name,
+            "cat": "LBMSimulationInterface",
+            "ph": "X",
+            "ts": self.timestamp,
+            "dur": duration,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": self.args,
+        })
+
+    def __bool__(self) -> bool:
+        return True
+
+    def add(self, **counters: float) -> None:
+        """
+        Add to counters of the span, e.g. `add(bytes=size, files=1)`.
+        """
+        for key, value in counters.items():
+            self.args[key] = self.args.get(key, 0) + value
+
+    def set(self, **args: Any) -> None:
+        """
+        Set values stored with the event which are only known inside the span.
+        """
+        self.args.update(args)
+
+
+def span(name: str, **args: Any):
+    """
+    Trace a stage.
+
+    **Usage:**
+
+    ```python
+    with span("copy_directory", simulation=simulation_id) as s:
+        shutil.copytree(source, destination)
+        if s:  # only count when tracing is enabled
+            s.add(bytes=size, files=count)
+    ```
+
+    Args:
+        name (str): Name of the stage.
+        **args: Values stored with the event, e.g. the simulation ID.
+
+    Returns:
+        A context manager, which is falsy if tracing is disabled.
+    """
+    if _trace_directory is None:
+        return _NULL_SPAN
+    return Span(name, args)
+
+
+def tracing_enabled() -> bool:
+    return _trace_directory is not None
+
+
+def enable_tracing(directory: str) -> None:
+    """
+    Start tracing into a directory, for this process and the child processes
+    it starts from now on.
+
+    Args:
+        directory (str): Directory for the per-process trace files.
+    """
+    global _trace_directory
+    os.makedirs(directory, exist_ok=True)
+    _trace_directory = os.path.abspath(directory)
+    os.environ[TRACE_DIRECTORY_VARIABLE] = _trace_directory
+
+
+def disable_tracing() -> None:
+    """
+    Stop tracing in this process and in child processes started from now on.
+    """
+    global _trace_directory
+    _trace_directory = None
+    os.environ.pop(TRACE_DIRECTORY_VARIABLE, None)
+
+
+def _write_event(event: Dict[str, Any]) -> None:
+    directory = _trace_directory
+    if directory is None:
+        return
+    line = json.dumps(event, default=str) + "\n"
+    with _write_lock, open(os.path.join(directory, f"trace_{os.getpid()}.jsonl"), 'a') as f:
+        f.write(line)
+
+
+def directory_size(directory: str) -> Dict[str, int]:
+    """
+    Total bytes and number of files below a directory, for span counters.
+    """
+    size, count = 0, 0
+    for root, _, files in os.walk(directory):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+            count += 1
+    return {"bytes": size, "files": count}
+
+
+def load_trace(directory: str) -> List[Dict[str, Any]]:
+    """
+    Read the events of all processes from a trace directory.
+
+    Args:
+        directory (str): The trace directory.
+
+    Returns:
+        List[Dict[str, Any]]: Events, ordered by start time.
+    """
+    events = []
+    for filename in glob.glob(os.path.join(directory, "trace_*.jsonl")):
+        with open(filename, 'r') as f:
+            # A process may have been killed while writing its last line
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+    return sorted(events, key=lambda e: e["ts"])
+
+
+def collect_trace(directory: str, output_file: Optional[str] = None) -> str:
+    """
+    Merge the per-process trace files into one Chrome trace JSON file.
+
+    Args:
+        directory (str): The trace directory.
+        output_file (Optional[str]): Path of the Chrome trace. Defaults to
+            `trace.json` in the trace directory.
+
+    Returns:
+        str: Path to the Chrome trace.
+    """
+    output_file = output_file or os.path.join(directory, "trace.json")
+    with open(output_file, 'w') as f:
+        json.dump({"traceEvents": load_trace(directory), "displayTimeUnit": "ms"}, f)
+    return output_file
+
+
+def summarize_trace(directory: str, by: Sequence[str] = ()) -> str:
+    """
+    Summarise the time spent and data moved per stage.
+
+    Args:
+        directory (str): The trace directory.
+        by (Sequence[str]): Event arguments to group by as well as the stage
+            name, e.g. ['simulation'].
+
+    Returns:
+        str: A table with the number of calls, total, mean and maximum
+        seconds, and the bytes and files counted, per stage.
+    """
+    groups = defaultdict(lambda: {"calls": 0, "total": 0.0, "max": 0.0, "bytes": 0, "files": 0})
+    for event in load_trace(directory):
+        key = tuple(str(event["args"].get(b, "")) for b in by) + (event["name"],)
+        group = groups[key]
+        seconds = event["dur"] / 1e6
+        group["calls"] += 1
+        group["total"] += seconds
+        group["max"] = max(group["max"], seconds)
+        group["bytes"] += event["args"].get("bytes", 0)
+        group["files"] += event["args"].get("files", 0)
+
+    columns = list(by) + ["stage"]
+    width = max([len(' / '.join(k)) for k in groups] + [len(' / '.join(columns))])
+    lines = [f"{' / '.join(columns):<{width}}  {'calls':>6}  {'total s':>9}  {'mean s':>8}  {'max s':>8}  {'MB':>9}  {'files':>7}"]
+    for key, group in sorted(groups.items(), key=lambda item: -item[1]["total"]):
+        lines.append(
+            f"{' / '.join(key):<{width}}  {group['calls']:>6d}  {group['total']:>9.3f}  "
+            f"{group['total'] / group['calls']:>8.3f}  {group['max']:>8.3f}  "
+            f"{group['bytes'] / 1024**2:>9.1f}  {group['files']:>7d}"
+        )
+    return '\n'.join(lines)
@@ -8,24 +8,79 @@ import os
 import pathlib
 import itertools as it
 import shutil
-from typing import List, Union
+import tempfile
+import functools
+import operator
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
 import joblib as jb
 import tqdm as tm
+from .xml_handler import XmlBioFM
+from .archive import ARCHIVE_SUFFIX, SimulationArchive, split_archive_path
+from .tracing import span
 
-def merge_latest_fluid_vtk_files(data_path: str) -> pv.RectilinearGrid:
+Bounds = Tuple[float, float, float, float, float, float]
+Region = Union[Bounds, Callable[[int], Bounds]]
+AXES = {'x': 0, 'y': 1, 'z': 2}
+PYRAMID_DIRECTORY = "pyramid"
+PYRAMID_LEVELS = (2, 4, 8)
+# Siblings of a simulation directory used while it is merged in place
+TEMP_MERGE_SUFFIX = "_temp_merge"
+TEMP_RAW_SUFFIX = "_temp_raw"
+
+def read_vtk(path: Union[str, pathlib.Path]) -> pv.DataSet:
+    """
+    Read a VTK file, which may be inside a simulation archive, e.g.
+    'simulations/3.lbma/VTKFluid/Fluid_t1000.vtr'.
+
+    Args:
+        path (Union[str, pathlib.Path]): Path to the file.
+
+    Returns:
+        pyvista.DataSet: The dataset.
+    """
+    located = split_archive_path(str(path))
+    if located is None:
+        return pv.read(str(path))
+    archive_path, name = located
+    with SimulationArchive(archive_path).temporary_file(name) as filename:
+        return pv.read(filename)
+
+def _glob_vtk(pattern: str) -> List[str]:
+    """
+    Glob for VTK files, also inside a simulation archive, e.g.
+    'simulations/3.lbma/VTKFluid/Fluid_p*_t*.vtk'. Paths inside an archive
+    are returned through the archive, as accepted by `read_vtk`.
+    """
+    located = split_archive_path(os.path.dirname(pattern))
+    if located is None:
+        return glob.glob(pattern)
+    archive_path, directory = located
+    member_pattern = '/'.join(p for p in (directory, os.path.basename(pattern)) if p not in ('', '.'))
+    return [os.path.join(archive_path, name) for name in SimulationArchive(archive_path).glob(member_pattern)]
+
+def merge_latest_fluid_vtk_files(data_path: str, save: bool = True) -> pv.RectilinearGrid:
     """
     Merge VTK files from different cores for the largest timestep into a single rectilinear grid.
 
     Args:
-        data_path (str): Path to the directory containing VTK files.
+        data_path (str): Path to the directory containing VTK files, which
+            may be inside a simulation archive, e.g. 'simulations/3.lbma/VTKFluid'.
+        save (bool): Save the grid as `merged.vtr` in the data path. Use
+            `SharedGrid.from_grid` to hand the result to other processes
+            without writing it.
 
     Returns:
         pyvista.RectilinearGrid: Interpolated rectilinear grid of the merged data.
+
+    Raises:
+        ValueError: If `save` is set for a data path inside an archive.
     """
+    if save and split_archive_path(str(data_path)) is not None:
+        raise ValueError(f"Cannot save into the archive {data_path}; pass save=False.")
     print('Finding the largest timestep and merging the VTK files...')
     # Find all VTK files matching the pattern
     file_pattern = os.path.join(data_path, "Fluid_p*_t*.vtk")
-    file_list = glob.glob(file_pattern)
+    file_list = _glob_vtk(file_pattern)
 
     if not file_list:
         raise FileNotFoundError("No VTK files found matching the pattern.")
@@ -38,7 +93,7 @@ def merge_latest_fluid_vtk_files(data_path: str) -> pv.RectilinearGrid:
 
     # Update the file pattern with the largest timestep
     file_pattern = os.path.join(data_path, f"Fluid_p*_t{largest_timestep}.vtk")
-    file_list = glob.glob(file_pattern)
+    file_list = _glob_vtk(file_pattern)
 
     if not file_list:
         raise FileNotFoundError(f"No VTK files found for timestep {largest_timestep}.")
@@ -47,7 +102,7 @@ def merge_latest_fluid_vtk_files(data_path: str) -> pv.RectilinearGrid:
     file_list.sort(key=lambda x: int(re.search(r"_p(\d+)_", x).group(1)))
 
     # Read and collect mesh objects
-    meshes = [pv.read(f_name) for f_name in file_list]
+    meshes = [read_vtk(f_name) for f_name in file_list]
 
     # Merge mesh objects
     merged = meshes[0].merge(meshes[1:])
@@ -62,45 +117,117 @@ def merge_latest_fluid_vtk_files(data_path: str) -> pv.RectilinearGrid:
     # Interpolate the merged mesh onto the rectilinear grid
     result = grid.interpolate(merged)
 
-    output_file = os.path.join(data_path, "merged.vtr")
-    result.save(output_file)
-    print(f'Merged VTK files saved as {output_file}')
+    if save:
+        output_file = os.path.join(data_path, "merged.vtr")
+        result.save(output_file)
+        print(f'Merged VTK files saved as {output_file}')
 
     return result
 
-def merge_all_timesteps(data_path: str, output_path: str, num_cores: int = 8):
+def merge_all_timesteps(data_path: str, output_path: str, num_cores: int = 8,
+                        region: Optional[Region] = None,
+                        slices: Optional[Sequence[Tuple[str, float]]] = None,
+                        stride: int = 1,
+                        statistics: bool = False,
+                        statistics_start: Optional[int] = None,
+                        keep_timesteps: bool = True,
+                        previews: bool = False,
+                        pyramid_levels: Sequence[int] = ()):
     """
     Merge VTK files for all timesteps in the simulation directory.
 
     Args:
-        data_path (str): Path to the root directory of the simulation data.
+        data_path (str): Path to the root directory of the simulation data,
+            or to a simulation archive. An archive is unpacked in full to a
+            temporary directory next to the output first, which needs as
+            much free space as the unpacked simulation.
         output_path (str): Path to the directory where merged data will be saved.
         num_cores (int): Number of cores to use for parallel processing.
+        region (Optional[Region]): Only merge the fluid inside these bounds
+            (x_min, x_max, y_min, y_max, z_min, z_max), or inside the bounds
+            returned by a callable of the timestep (see `ParticleRegion`).
+        slices (Optional[Sequence[Tuple[str, float]]]): Only write these fluid
+            planes, given as (axis, coordinate), e.g. [('z', 15)].
+        stride (int): Only keep every `stride`-th lattice point of the fluid.
+        statistics (bool): Also accumulate the running mean, variance,
+            minimum and maximum of every fluid array over the timesteps and
+            save them as `Fluid_statistics.vtr` (see `RunningStatistics`).
+            Requires a fixed region.
+        statistics_start (Optional[int]): First timestep included in the
+            statistics. Defaults to `convergence.steady.timeIgnore` of the
+            simulation's parameters.xml.
+        keep_timesteps (bool): Save the merged fluid file of every timestep.
+            Set to False to only save the statistics, which requires
+            `statistics`.
+        previews (bool): Also write PNG previews of the velocity magnitude
+            through the centre planes of every merged timestep to
+            `VTKFluid/previews` (see `previews.write_fluid_previews`).
+        pyramid_levels (Sequence[int]): Also write block-averaged copies of
+            every merged volume, downsampled by these factors (e.g. (2, 4, 8)),
+            to `VTKFluid/pyramid`. Load them with `read_fluid_level`.
+
+    Raises:
+        ValueError: If a slice coordinate lies between lattice planes, or
+            `keep_timesteps` is False without `statistics` (which would
+            write no fluid output at all).
     """
+    check_slices(slices)
+    if not keep_timesteps and not statistics:
+        raise ValueError("keep_timesteps=False only keeps the statistics of the fluid; set statistics=True.")
+    if str(data_path).endswith(ARCHIVE_SUFFIX):
+        pathlib.Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=pathlib.Path(output_path).parent) as unpacked:
+            SimulationArchive(data_path).extractall(unpacked, num_threads=num_cores)
+            merge_all_timesteps(unpacked, output_path, num_cores, region, slices, stride,
+                                statistics, statistics_start, keep_timesteps, previews, pyramid_levels)
+        return
+
     sim_root = pathlib.Path(data_path)
     target_root = pathlib.Path(output_path)
+    merged_dir = sim_root.parent / f"{sim_root.name}{TEMP_MERGE_SUFFIX}"
+    raw_dir = sim_root.parent / f"{sim_root.name}{TEMP_RAW_SUFFIX}"
+
+    if sim_root == target_root and not sim_root.exists() and merged_dir.exists() and raw_dir.exists():
+        # An in-place merge was interrupted between moving the raw data aside and moving the merged data in
+        merged_dir.rename(sim_root)
+        shutil.rmtree(raw_dir)
+        return
+
+    if statistics:
+        if callable(region):
+            raise ValueError("Running statistics need a fixed region, not one that follows the particle.")
+        if statistics_start is None:
+            time_ignore = XmlBioFM.read_parameter(str(sim_root / "parameters.xml"), "convergence.steady.timeIgnore")
+            statistics_start = int(float(time_ignore)) if time_ignore is not None else 0
+    else:
+        statistics_start = None
 
     # Handle case where input and output paths are the same
     if sim_root == target_root:
         # Create a temporary directory with a unique name
-        temp_dir = sim_root.parent / f"{sim_root.name}_temp_merge"
-        target_root = temp_dir
+        target_root = merged_dir
 
     # Ensure output directory exists
     target_root.mkdir(parents=True, exist_ok=True)
 
-    # Copy simulation directory structure without fluid VTK files
-    copy_simulation_directories(sim_root, target_root)
+    with span("merge_all_timesteps", simulation=sim_root.name, num_cores=num_cores):
+        # Copy simulation directory structure without fluid VTK files
+        with span("copy_simulation_directories", simulation=sim_root.name):
+            copy_simulation_directories(sim_root, target_root)
 
-    # Convert and merge VTK files
-    convert_simulation_directories(sim_root, target_root, num_cores)
+        # Convert and merge VTK files
+        convert_simulation_directories(
+            sim_root, target_root, num_cores, region=region, slices=slices, stride=stride,
+            statistics_start=statistics_start, keep_timesteps=keep_timesteps, previews=previews,
+            pyramid_levels=pyramid_levels
+        )
 
     # If we used a temporary directory, replace the original with the merged version
     if sim_root == pathlib.Path(output_path):
-        # Remove the original directory
-        shutil.rmtree(sim_root)
-        # Rename the temporary directory to the original name
+        # Swap the directories with renames, so a crash never leaves neither in place
+        sim_root.rename(raw_dir)
         target_root.rename(sim_root)
+        shutil.rmtree(raw_dir)
 
 def copy_simulation_directories(source: pathlib.Path, destination: pathlib.Path):
     """
@@ -115,7 +242,8 @@ def copy_simulation_directories(source: pathlib.Path, destination: pathlib.Path)
 
     shutil.copytree(source, destination, dirs_exist_ok=True, ignore=ignore_vtk_files)
 
-def convert_simulation_directories(input_path: pathlib.Path, output_path: pathlib.Path, num_cores: int):
+def convert_simulation_directories(input_path: pathlib.Path, output_path: pathlib.Path, num_cores: int,
+                                   **fluid_options):
     """
     Traverse the simulation directory tree and merge VTK files for all timesteps.
 
@@ -123,6 +251,7 @@ def convert_simulation_directories(input_path: pathlib.Path, output_path: pathli
         input_path (pathlib.Path): Input simulation directory.
         output_path (pathlib.Path): Output directory for merged data.
         num_cores (int): Number of cores to use for parallel processing.
+        **fluid_options: Options passed on to `merge_fluid_timestep`.
     """
     sim_pattern = re.compile(r"(Fluid|localFluid)_p(?P<core>\d+)_t(?P<timestep>\d+).vtk")
     particle_pattern = re.compile(r"(Particles|Axes)_rank(?P<core>\d+)_t(?P<timestep>\d+).vtk")
@@ -135,7 +264,7 @@ def convert_simulation_directories(input_path: pathlib.Path, output_path: pathli
 
             if path.name == 'VTKFluid' or path.name == 'VTKLocalFluid':
                 merge_vtk_files_in_directory(
-                    path, target_path, sim_pattern, num_cores, data_type='fluid'
+                    path, target_path, sim_pattern, num_cores, data_type='fluid', **fluid_options
                 )
             elif path.name == 'VTKParticles':
                 merge_vtk_files_in_directory(
@@ -147,7 +276,10 @@ def merge_vtk_files_in_directory(
     output_dir: pathlib.Path,
     pattern: re.Pattern,
     num_cores: int,
-    data_type: str = 'fluid'
+    data_type: str = 'fluid',
+    statistics_start: Optional[int] = None,
+    keep_timesteps: bool = True,
+    **fluid_options
 ):
     """
     Merge VTK files in a directory for all timesteps.
@@ -158,8 +290,23 @@ def merge_vtk_files_in_directory(
         pattern (re.Pattern): Regex pattern to match VTK files.
         num_cores (int): Number of cores to use for parallel processing.
         data_type (str): Type of data ('fluid' or 'particle').
+        statistics_start (Optional[int]): If given, accumulate running
+            statistics of the fluid from this timestep on and save them as
+            `Fluid_statistics.vtr`.
+        keep_timesteps (bool): Save the merged fluid file of every timestep.
+            If False, `statistics_start` is required.
+        **fluid_options: Options passed on to `merge_fluid_timestep`.
+
+    Raises:
+        ValueError: If `keep_timesteps` is False for fluid data without
+            `statistics_start`.
     """
-    files = [f for f in os.listdir(input_dir) if f.endswith('.vtk')]
+    if data_type == 'fluid' and not keep_timesteps and statistics_start is None:
+        raise ValueError("keep_timesteps=False only keeps the statistics of the fluid; pass statistics_start.")
+    files = [f for f in os.listdir(input_dir) if f.endswith('.vtk') and pattern.search(f)]
+    if not files:
+        # Already merged, e.g. a merge that is run again after a crash
+        return
     timesteps = sorted(set(
         int(pattern.search(f).group('timestep')) for f in files if pattern.search(f)
     ))
@@ -167,51 +314,670 @@ def merge_vtk_files_in_directory(
         int(pattern.search(f).group('core')) for f in files if pattern.search(f)
     ) + 1
 
+    options = {}
     if data_type == 'fluid':
         merge_func = merge_fluid_timestep
+        options = dict(fluid_options)
+        if options.get('region') is not None or options.get('slices'):
+            # The domain decomposition is fixed, so the rank bounds are read once
+            options['rank_bounds'] = read_rank_bounds(input_dir, timesteps[0], mpi_cores)
     elif data_type == 'particle':
         merge_func = merge_particle_timestep
     else:
         raise ValueError("Invalid data_type. Must be 'fluid' or 'particle'.")
 
+    if data_type == 'fluid' and (statistics_start is not None or not keep_timesteps):
+        merge_fluid_with_statistics(
+            timesteps, mpi_cores, input_dir, output_dir, num_cores,
+            statistics_start, keep_timesteps, **options
+        )
+        return
+
     jb.Parallel(n_jobs=num_cores, verbose=10)(
-        jb.delayed(merge_func)(t, mpi_cores, input_dir, output_dir)
+        jb.delayed(merge_func)(t, mpi_cores, input_dir, output_dir, **options)
         for t in timesteps
     )
 
-def merge_fluid_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Path, output_dir: pathlib.Path):
+def merge_fluid_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Path, output_dir: pathlib.Path,
+                         region: Optional[Region] = None,
+                         slices: Optional[Sequence[Tuple[str, float]]] = None,
+                         stride: int = 1,
+                         rank_bounds: Optional[List[Optional[Bounds]]] = None,
+                         previews: bool = False,
+                         pyramid_levels: Sequence[int] = ()):
     """
     Merge fluid VTK files for a single timestep.
 
+    If a region or slices are given, only the ranks whose blocks intersect
+    them are read.
+
     Args:
         timestep (int): Timestep to merge.
         mpi_cores (int): Number of MPI cores.
         input_dir (pathlib.Path): Directory containing input VTK files.
         output_dir (pathlib.Path): Directory to save merged VTK file.
+        region (Optional[Region]): Bounds, or a callable of the timestep
+            returning bounds, of the region to merge.
+        slices (Optional[Sequence[Tuple[str, float]]]): Planes to write, given
+            as (axis, coordinate). Each is saved as `Fluid_t<t>_<axis><coordinate>.vtr`
+            instead of the volume.
+        stride (int): Only keep every `stride`-th lattice point.
+        rank_bounds (Optional[List[Optional[Bounds]]]): Bounds of the block of
+            each rank, as returned by `read_rank_bounds`.
+        previews (bool): Also write PNG previews of the centre planes of the
+            merged volume, with the particle outline, to `<output_dir>/previews`.
+        pyramid_levels (Sequence[int]): Also write block-averaged copies of
+            the merged volume, downsampled by these factors, to
+            `<output_dir>/pyramid` (see `write_fluid_pyramid`).
+
+    Returns:
+        List[Optional[pyvista.RectilinearGrid]]: The merged grids, as from
+        `interpolate_fluid_timestep`.
+    """
+    simulation = pathlib.Path(input_dir).resolve().parent.name
+    with span("merge_fluid_timestep", simulation=simulation, timestep=timestep):
+        results = interpolate_fluid_timestep(timestep, mpi_cores, input_dir, region, slices, stride, rank_bounds)
+
+        output_files = _fluid_output_files(output_dir, f"t{timestep}", slices)
+        with span("write_fluid_timestep", simulation=simulation, timestep=timestep) as write_span:
+            for result, output_file in zip(results, output_files):
+                if result is None:
+                    continue
+                # Save the merged file
+                result.save(str(output_file))
+                if write_span:
+                    write_span.add(bytes=os.path.getsize(output_file), files=1)
+
+        if pyramid_levels and not slices and results[0] is not None:
+            with span("write_fluid_pyramid", simulation=simulation, timestep=timestep) as pyramid_span:
+                output_files = write_fluid_pyramid(results[0], output_dir, timestep, pyramid_levels)
+                if pyramid_span:
+                    pyramid_span.add(bytes=sum(os.path.getsize(f) for f in output_files), files=len(output_files))
+
+        if previews and not slices and results[0] is not None:
+            from .previews import PREVIEW_DIRECTORY, write_fluid_previews
+            with span("write_previews", simulation=simulation, timestep=timestep):
+                particle = read_particle_surface(pathlib.Path(input_dir).parent / "VTKParticles", timestep)
+                write_fluid_previews(results[0], pathlib.Path(output_dir) / PREVIEW_DIRECTORY, timestep, particle)
+    return results
+
+def _fluid_output_files(output_dir: pathlib.Path, label: str,
+                        slices: Optional[Sequence[Tuple[str, float]]] = None) -> List[pathlib.Path]:
+    """
+    Merged fluid file names, `Fluid_<label>.vtr` or one `Fluid_<label>_<axis><coordinate>.vtr` per slice.
+    """
+    if not slices:
+        return [pathlib.Path(output_dir) / f"Fluid_{label}.vtr"]
+    return [pathlib.Path(output_dir) / f"Fluid_{label}_{axis}{coordinate:g}.vtr" for axis, coordinate in slices]
+
+def _block_reduce(values: np.ndarray, factor: int, axis: int, ufunc: np.ufunc = np.add) -> np.ndarray:
+    """
+    Reduce blocks of `factor` entries along an axis. The last block may be shorter.
+    """
+    return ufunc.reduceat(values, np.arange(0, values.shape[axis], factor), axis=axis)
+
+
+def _block_counts(n: int, factor: int) -> np.ndarray:
+    return np.diff(np.append(np.arange(0, n, factor), n))
+
+
+def downsample_grid(grid: pv.RectilinearGrid, factor: int) -> pv.RectilinearGrid:
+    """
+    Block-average a merged fluid grid by an integer factor along every axis.
+
+    Each point of the coarse grid is the mean of a block of `factor`**3 fine
+    points (fewer at the upper edges), located at the mean of their
+    coordinates. Non-floating-point arrays, such as `vtkValidPointMask`,
+    keep the minimum of the block instead.
+
+    Args:
+        grid (pyvista.RectilinearGrid): Merged fluid grid.
+        factor (int): Downsampling factor.
+
+    Returns:
+        pyvista.RectilinearGrid: The coarse grid.
+    """
+    coordinates = [np.asarray(grid.x), np.asarray(grid.y), np.asarray(grid.z)]
+    counts = [_block_counts(len(c), factor) for c in coordinates]
+    coarse = pv.RectilinearGrid(*[_block_reduce(c, factor, 0) / n for c, n in zip(coordinates, counts)])
+
+    # Point arrays are ordered with x fastest, i.e. shaped (z, y, x, ...)
+    shape = tuple(len(c) for c in coordinates[::-1])
+    weights = counts[2][:, None, None] * counts[1][None, :, None] * counts[0][None, None, :]
+    for name in grid.point_data.keys():
+        values = np.asarray(grid.point_data[name])
+        components = values.shape[1:]
+        values = values.reshape(shape + components)
+        floating = np.issubdtype(values.dtype, np.floating)
+        for axis in range(3):
+            values = _block_reduce(values, factor, axis, np.add if floating else np.minimum)
+        if floating:
+            values = values / weights.reshape(weights.shape + (1,) * len(components))
+            values = values.astype(grid.point_data[name].dtype, copy=False)
+        coarse.point_data[name] = values.reshape((-1,) + components)
+    return coarse
+
+
+def write_fluid_pyramid(grid: pv.RectilinearGrid, output_dir: pathlib.Path, timestep: int,
+                        levels: Sequence[int] = PYRAMID_LEVELS) -> List[pathlib.Path]:
+    """
+    Write block-averaged levels of a merged fluid grid to
+    `<output_dir>/pyramid/Fluid_t<t>_x<factor>.vtr`.
+
+    Args:
+        grid (pyvista.RectilinearGrid): Merged fluid grid.
+        output_dir (pathlib.Path): Directory of the merged fluid files.
+        timestep (int): Timestep of the grid.
+        levels (Sequence[int]): Downsampling factors.
+
+    Returns:
+        List[pathlib.Path]: The files written.
+    """
+    directory = pathlib.Path(output_dir) / PYRAMID_DIRECTORY
+    directory.mkdir(parents=True, exist_ok=True)
+    output_files = []
+    for factor in sorted(set(levels)):
+        if factor <= 1:
+            continue
+        output_file = directory / f"Fluid_t{timestep}_x{factor}.vtr"
+        downsample_grid(grid, factor).save(str(output_file))
+        output_files.append(output_file)
+    return output_files
+
+
+def read_whole_extent(filename: pathlib.Path) -> Optional[Tuple[int, int, int]]:
+    """
+    Number of points along each axis of a `.vtr` file, read from the
+    WholeExtent attribute of its header without loading the data.
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(4096).decode('ascii', errors='ignore')
+    match = re.search(r'WholeExtent="([-\d\s]+)"', header)
+    if match is None:
+        return None
+    extent = [int(v) for v in match.group(1).split()]
+    return tuple(extent[2 * i + 1] - extent[2 * i] + 1 for i in range(3))
+
+
+def fluid_levels(fluid_directory: pathlib.Path, timestep: int) -> Dict[int, Tuple[int, int, int]]:
+    """
+    Available resolution levels of a merged fluid timestep.
+
+    Args:
+        fluid_directory (pathlib.Path): Directory of the merged fluid files
+            (`VTKFluid` of a merged simulation).
+        timestep (int): Timestep.
+
+    Returns:
+        Dict[int, Tuple[int, int, int]]: Number of points along x, y and z
+        for every downsampling factor, 1 being the full resolution.
     """
+    fluid_directory = pathlib.Path(fluid_directory)
+    files = {1: fluid_directory / f"Fluid_t{timestep}.vtr"}
+    pattern = re.compile(rf"Fluid_t{timestep}_x(?P<factor>\d+)\.vtr$")
+    if (fluid_directory / PYRAMID_DIRECTORY).is_dir():
+        for path in (fluid_directory / PYRAMID_DIRECTORY).iterdir():
+            match = pattern.match(path.name)
+            if match:
+                files[int(match.group('factor'))] = path
+    levels = {}
+    for factor, path in files.items():
+        if path.exists():
+            extent = read_whole_extent(path)
+            if extent is not None:
+                levels[factor] = extent
+    return dict(sorted(levels.items()))
+
+
+def read_fluid_level(fluid_directory: pathlib.Path, timestep: int,
+                     resolution: Union[int, Sequence[Optional[int]]]) -> pv.RectilinearGrid:
+    """
+    Read the coarsest level of a merged fluid timestep that still has the
+    requested resolution, falling back to the full grid.
+
+    **Usage:**
+
+    ```python
+    # At least 256 points along the longest axis, e.g. for a 256 pixel wide plot
+    grid = read_fluid_level("merged/3/VTKFluid", 20000, 256)
+    # At least 100 points along x and z
+    grid = read_fluid_level("merged/3/VTKFluid", 20000, (100, None, 100))
+    ```
+
+    Args:
+        fluid_directory (pathlib.Path): Directory of the merged fluid files.
+        timestep (int): Timestep.
+        resolution (Union[int, Sequence[Optional[int]]]): Minimum number of
+            points along the longest axis, or along each of x, y and z
+            (None for any).
+
+    Returns:
+        pyvista.RectilinearGrid: The grid of the chosen level.
+    """
+    levels = fluid_levels(fluid_directory, timestep)
+    if not levels:
+        raise FileNotFoundError(f"No merged fluid file for timestep {timestep} in {fluid_directory}")
+
+    def sufficient(extent):
+        if isinstance(resolution, int):
+            return max(extent) >= resolution
+        return all(r is None or n >= r for n, r in zip(extent, resolution))
+
+    candidates = [factor for factor, extent in levels.items() if sufficient(extent)]
+    factor = max(candidates) if candidates else min(levels)
+    if factor == 1:
+        return read_vtk(pathlib.Path(fluid_directory) / f"Fluid_t{timestep}.vtr")
+    return read_vtk(pathlib.Path(fluid_directory) / PYRAMID_DIRECTORY / f"Fluid_t{timestep}_x{factor}.vtr")
+
+
+def interpolate_fluid_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Path,
+                               region: Optional[Region] = None,
+                               slices: Optional[Sequence[Tuple[str, float]]] = None,
+                               stride: int = 1,
+                               rank_bounds: Optional[List[Optional[Bounds]]] = None
+                               ) -> List[Optional[pv.RectilinearGrid]]:
+    """
+    Merge the fluid VTK files of a single timestep onto rectilinear grids in
+    memory, without saving them. See `merge_fluid_timestep` for the arguments.
+
+    Returns:
+        List[Optional[pyvista.RectilinearGrid]]: The volume, or one grid per
+        slice, with None where nothing was inside the requested bounds.
+    """
+    check_slices(slices)
+    if callable(region):
+        region = region(timestep)
+    targets = [region] if not slices else [
+        _slice_bounds(axis, coordinate, region) for axis, coordinate in slices
+    ]
+
     # Read and merge meshes
     meshes = []
+    with span("read_fluid_ranks", simulation=pathlib.Path(input_dir).resolve().parent.name, timestep=timestep) as s:
+        for core in range(mpi_cores):
+            filename = input_dir / f"Fluid_p{core}_t{timestep}.vtk"
+            if not filename.exists():
+                continue
+            if rank_bounds is not None and rank_bounds[core] is not None and not any(
+                target is None or _intersects(rank_bounds[core], target) for target in targets
+            ):
+                continue
+            mesh = read_vtk(filename)
+            meshes.append(mesh)
+            if s:
+                s.add(bytes=os.path.getsize(filename), files=1)
+    if not meshes:
+        return [None] * len(targets)
+    merged = meshes[0].merge(meshes[1:])
+
+    # Interpolate onto a rectilinear grid
+    results = []
+    for target in targets:
+        bounds = merged.bounds if target is None else _clip_bounds(merged.bounds, target)
+        if bounds is None:
+            results.append(None)
+            continue
+        x_min, x_max, y_min, y_max, z_min, z_max = bounds
+        x_lin = np.arange(x_min, x_max + 1, stride)
+        y_lin = np.arange(y_min, y_max + 1, stride)
+        z_lin = np.arange(z_min, z_max + 1, stride)
+        grid = pv.RectilinearGrid(x_lin, y_lin, z_lin)
+        results.append(grid.interpolate(merged))
+    return results
+
+
+class RunningStatistics:
+    """
+    Per-point running mean, variance, minimum and maximum of the point arrays
+    of a sequence of grids on the same points.
+
+    Grids are added one at a time with Welford's update, so the memory needed
+    is a few field-sized buffers regardless of the number of timesteps.
+    Statistics accumulated over separate ranges of timesteps (e.g. in
+    parallel workers) are combined with `combine` (Chan et al.).
+    """
+
+    # Added by pyvista's interpolation, not a field of the simulation
+    IGNORED_ARRAYS = ("vtkValidPointMask",)
+
+    def __init__(self):
+        self.count = 0
+        self.mean: Dict[str, np.ndarray] = {}
+        self.m2: Dict[str, np.ndarray] = {}
+        self.minimum: Dict[str, np.ndarray] = {}
+        self.maximum: Dict[str, np.ndarray] = {}
+        self.grid: Optional[pv.DataSet] = None
+
+    def update(self, grid: pv.DataSet) -> None:
+        """
+        Add the point arrays of a grid.
+        """
+        if self.grid is None:
+            self.grid = grid.copy(deep=False)
+            self.grid.clear_data()
+        self.count += 1
+        for name in grid.point_data.keys():
+            if name in self.IGNORED_ARRAYS:
+                continue
+            value = np.asarray(grid.point_data[name], dtype=np.float64)
+            if name not in self.mean:
+                self.mean[name] = value.copy()
+                self.m2[name] = np.zeros_like(value)
+                self.minimum[name] = value.copy()
+                self.maximum[name] = value.copy()
+                continue
+            delta = value - self.mean[name]
+            self.mean[name] += delta / self.count
+            self.m2[name] += delta * (value - self.mean[name])
+            np.minimum(self.minimum[name], value, out=self.minimum[name])
+            np.maximum(self.maximum[name], value, out=self.maximum[name])
+
+    def combine(self, other: "RunningStatistics") -> "RunningStatistics":
+        """
+        Merge the statistics of another range of timesteps into these.
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        count = self.count + other.count
+        for name in self.mean:
+            delta = other.mean[name] - self.mean[name]
+            self.mean[name] += delta * (other.count / count)
+            self.m2[name] += other.m2[name] + delta ** 2 * (self.count * other.count / count)
+            np.minimum(self.minimum[name], other.minimum[name], out=self.minimum[name])
+            np.maximum(self.maximum[name], other.maximum[name], out=self.maximum[name])
+        self.count = count
+        return self
+
+    def variance(self, name: str) -> np.ndarray:
+        """
+        Sample variance of an array over the timesteps added.
+        """
+        return self.m2[name] / max(self.count - 1, 1)
+
+    def to_grid(self) -> pv.DataSet:
+        """
+        Grid with `<name>_mean`, `<name>_variance`, `<name>_min` and
+        `<name>_max` point arrays, and the number of timesteps in the
+        `count` field data.
+        """
+        grid = self.grid.copy()
+        for name in self.mean:
+            grid.point_data[f"{name}_mean"] = self.mean[name]
+            grid.point_data[f"{name}_variance"] = self.variance(name)
+            grid.point_data[f"{name}_min"] = self.minimum[name]
+            grid.point_data[f"{name}_max"] = self.maximum[name]
+        grid.field_data["count"] = np.array([self.count])
+        return grid
+
+
+def _merge_fluid_batch(timesteps: List[int], mpi_cores: int, input_dir: pathlib.Path, output_dir: pathlib.Path,
+                       statistics_start: Optional[int], keep_timesteps: bool,
+                       **fluid_options) -> Optional[List[RunningStatistics]]:
+    """
+    Merge a contiguous range of timesteps in one worker, accumulating the
+    statistics of the timesteps from `statistics_start` on.
+    """
+    statistics = None
+    for timestep in timesteps:
+        if keep_timesteps:
+            results = merge_fluid_timestep(timestep, mpi_cores, input_dir, output_dir, **fluid_options)
+        elif statistics_start is not None and timestep >= statistics_start:
+            options = {k: v for k, v in fluid_options.items() if k not in ('previews', 'pyramid_levels')}
+            results = interpolate_fluid_timestep(timestep, mpi_cores, input_dir, **options)
+        else:
+            continue
+        if statistics_start is None or timestep < statistics_start:
+            continue
+        if statistics is None:
+            statistics = [RunningStatistics() for _ in results]
+        for accumulator, result in zip(statistics, results):
+            if result is not None:
+                accumulator.update(result)
+    return statistics
+
+
+def merge_fluid_with_statistics(timesteps: List[int], mpi_cores: int, input_dir: pathlib.Path,
+                                output_dir: pathlib.Path, num_cores: int,
+                                statistics_start: Optional[int] = 0, keep_timesteps: bool = True,
+                                **fluid_options) -> Optional[List[RunningStatistics]]:
+    """
+    Merge the fluid timesteps of a directory and accumulate running
+    statistics of the merged fields.
+
+    The timesteps are split into one contiguous range per core. Each worker
+    merges its range with Welford updates and the partial statistics are
+    combined at the end, so no worker holds more than one timestep and its
+    statistics buffers.
+
+    Args:
+        timesteps (List[int]): Timesteps to merge.
+        mpi_cores (int): Number of MPI cores.
+        input_dir (pathlib.Path): Directory containing the fluid VTK files.
+        output_dir (pathlib.Path): Directory for the merged files and
+            `Fluid_statistics.vtr` (one `Fluid_statistics_<axis><coordinate>.vtr`
+            per slice).
+        num_cores (int): Number of cores to use.
+        statistics_start (Optional[int]): First timestep included in the
+            statistics, or None for no statistics.
+        keep_timesteps (bool): Also save the merged file of every timestep.
+            If False, only the timesteps from `statistics_start` on are read.
+        **fluid_options: Options passed on to `merge_fluid_timestep`.
+
+    Returns:
+        Optional[List[RunningStatistics]]: Statistics of the volume or of
+        each slice, or None if no timestep was included.
+
+    Raises:
+        ValueError: If `keep_timesteps` is False without `statistics_start`.
+    """
+    if not keep_timesteps:
+        if statistics_start is None:
+            raise ValueError("keep_timesteps=False only keeps the statistics of the fluid; pass statistics_start.")
+        # Split only the timesteps that are read, so every core gets a share of them
+        timesteps = [t for t in timesteps if t >= statistics_start]
+    batches = [list(batch) for batch in np.array_split(timesteps, max(min(num_cores, len(timesteps)), 1)) if len(batch)]
+    partials = jb.Parallel(n_jobs=num_cores, verbose=10)(
+        jb.delayed(_merge_fluid_batch)(
+            [int(t) for t in batch], mpi_cores, input_dir, output_dir,
+            statistics_start, keep_timesteps, **fluid_options
+        )
+        for batch in batches
+    )
+    partials = [p for p in partials if p is not None]
+    if not partials:
+        return None
+
+    statistics = functools.reduce(
+        lambda a, b: [x.combine(y) for x, y in zip(a, b)], partials
+    )
+    output_files = _fluid_output_files(output_dir, "statistics", fluid_options.get('slices'))
+    for accumulator, output_file in zip(statistics, output_files):
+        if accumulator.count:
+            accumulator.to_grid().save(str(output_file))
+    return statistics
+
+
+def read_rank_bounds(input_dir: pathlib.Path, timestep: int, mpi_cores: int) -> List[Optional[Bounds]]:
+    """
+    Read the bounds of the fluid block written by each rank.
+
+    For STRUCTURED_POINTS files only the header is read; other datasets are
+    read in full once.
+
+    Args:
+        input_dir (pathlib.Path): Directory containing the fluid VTK files.
+        timestep (int): Timestep whose files are used.
+        mpi_cores (int): Number of MPI cores.
+
+    Returns:
+        List[Optional[Bounds]]: Bounds of every rank, or None for a rank
+        without a file at that timestep.
+    """
+    rank_bounds = []
     for core in range(mpi_cores):
         filename = input_dir / f"Fluid_p{core}_t{timestep}.vtk"
         if not filename.exists():
+            rank_bounds.append(None)
             continue
-        mesh = pv.read(str(filename))
-        meshes.append(mesh)
-    if not meshes:
-        return
-    merged = meshes[0].merge(meshes[1:])
+        bounds = _read_structured_points_bounds(filename)
+        if bounds is None:
+            bounds = tuple(read_vtk(filename).bounds)
+        rank_bounds.append(bounds)
+    return rank_bounds
 
-    # Interpolate onto a rectilinear grid
-    x_min, x_max, y_min, y_max, z_min, z_max = merged.bounds
-    x_lin = np.arange(x_min, x_max + 1, 1)
-    y_lin = np.arange(y_min, y_max + 1, 1)
-    z_lin = np.arange(z_min, z_max + 1, 1)
-    grid = pv.RectilinearGrid(x_lin, y_lin, z_lin)
-    result = grid.interpolate(merged)
 
-    # Save the merged file
-    output_file = output_dir / f"Fluid_t{timestep}.vtr"
-    result.save(str(output_file))
+def _read_structured_points_bounds(filename: pathlib.Path) -> Optional[Bounds]:
+    """
+    Read the bounds from the header of a legacy STRUCTURED_POINTS VTK file.
+    """
+    header = {}
+    with open(filename, 'rb') as f:
+        for _ in range(10):
+            words = f.readline().decode('ascii', errors='ignore').split()
+            if words:
+                header[words[0].upper()] = words[1:]
+    if header.get('DATASET', [''])[0].upper() != 'STRUCTURED_POINTS':
+        return None
+    try:
+        dimensions = [int(v) for v in header['DIMENSIONS']]
+        origin = [float(v) for v in header['ORIGIN']]
+        spacing = [float(v) for v in header.get('SPACING', header.get('ASPECT_RATIO'))]
+    except (KeyError, TypeError, ValueError):
+        return None
+    bounds = []
+    for n, o, d in zip(dimensions, origin, spacing):
+        bounds.extend([o, o + (n - 1) * d])
+    return tuple(bounds)
+
+
+def _intersects(a: Bounds, b: Bounds) -> bool:
+    return all(a[2 * i] <= b[2 * i + 1] and b[2 * i] <= a[2 * i + 1] for i in range(3))
+
+
+def _clip_bounds(bounds: Bounds, region: Bounds) -> Optional[Bounds]:
+    """
+    Intersect bounds with a region, snapped inwards to lattice points.
+    """
+    clipped = []
+    for i in range(3):
+        low = np.ceil(max(bounds[2 * i], region[2 * i]))
+        high = np.floor(min(bounds[2 * i + 1], region[2 * i + 1]))
+        if low > high:
+            return None
+        clipped.extend([low, high])
+    return tuple(clipped)
+
+
+def check_slices(slices: Optional[Sequence[Tuple[str, float]]]) -> None:
+    """
+    Check that every slice is given as (axis, coordinate) with a coordinate
+    on a lattice plane.
+
+    Raises:
+        ValueError: For an unknown axis or a coordinate between lattice planes.
+    """
+    for axis, coordinate in slices or ():
+        if axis not in AXES:
+            raise ValueError(f"Unknown slice axis {axis!r}; use one of {sorted(AXES)}")
+        if float(coordinate) != round(float(coordinate)):
+            raise ValueError(
+                f"Slice {axis}={coordinate} lies between lattice planes; "
+                f"use {np.floor(coordinate):g} or {np.ceil(coordinate):g}"
+            )
+
+
+def _slice_bounds(axis: str, coordinate: float, region: Optional[Bounds] = None) -> Bounds:
+    """
+    Bounds of a single plane normal to an axis, optionally limited to a region.
+    """
+    bounds = list(region) if region is not None else [-np.inf, np.inf] * 3
+    bounds[2 * AXES[axis]] = coordinate
+    bounds[2 * AXES[axis] + 1] = coordinate
+    return tuple(bounds)
+
+
+def box_region(centre: Sequence[float], box_size: float) -> Bounds:
+    """
+    Bounds of a cube around a centre point.
+
+    Args:
+        centre (Sequence[float]): Centre of the box.
+        box_size (float): Edge length of the box.
+
+    Returns:
+        Bounds: (x_min, x_max, y_min, y_max, z_min, z_max).
+    """
+    half = 0.5 * box_size
+    return tuple(v for c in centre for v in (c - half, c + half))
+
+
+def local_vtk_region(simulation_directory: str) -> Bounds:
+    """
+    Region of the `localVTK` output of a simulation: a box of the configured
+    `boxSize` around the initial particle position.
+
+    Args:
+        simulation_directory (str): Path to the simulation directory.
+
+    Returns:
+        Bounds: (x_min, x_max, y_min, y_max, z_min, z_max).
+    """
+    box_size = float(XmlBioFM.read_parameter(
+        os.path.join(simulation_directory, "parameters.xml"), "data.fluid.localVTK.boxSize"
+    ))
+    positions_file = os.path.join(simulation_directory, "parametersPositions.xml")
+    centre = [float(XmlBioFM.read_parameter(positions_file, f"particle.{axis}")) for axis in "XYZ"]
+    return box_region(centre, box_size)
+
+
+class ParticleRegion:
+    """
+    Region that follows the particle: a box of fixed size around the centroid
+    of the particle nodes at each timestep. Pass an instance as `region` to
+    `merge_all_timesteps`.
+    """
+
+    def __init__(self, particle_dir: str, box_size: float):
+        """
+        Args:
+            particle_dir (str): Directory containing the raw
+                `Particles_rank*_t*.vtk` files of the simulation.
+            box_size (float): Edge length of the box.
+        """
+        self.particle_dir = particle_dir
+        self.box_size = box_size
+
+    def __call__(self, timestep: int) -> Bounds:
+        files = glob.glob(os.path.join(self.particle_dir, f"Particles_rank*_t{timestep}.vtk"))
+        if not files:
+            raise FileNotFoundError(f"No particle files found for timestep {timestep}.")
+        points = np.concatenate([read_vtk(f).points for f in files])
+        return box_region(points.mean(axis=0), self.box_size)
+
+def read_particle_surface(input_dir: pathlib.Path, timestep: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read the particle nodes and triangles of one timestep from the per-rank
+    particle files.
+
+    Args:
+        input_dir (pathlib.Path): Directory containing `Particles_rank*_t*.vtk` files.
+        timestep (int): Timestep to read.
+
+    Returns:
+        Optional[Tuple[np.ndarray, np.ndarray]]: (n, 3) nodes and (m, 3)
+        triangles, or None if there are no particle files for the timestep.
+    """
+    meshes = [read_vtk(f) for f in sorted(glob.glob(str(pathlib.Path(input_dir) / f"Particles_rank*_t{timestep}.vtk")))]
+    if not meshes:
+        return None
+    merged = meshes[0].merge(meshes[1:]) if len(meshes) > 1 else meshes[0]
+    faces = np.asarray(merged.faces)
+    if len(faces) == 0:
+        return None
+    return np.asarray(merged.points), faces.reshape(-1, 4)[:, 1:]
 
 def merge_particle_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Path, output_dir: pathlib.Path):
     """
@@ -229,7 +995,7 @@ def merge_particle_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Pa
         filename = input_dir / f"Particles_rank{core}_t{timestep}.vtk"
         if not filename.exists():
             continue
-        mesh = pv.read(str(filename))
+        mesh = read_vtk(filename)
         meshes.append(mesh)
     if not meshes:
         return
@@ -239,4 +1005,252 @@ def merge_particle_timestep(timestep: int, mpi_cores: int, input_dir: pathlib.Pa
     output_file = output_dir / f"Particles_t{timestep}.vtp"
     merged.save(str(output_file))
 
+def velocity_array(mesh: pv.DataSet) -> np.ndarray:
+    """
+    Return the first three-component point array of a fluid dataset, which
+    LBCode uses for the fluid velocity.
+    """
+    for name in mesh.point_data.keys():
+        array = mesh.point_data[name]
+        if array.ndim == 2 and array.shape[1] == 3:
+            return np.asarray(array)
+    raise KeyError("No velocity array found in the fluid data.")
+
+
+class FluidReduction(NamedTuple):
+    """
+    A reduction evaluated on every rank block separately.
+
+    `map(block, owned, context)` returns the partial result of one block, or
+    None if the block does not contribute. `owned` masks the points of the
+    block which are not also in a lower rank's block, so points shared by
+    neighbouring blocks are counted once. `context` holds the 'timestep',
+    the 'rank' and the global lattice 'bounds'. Partial results are combined
+    pairwise with `combine` and the total passed through `finalize`.
+    """
+    map: Callable[[pv.DataSet, np.ndarray, Dict[str, Any]], Any]
+    combine: Callable[[Any, Any], Any]
+    finalize: Optional[Callable[[Any], Any]] = None
+
+
+FLUID_REDUCTIONS: Dict[str, FluidReduction] = {}
+
+
+def register_fluid_reduction(name: str,
+                             map_function: Callable[[pv.DataSet, np.ndarray, Dict[str, Any]], Any],
+                             combine_function: Callable[[Any, Any], Any],
+                             finalize_function: Optional[Callable[[Any], Any]] = None) -> None:
+    """
+    Register a reduction for `reduce_fluid_timestep` and `reduce_fluid_timesteps`.
+
+    Args:
+        name (str): Name of the reduction.
+        map_function: Partial result of one rank block, see `FluidReduction`.
+        combine_function: Combines two partial results.
+        finalize_function: Turns the combined result into the final value.
+    """
+    FLUID_REDUCTIONS[name] = FluidReduction(map_function, combine_function, finalize_function)
+
+
+def _max_velocity(block, owned, context):
+    velocity = velocity_array(block)[owned]
+    return np.linalg.norm(velocity, axis=1).max() if len(velocity) else None
+
+
+def _kinetic_energy(block, owned, context):
+    # Lattice units, with the density taken as 1
+    return 0.5 * np.sum(velocity_array(block)[owned] ** 2)
+
+
+def _mean_velocity(block, owned, context):
+    velocity = velocity_array(block)[owned]
+    return velocity.sum(axis=0), len(velocity)
+
+
+def _add_pairs(a, b):
+    return a[0] + b[0], a[1] + b[1]
+
+
+def _divide_pair(total):
+    return total[0] / total[1]
+
+
+def _centre_plane(bounds: Bounds, axis: int) -> float:
+    # Same plane as the centre index of the merged grid
+    low, high = bounds[2 * axis], bounds[2 * axis + 1]
+    return low + int(high - low + 1) // 2
+
+
+def _flow_rate(block, owned, context, axis):
+    plane = np.abs(block.points[:, axis] - _centre_plane(context["bounds"], axis)) < 0.5
+    selected = owned & plane
+    if not selected.any():
+        return None
+    return velocity_array(block)[selected, axis].sum()
+
+
+def _wall_shear_rate(block, owned, context, axis):
+    """
+    Sum and count of the tangential velocity gradient at the two walls
+    normal to an axis, from one-sided differences inside the block.
+    """
+    if not hasattr(block, "spacing"):
+        return None
+    dimensions = tuple(block.dimensions)
+    if dimensions[axis] < 2:
+        return None
+    # Point data is ordered with x varying fastest
+    velocity = velocity_array(block).reshape(dimensions[::-1] + (3,))
+    owned = owned.reshape(dimensions[::-1])
+    array_axis = 2 - axis
+    tangential = [a for a in range(3) if a != axis]
+
+    total, count = 0.0, 0
+    for wall, inner, bound in ((0, 1, 2 * axis), (-1, -2, 2 * axis + 1)):
+        if not np.isclose(block.bounds[bound], context["bounds"][bound]):
+            continue
+        difference = np.take(velocity, inner, axis=array_axis) - np.take(velocity, wall, axis=array_axis)
+        shear = np.linalg.norm(difference[..., tangential], axis=-1) / block.spacing[axis]
+        mask = np.take(owned, wall, axis=array_axis)
+        total += shear[mask].sum()
+        count += int(mask.sum())
+    return (total, count) if count else None
+
+
+register_fluid_reduction("max_velocity", _max_velocity, max)
+register_fluid_reduction("kinetic_energy", _kinetic_energy, operator.add)
+register_fluid_reduction("mean_velocity", _mean_velocity, _add_pairs, _divide_pair)
+for _axis, _name in enumerate("xyz"):
+    register_fluid_reduction(f"flow_rate_{_name}", functools.partial(_flow_rate, axis=_axis), operator.add)
+    register_fluid_reduction(
+        f"wall_shear_rate_{_name}", functools.partial(_wall_shear_rate, axis=_axis), _add_pairs, _divide_pair
+    )
+del _axis, _name
+
+
+def _owned_points(points: np.ndarray, rank: int, rank_bounds: List[Optional[Bounds]]) -> np.ndarray:
+    """
+    Mask of the points of a rank block which are not in the block of a lower rank.
+    """
+    owned = np.ones(len(points), dtype=bool)
+    for bounds in rank_bounds[:rank]:
+        if bounds is None:
+            continue
+        inside = np.ones(len(points), dtype=bool)
+        for axis in range(3):
+            inside &= (points[:, axis] >= bounds[2 * axis]) & (points[:, axis] <= bounds[2 * axis + 1])
+        owned &= ~inside
+    return owned
+
+
+def _map_fluid_block(filename: pathlib.Path, rank: int, rank_bounds: List[Optional[Bounds]],
+                     reductions: Dict[str, FluidReduction], context: Dict[str, Any]) -> Dict[str, Any]:
+    block = read_vtk(filename)
+    owned = _owned_points(block.points, rank, rank_bounds)
+    context = dict(context, rank=rank)
+    return {name: reduction.map(block, owned, context) for name, reduction in reductions.items()}
+
+
+def _resolve_reductions(reductions: Optional[Union[Iterable[str], Dict[str, FluidReduction]]]
+                        ) -> Dict[str, FluidReduction]:
+    if reductions is None:
+        return dict(FLUID_REDUCTIONS)
+    if isinstance(reductions, dict):
+        return reductions
+    return {name: FLUID_REDUCTIONS[name] for name in reductions}
+
+
+def _combine_partials(reductions: Dict[str, FluidReduction], partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    results = {}
+    for name, reduction in reductions.items():
+        values = [p[name] for p in partials if p[name] is not None]
+        if not values:
+            results[name] = None
+            continue
+        total = functools.reduce(reduction.combine, values)
+        results[name] = reduction.finalize(total) if reduction.finalize is not None else total
+    return results
+
+
+def _global_bounds(rank_bounds: List[Optional[Bounds]]) -> Bounds:
+    present = np.array([b for b in rank_bounds if b is not None])
+    return tuple(float(v) for pair in zip(present[:, 0::2].min(axis=0), present[:, 1::2].max(axis=0)) for v in pair)
+
+
+def reduce_fluid_timesteps(input_dir: pathlib.Path,
+                           reductions: Optional[Union[Iterable[str], Dict[str, FluidReduction]]] = None,
+                           num_cores: int = 8,
+                           timesteps: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Evaluate reductions of the fluid field for every timestep by streaming
+    over the per-rank files, without merging the domain.
+
+    Every (timestep, rank) block is mapped independently in parallel and the
+    partial results combined afterwards, so memory use is that of one block
+    per worker.
+
+    Args:
+        input_dir (pathlib.Path): Directory containing `Fluid_p*_t*.vtk` files.
+        reductions: Names of registered reductions (see
+            `register_fluid_reduction`) or FluidReduction objects by name.
+            Defaults to all registered reductions: max_velocity,
+            kinetic_energy, mean_velocity, flow_rate_{x,y,z} and
+            wall_shear_rate_{x,y,z}.
+        num_cores (int): Number of cores to use for parallel processing.
+        timesteps (Optional[Sequence[int]]): Timesteps to reduce. Defaults to all.
+
+    Returns:
+        Dict[str, np.ndarray]: 'time' and one array per reduction.
+    """
+    input_dir = pathlib.Path(input_dir)
+    reductions = _resolve_reductions(reductions)
+    pattern = re.compile(r"Fluid_p(?P<core>\d+)_t(?P<timestep>\d+)\.vtk")
+    matches = [m for m in (pattern.fullmatch(f) for f in os.listdir(input_dir)) if m]
+    if not matches:
+        raise FileNotFoundError(f"No fluid VTK files found in {input_dir}.")
+    if timesteps is None:
+        timesteps = sorted({int(m.group('timestep')) for m in matches})
+    mpi_cores = max(int(m.group('core')) for m in matches) + 1
+
+    # The domain decomposition is fixed, so the rank bounds are read once
+    rank_bounds = read_rank_bounds(input_dir, timesteps[0], mpi_cores)
+    bounds = _global_bounds(rank_bounds)
+
+    tasks = [
+        (t, core) for t in timesteps for core in range(mpi_cores)
+        if (input_dir / f"Fluid_p{core}_t{t}.vtk").exists()
+    ]
+    partials = jb.Parallel(n_jobs=num_cores)(
+        jb.delayed(_map_fluid_block)(
+            input_dir / f"Fluid_p{core}_t{t}.vtk", core, rank_bounds, reductions,
+            {"timestep": t, "bounds": bounds}
+        )
+        for t, core in tasks
+    )
+
+    by_timestep = {t: [] for t in timesteps}
+    for (t, _), partial in zip(tasks, partials):
+        by_timestep[t].append(partial)
+    combined = [_combine_partials(reductions, by_timestep[t]) for t in timesteps]
+
+    results = {"time": np.array(timesteps)}
+    for name in reductions:
+        results[name] = np.array([c[name] for c in combined])
+    return results
+
+
+def reduce_fluid_timestep(timestep: int, input_dir: pathlib.Path,
+                          reductions: Optional[Union[Iterable[str], Dict[str, FluidReduction]]] = None,
+                          num_cores: int = 8) -> Dict[str, Any]:
+    """
+    Evaluate reductions of the fluid field of one timestep by streaming over
+    the per-rank files. See `reduce_fluid_timesteps`.
+
+    Returns:
+        Dict[str, Any]: Value of every reduction.
+    """
+    results = reduce_fluid_timesteps(input_dir, reductions, num_cores, timesteps=[timestep])
+    return {name: values[0] for name, values in results.items() if name != "time"}
+
+
 # Additional utility functions can be added here as needed
\ No newline at end of file
@@ -3,9 +3,10 @@
 import os
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
-from typing import Dict, Tuple, Any, List
+from typing import Dict, Tuple, Any, List, Optional
 import logging
 import datetime
+from .tracing import span
 
 class XmlBioFM:
     """
@@ -80,6 +81,55 @@ class XmlBioFM:
         parameters = [XmlBioFM._xml_to_dict(element) for element in root]
         return parameters
 
+    @staticmethod
+    def read_parameter(xml_file_path: str, path_str: str) -> Optional[str]:
+        """
+        Read a single attribute value from an XML parameter file.
+
+        Args:
+            xml_file_path (str): Path to the XML file.
+            path_str (str): Dotted parameter path, e.g. 'MPI.cores.x'.
+
+        Returns:
+            Optional[str]: The attribute value, or None if the path does not exist.
+        """
+        path_components = path_str.split('.')
+        if len(path_components) < 2:
+            return None
+        elements = XmlBioFM.read_xml_file(xml_file_path)
+        for tag in path_components[:-1]:
+            matches = [e for e in elements if e["_tag"] == tag]
+            if not matches:
+                return None
+            parent = matches[0]
+            elements = parent["_children"]
+        return parent["_attrib"].get(path_components[-1])
+
+    @staticmethod
+    def flatten_parameters(xml_file_path: str) -> Dict[str, str]:
+        """
+        Read all attribute values of an XML parameter file.
+
+        Args:
+            xml_file_path (str): Path to the XML file.
+
+        Returns:
+            Dict[str, str]: Attribute values keyed by dotted parameter path,
+            e.g. {'MPI.cores.x': '2', ...}.
+        """
+        flat = {}
+
+        def flatten(element: Dict[str, Any], prefix: str) -> None:
+            path = f"{prefix}{element['_tag']}"
+            for name, value in element["_attrib"].items():
+                flat[f"{path}.{name}"] = value
+            for child in element["_children"]:
+                flatten(child, f"{path}.")
+
+        for element in XmlBioFM.read_xml_file(xml_file_path):
+            flatten(element, "")
+        return flat
+
     @staticmethod
     def calculate_new_parameters(
             parameters: List[Dict[str, Any]],
@@ -250,34 +300,37 @@ class XmlBioFM:
         total_successful = 0
         total_failed = 0
 
-        for xml_path, parameter_updates in full_path_updates.items():
-            logger.info(f"\nProcessing file: {os.path.basename(xml_path)}")
-            
-            if not os.path.exists(xml_path):
-                logger.warning(f"Template file {xml_path} not found")
-                continue
-                
-            parameters = XmlBioFM.read_xml_file(xml_path)
-            
-            # Ensure parameter paths are in the right format (string paths)
-            processed_updates = {}
-            for k, v in parameter_updates.items():
-                if isinstance(k, tuple):
-                    processed_updates['.'.join(k)] = v
-                else:
-                    processed_updates[k] = v
-            
-            logger.info(f"Found {len(processed_updates)} parameters to update in {os.path.basename(xml_path)}")
-            
-            new_parameters, successful, failed = XmlBioFM.calculate_new_parameters(parameters, processed_updates, logger)
-            total_successful += successful
-            total_failed += failed
-            
-            output_file_name = os.path.basename(xml_path)
-            output_path = os.path.join(directory_name, output_file_name)
-            XmlBioFM.write_new_parameter_file(directory_name, new_parameters, output_file_name)
-            logger.info(f"Updated parameter file written to {output_path}")
-            
+        with span("write_parameter_files", simulation=os.path.basename(os.path.normpath(directory_name))) as s:
+            for xml_path, parameter_updates in full_path_updates.items():
+                logger.info(f"\nProcessing file: {os.path.basename(xml_path)}")
+
+                if not os.path.exists(xml_path):
+                    logger.warning(f"Template file {xml_path} not found")
+                    continue
+
+                parameters = XmlBioFM.read_xml_file(xml_path)
+
+                # Ensure parameter paths are in the right format (string paths)
+                processed_updates = {}
+                for k, v in parameter_updates.items():
+                    if isinstance(k, tuple):
+                        processed_updates['.'.join(k)] = v
+                    else:
+                        processed_updates[k] = v
+
+                logger.info(f"Found {len(processed_updates)} parameters to update in {os.path.basename(xml_path)}")
+
+                new_parameters, successful, failed = XmlBioFM.calculate_new_parameters(parameters, processed_updates, logger)
+                total_successful += successful
+                total_failed += failed
+
+                output_file_name = os.path.basename(xml_path)
+                output_path = os.path.join(directory_name, output_file_name)
+                XmlBioFM.write_new_parameter_file(directory_name, new_parameters, output_file_name)
+                logger.info(f"Updated parameter file written to {output_path}")
+                if s:
+                    s.add(bytes=os.path.getsize(output_path), files=1)
+
         # Log summary info that will appear in console
         XmlBioFM.log_summary(logger, total_successful, total_failed, directory_name)
 
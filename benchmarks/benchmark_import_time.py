@@ -0,0 +1,83 @@
+# benchmark_import_time.py
+
+"""
+Benchmark the time it takes to import LBMSimulationInterface for a task which
+only prepares and launches a simulation. Each measurement runs in a fresh
+interpreter. The script exits with a non-zero code if the median import time
+exceeds the limit, or if any of the heavy optional modules were imported, so
+it can be used to catch regressions:
+
+    python benchmarks/benchmark_import_time.py --repeat 10 --limit 0.2
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["numpy", "pyvista", "vtk", "joblib", "tqdm", "pandas"]
+
+MEASUREMENT = """
+import json, sys, time
+start = time.perf_counter()
+import LBMSimulationInterface as lbmi
+lbmi.SimulationSetup, lbmi.ParameterUpdates
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "heavy_modules": [m for m in {heavy} if m in sys.modules],
+}}))
+"""
+
+
+def measure_import_time(repeat: int) -> dict:
+    """
+    Import the package in `repeat` fresh interpreters.
+
+    Args:
+        repeat (int): Number of measurements.
+
+    Returns:
+        dict: Median and all import times in seconds, and the heavy modules
+        that were imported.
+    """
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=package_root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    code = MEASUREMENT.format(heavy=HEAVY_MODULES)
+
+    times = []
+    heavy_modules = set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        heavy_modules.update(result["heavy_modules"])
+    return {
+        "median_seconds": statistics.median(times),
+        "seconds": times,
+        "heavy_modules": sorted(heavy_modules),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=10, help="number of fresh interpreters")
+    parser.add_argument("--limit", type=float, default=0.2, help="maximum median import time in seconds")
+    args = parser.parse_args()
+
+    result = measure_import_time(args.repeat)
+    print(f"Median import time: {result['median_seconds'] * 1000:.1f} ms "
+          f"(min {min(result['seconds']) * 1000:.1f} ms, max {max(result['seconds']) * 1000:.1f} ms)")
+
+    failed = False
+    if result["heavy_modules"]:
+        print(f"Heavy modules imported: {', '.join(result['heavy_modules'])}")
+        failed = True
+    if result["median_seconds"] > args.limit:
+        print(f"Median import time exceeds the limit of {args.limit * 1000:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,80 @@
+# benchmark_pipeline.py
+
+"""
+Benchmark running, merging and reducing a simulation with the synthetic
+LBCode stand-in, so the Python pipeline can be timed at production lattice
+sizes and decompositions without MPI or the real solver:
+
+    python benchmarks/benchmark_pipeline.py --lattice 128 128 128 --mpi 4 4 2 --steps 10 --cores 8
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LBMSimulationInterface as lbmi
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tutorial_example", "template")
+
+
+def benchmark(lattice, mpi, steps: int, cores: int, work_directory: str) -> dict:
+    """
+    Time the stages for one synthetic simulation.
+
+    Args:
+        lattice: Lattice size (NX, NY, NZ).
+        mpi: MPI decomposition (x, y, z).
+        steps (int): Number of fluid and particle output timesteps.
+        cores (int): Number of cores for merging and reductions.
+        work_directory (str): Scratch directory.
+
+    Returns:
+        dict: Seconds per stage.
+    """
+    template = os.path.join(work_directory, "template")
+    shutil.copytree(TEMPLATE, template)
+    # Replaces the real binary in the copy only
+    lbmi.install_fake_lbcode(template, overwrite=True)
+
+    output_step = 100
+    parameter_updates = lbmi.ParameterUpdates().MPI(mpi).lattice(*lattice).sim_time(steps * output_step)
+    parameter_updates.vtk_save(fluid_step=output_step, particle_step=output_step)
+    parameter_updates.mesh(radius=min(lattice) / 4, kV=0, kA=1, kalpha=0.01, kS=0.01, kB=0)
+
+    timings = {}
+    start = time.perf_counter()
+    setup = lbmi.SimulationSetup(template, os.path.join(work_directory, "simulations"), parameter_updates)
+    timings["prepare"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    setup.run_simulation(num_cores=1, logfile="log.txt")
+    timings["run (synthetic)"] = time.perf_counter() - start
+
+    fluid_directory = os.path.join(setup.simulation_directory, "VTKFluid")
+    start = time.perf_counter()
+    lbmi.reduce_fluid_timesteps(fluid_directory, num_cores=cores)
+    timings["streaming reductions"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lbmi.merge_all_timesteps(setup.simulation_directory, setup.simulation_directory + "_merged", num_cores=cores)
+    timings["merge"] = time.perf_counter() - start
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lattice", type=int, nargs=3, default=[64, 64, 64], help="NX NY NZ")
+    parser.add_argument("--mpi", type=int, nargs=3, default=[2, 2, 2], help="MPI cores in x, y, z")
+    parser.add_argument("--steps", type=int, default=5, help="number of output timesteps")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="cores for merging and reductions")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        timings = benchmark(args.lattice, tuple(args.mpi), args.steps, args.cores, work_directory)
+    for stage, seconds in timings.items():
+        print(f"{stage:>22s}: {seconds:8.2f} s")
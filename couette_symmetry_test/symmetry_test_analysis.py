@@ -1,12 +1,12 @@
 import os
-import pandas as pd
+import LBMSimulationInterface as lbmi
 import matplotlib.pyplot as plt
 
 def calculate_taylor_deformation(filepath):
     particle_data = os.path.join(filepath, 'Particles', 'Axes_0.dat')
-    particle_df = pd.read_csv(particle_data, sep=' ', comment='#')
+    particle_stats = lbmi.load_statistics_file(particle_data)
 
-    D = (particle_df.a - particle_df.c)/(particle_df.a + particle_df.c)
+    D = lbmi.taylor_deformation(particle_stats)
 
     return D
     
@@ -14,6 +14,17 @@ def calculate_taylor_deformation(filepath):
 D_x = calculate_taylor_deformation('couette_symmetry_test/data/x_velocity_merged')
 D_y = calculate_taylor_deformation('couette_symmetry_test/data/y_velocity_merged')
 
+# The y-driven flow field, with x and y swapped, should match the x-driven one
+comparison = lbmi.compare_runs(
+    'couette_symmetry_test/data/x_velocity_merged',
+    'couette_symmetry_test/data/y_velocity_merged',
+    permutation=('y', 'x', 'z'),
+    tolerances={'relative_l2': 1e-3},
+)
+print(comparison)
+for field, errors in comparison.worst().items():
+    print(field, errors)
+
 plt.plot(D_x, label='x driven flow')
 plt.plot(D_y, label='y driven flow')
 plt.xlabel('Timestep')
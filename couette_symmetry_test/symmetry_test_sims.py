@@ -1,7 +1,6 @@
 import LBMSimulationInterface as lbmi
 import math
 import os
-import shutil 
 
 def couette_sim(Re_p, Ca, confinement, length_z, velocity_direction='x'):
     """
@@ -11,8 +10,10 @@ def couette_sim(Re_p, Ca, confinement, length_z, velocity_direction='x'):
     parameter files for different individual simulations within a campaign.
     """
 
-    # Initialise the parameter updates class
+    # Initialise the parameter updates class, recording the physical inputs
     parameter_updates = lbmi.ParameterUpdates()
+    parameter_updates.physical(Re_p=Re_p, Ca=Ca, confinement=confinement, length_z=length_z,
+                               velocity_direction=velocity_direction)
 
     # Set up the domain size
     parameter_updates.lattice(NX=length_z,NY=length_z,NZ=length_z)
@@ -51,6 +52,8 @@ def couette_sim(Re_p, Ca, confinement, length_z, velocity_direction='x'):
     # Set particle properties based on Ca and Bq values:
     kS = lbmi.calculate_viscosity(tau)*shear_rate*meshRadius/Ca # set kappa_s by Ca=visc*gammadot*radius/kS
     kalpha = kS # relationship kalpha/ks = 1
+    parameter_updates.conversion("velocity", "Re_p*nu*(length_z-2)/(2*radius**2)", velocity)
+    parameter_updates.conversion("kS", "nu*shear_rate*radius/Ca", kS)
 
     # Update the parameter_updates class with the mesh properties
     parameter_updates.mesh(
@@ -75,6 +78,9 @@ if __name__ == '__main__':
     Ca = 0.1
     length_z = 30
 
+    # Merge, reduce and prune finished runs while the next one is computing
+    pipeline = lbmi.PostProcessingPipeline(num_workers=1, merge_cores=6)
+
     for velocity_direction in ['x', 'y']:
         # Get the parameter updates
         parameter_updates = couette_sim(Re_p, Ca, confinement, length_z, velocity_direction)
@@ -88,8 +94,8 @@ if __name__ == '__main__':
         )
         setup.run_simulation(num_cores=6)
 
-        # It's good practise to merge the VTK files after the simulation to save space
-        lbmi.merge_all_timesteps(setup.simulation_directory, setup.simulation_directory+'_merged', num_cores=6)
+        # It's good practise to merge the VTK files after the simulation to save space.
+        # The original unmerged files are removed once the merge is done.
+        pipeline.submit(setup.simulation_directory, setup.simulation_directory+'_merged')
 
-        # Remove the original unmerged files
-        shutil.rmtree(setup.simulation_directory)
+    pipeline.wait()
@@ -6,10 +6,13 @@ import pprint as pp
 import os
 def cross_slot_simulation(Ca, Z0, X0):
     parameter_updates = lbmi.ParameterUpdates()
+    parameter_updates.physical(Ca=Ca, Z0=Z0, X0=X0)
 
     kS = (1/60)*(0.025*9.6)/(Ca*48)
     kalpha = 2*kS
     kB = 2.87e-3 * kS * 9.6**2
+    parameter_updates.conversion("kS", "(1/60)*(0.025*9.6)/(Ca*48)", kS)
+    parameter_updates.conversion("kB", "2.87e-3*kS*9.6**2", kB)
     
     parameter_updates.mesh_kostas(radius=9.6, kV=1, kA=0, kalpha=kalpha, kS=kS,
                                kB=kB, density=1)
@@ -17,6 +20,8 @@ def cross_slot_simulation(Ca, Z0, X0):
     # convert positions to lattice units
     z0 = Z0*(48/2) + (50/2)
     x0 = (560/2) - X0*(80/2)
+    parameter_updates.conversion("z0", "Z0*(48/2) + (50/2)", z0)
+    parameter_updates.conversion("x0", "(560/2) - X0*(80/2)", x0)
 
     parameter_updates.kostas_cross_slot_x_z_restrict(initial_y=x0, initial_z=z0, k_y=4, k_z=4)
 
@@ -0,0 +1,47 @@
+# conftest.py
+
+"""
+Fixtures running small simulations with the synthetic LBCode stand-in (see
+`fake_lbcode`), so the tests need neither the real solver nor MPI.
+"""
+
+import os
+import shutil
+import pytest
+import LBMSimulationInterface as lbmi
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tutorial_example", "template")
+
+LATTICE = (16, 16, 16)
+MPI = (2, 1, 1)
+OUTPUT_STEP = 100
+STEPS = 3
+
+
+@pytest.fixture(scope="session")
+def template(tmp_path_factory):
+    path = tmp_path_factory.mktemp("template") / "template"
+    shutil.copytree(TEMPLATE, path)
+    # Replaces the real binary in the copy only
+    lbmi.install_fake_lbcode(str(path), overwrite=True)
+    return str(path)
+
+
+def parameter_updates() -> lbmi.ParameterUpdates:
+    updates = lbmi.ParameterUpdates().MPI(MPI).lattice(*LATTICE).sim_time(STEPS * OUTPUT_STEP)
+    updates.vtk_save(fluid_step=OUTPUT_STEP, particle_step=OUTPUT_STEP)
+    updates.mesh(radius=min(LATTICE) / 4, kV=0, kA=1, kalpha=0.01, kS=0.01, kB=0)
+    return updates
+
+
+@pytest.fixture
+def prepared(template, tmp_path):
+    """A prepared simulation that has not been run."""
+    return lbmi.SimulationSetup(template, str(tmp_path / "simulations"), parameter_updates())
+
+
+@pytest.fixture
+def simulation(prepared):
+    """Directory of a finished simulation with timesteps 0 to 300."""
+    assert prepared.run_simulation(num_cores=1, logfile="log.txt") == 0
+    return prepared.simulation_directory
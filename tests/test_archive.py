@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pytest
+import LBMSimulationInterface as lbmi
+from LBMSimulationInterface.archive import SimulationArchive, archive_simulation
+
+
+def test_round_trip(simulation):
+    expected = {}
+    for directory, _, files in os.walk(simulation):
+        for name in files:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                expected[os.path.relpath(path, simulation).replace(os.sep, '/')] = f.read()
+    grid = lbmi.merge_latest_fluid_vtk_files(os.path.join(simulation, "VTKFluid"), save=False)
+
+    archive_path = archive_simulation(simulation, num_threads=2, block_size=4096, remove=True)
+    assert not os.path.exists(simulation)
+
+    archive = SimulationArchive(archive_path)
+    assert archive.verify() == []
+    assert sorted(archive.names()) == sorted(expected)
+    for name, data in expected.items():
+        assert archive.read(name) == data
+
+    fluid = lbmi.read_vtk(os.path.join(archive_path, "VTKFluid", "Fluid_p0_t300.vtk"))
+    assert fluid.n_points > 0
+    archived_grid = lbmi.merge_latest_fluid_vtk_files(os.path.join(archive_path, "VTKFluid"), save=False)
+    np.testing.assert_array_equal(archived_grid["density"], grid["density"])
+    with pytest.raises(ValueError):
+        lbmi.merge_latest_fluid_vtk_files(os.path.join(archive_path, "VTKFluid"))
+
+
+def test_verify_detects_damage(simulation):
+    archive_path = archive_simulation(simulation, num_threads=1)
+    name = "VTKFluid/Fluid_p0_t300.vtk"
+    offset, length = SimulationArchive(archive_path).files[name]["blocks"][0]
+    with open(archive_path, 'r+b') as f:
+        f.seek(offset + length // 2)
+        byte = f.read(1)
+        f.seek(offset + length // 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    assert name in SimulationArchive(archive_path).verify()
@@ -0,0 +1,59 @@
+import glob
+import json
+import os
+import time
+import LBMSimulationInterface as lbmi
+from LBMSimulationInterface.campaign_queue import CampaignQueue
+from LBMSimulationInterface.checkpoints import list_checkpoints
+from conftest import OUTPUT_STEP, parameter_updates
+
+
+def test_claim_requeue_and_run(prepared):
+    root = prepared.root_path
+    simulation_id = os.path.basename(prepared.simulation_directory)
+    queue = CampaignQueue(root, lease_timeout=60, heartbeat=60)
+    assert queue.submit([prepared]) == [simulation_id]
+    assert queue.submit([prepared]) == []
+
+    lease = queue.claim()
+    assert lease.simulation_id == simulation_id
+    assert queue.state(simulation_id) == "running"
+    assert queue.claim() is None
+
+    # A worker that stopped renewing: its lease expires
+    expired = time.time() - 120
+    os.utime(lease.path, (expired, expired))
+    other = CampaignQueue(root, lease_timeout=60, heartbeat=60)
+    other.worker = "other-node:1"
+    other_lease = other.claim()
+    assert other_lease.simulation_id == simulation_id
+    assert other_lease.task["attempts"] == 2
+    assert not lease.renew(retry_delay=0)
+    assert lease.lost
+
+    assert other.run(other_lease) == 0
+    assert other.state(simulation_id) == "done"
+    with open(os.path.join(root, "simulation_lookup.json")) as f:
+        assert json.load(f)[simulation_id]["Exit code"] == 0
+    assert glob.glob(os.path.join(prepared.simulation_directory, "VTKFluid", "Fluid_p*_t300.vtk"))
+
+
+def test_release_gives_attempt_back(prepared):
+    queue = CampaignQueue(prepared.root_path)
+    queue.submit([prepared])
+    lease = queue.claim()
+    queue.release(lease)
+
+    assert queue.state(lease.simulation_id) == "pending"
+    assert queue.claim().task["attempts"] == 1
+
+
+def test_run_prunes_checkpoints(template, tmp_path):
+    updates = parameter_updates()
+    updates.checkpoint(OUTPUT_STEP, -1, -1)
+    setup = lbmi.SimulationSetup(template, str(tmp_path / "simulations"), updates)
+    queue = CampaignQueue(setup.root_path, keep_checkpoints=1)
+    queue.submit([setup])
+
+    assert queue.run(queue.claim()) == 0
+    assert len(list_checkpoints(os.path.join(setup.simulation_directory, "Backup"))) == 1
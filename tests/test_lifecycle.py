@@ -0,0 +1,33 @@
+import glob
+import os
+import pytest
+import LBMSimulationInterface as lbmi
+from LBMSimulationInterface.lifecycle import LifecycleManager, LifecyclePolicy
+
+
+def _raw_files(simulation):
+    return glob.glob(os.path.join(simulation, "VTK*", "*_*_t*.vtk"))
+
+
+def test_raw_files_kept_until_merged(simulation):
+    root = os.path.dirname(simulation)
+    manager = LifecycleManager(root, LifecyclePolicy(min_age=0))
+    assert not [a for a in manager.plan() if a.artefact_class == "raw"]
+
+    lbmi.merge_all_timesteps(simulation, simulation + lbmi.lifecycle.MERGED_SUFFIX, num_cores=1)
+    actions = [a for a in manager.plan() if a.artefact_class == "raw"]
+    assert sorted(p for a in actions for p in a.paths) == sorted(_raw_files(simulation))
+
+    manager.apply(actions)
+    assert not _raw_files(simulation)
+
+
+def test_quota_does_not_evict_unmerged_raw_files(simulation):
+    root = os.path.dirname(simulation)
+    manager = LifecycleManager(root, LifecyclePolicy(quota_bytes=1, min_age=0))
+    with pytest.warns(UserWarning, match="above its quota"):
+        actions = manager.plan()
+
+    assert not [a for a in actions if a.artefact_class == "raw"]
+    assert manager.quota_shortfall > 0
+    assert "Quota still exceeded" in manager.report(actions)
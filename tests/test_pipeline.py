@@ -0,0 +1,41 @@
+import glob
+import os
+import shutil
+import numpy as np
+from LBMSimulationInterface.pipeline import process_simulation
+
+
+def _merged_files(directory):
+    return sorted(os.path.relpath(f, directory) for f in glob.glob(os.path.join(directory, "VTK*", "*.vt[rp]")))
+
+
+def test_in_place(simulation):
+    assert process_simulation(simulation) == simulation
+
+    for stage in ("merge", "reduce", "prune"):
+        assert os.path.exists(os.path.join(simulation, ".postprocessing", f"{stage}.done"))
+    assert not glob.glob(os.path.join(simulation, "VTK*", "*.vtk"))
+    assert len(_merged_files(simulation)) == 8
+    centroid = np.load(os.path.join(simulation, "reductions", "centroid.npz"))
+    assert centroid["centroid"].shape == (4, 3)
+
+
+def test_resume_after_lost_markers(simulation):
+    process_simulation(simulation)
+    merged = _merged_files(simulation)
+    # E.g. a crash between the in-place merge and writing its marker
+    shutil.rmtree(os.path.join(simulation, ".postprocessing"))
+
+    process_simulation(simulation)
+    assert _merged_files(simulation) == merged
+    assert os.path.exists(os.path.join(simulation, ".postprocessing", "prune.done"))
+
+
+def test_out_of_place_keeps_raw(simulation):
+    output = simulation + "_merged"
+    process_simulation(simulation, output)
+    assert len(_merged_files(output)) == 8
+    assert glob.glob(os.path.join(simulation, "VTKFluid", "Fluid_p*_t*.vtk"))
+
+    process_simulation(simulation, simulation + "_other", remove_raw=True)
+    assert not os.path.exists(simulation)
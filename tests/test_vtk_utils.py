@@ -0,0 +1,48 @@
+import glob
+import os
+import numpy as np
+import pytest
+import pyvista as pv
+import LBMSimulationInterface as lbmi
+from conftest import LATTICE, OUTPUT_STEP, STEPS
+
+TIMESTEPS = [t * OUTPUT_STEP for t in range(STEPS + 1)]
+
+
+def test_merge_all_timesteps(simulation):
+    merged = simulation + "_merged"
+    lbmi.merge_all_timesteps(simulation, merged, num_cores=1)
+
+    for t in TIMESTEPS:
+        grid = pv.read(os.path.join(merged, "VTKFluid", f"Fluid_t{t}.vtr"))
+        assert grid.dimensions == LATTICE
+        assert {"density", "velocity"} <= set(grid.array_names)
+        assert os.path.exists(os.path.join(merged, "VTKParticles", f"Particles_t{t}.vtp"))
+    assert not glob.glob(os.path.join(merged, "VTK*", "*.vtk"))
+    # An out-of-place merge leaves the raw files alone
+    assert glob.glob(os.path.join(simulation, "VTKFluid", "Fluid_p*_t*.vtk"))
+
+
+def test_merge_statistics_only(simulation):
+    merged = simulation + "_merged"
+    lbmi.merge_all_timesteps(simulation, merged, num_cores=1)
+    statistics_path = simulation + "_statistics"
+    lbmi.merge_all_timesteps(simulation, statistics_path, num_cores=1, statistics=True,
+                             statistics_start=0, keep_timesteps=False)
+
+    assert not glob.glob(os.path.join(statistics_path, "VTKFluid", "Fluid_t*.vtr"))
+    statistics = pv.read(os.path.join(statistics_path, "VTKFluid", "Fluid_statistics.vtr"))
+    assert statistics.field_data["count"][0] == len(TIMESTEPS)
+
+    density = np.array([pv.read(os.path.join(merged, "VTKFluid", f"Fluid_t{t}.vtr"))["density"] for t in TIMESTEPS])
+    np.testing.assert_allclose(statistics["density_mean"], density.mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(statistics["density_variance"], density.var(axis=0, ddof=1), rtol=1e-5, atol=1e-12)
+    np.testing.assert_allclose(statistics["density_min"], density.min(axis=0))
+    np.testing.assert_allclose(statistics["density_max"], density.max(axis=0))
+
+
+def test_merge_without_output_is_refused(simulation):
+    raw = sorted(glob.glob(os.path.join(simulation, "VTK*", "*.vtk")))
+    with pytest.raises(ValueError):
+        lbmi.merge_all_timesteps(simulation, simulation, num_cores=1, keep_timesteps=False)
+    assert sorted(glob.glob(os.path.join(simulation, "VTK*", "*.vtk"))) == raw
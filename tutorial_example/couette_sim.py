@@ -9,8 +9,9 @@ def couette_sim(Re_p, Ca, confinement, length_z):
     parameter files for different individual simulations within a campaign.
     """
 
-    # Initialise the parameter updates class
+    # Initialise the parameter updates class, recording the physical inputs
     parameter_updates = lbmi.ParameterUpdates()
+    parameter_updates.physical(Re_p=Re_p, Ca=Ca, confinement=confinement, length_z=length_z)
 
     # Set up the domain size
     parameter_updates.lattice(NX=length_z,NY=length_z,NZ=length_z)
@@ -43,6 +44,8 @@ def couette_sim(Re_p, Ca, confinement, length_z):
     # Set particle properties based on Ca and Bq values:
     kS = lbmi.calculate_viscosity(tau)*shear_rate*meshRadius/Ca # set kappa_s by Ca=visc*gammadot*radius/kS
     kalpha = kS # relationship kalpha/ks = 1
+    parameter_updates.conversion("velocity", "Re_p*nu*(length_z-2)/(2*radius**2)", velocity)
+    parameter_updates.conversion("kS", "nu*shear_rate*radius/Ca", kS)
 
     # Update the parameter_updates class with the mesh properties
     parameter_updates.mesh(